@@ -0,0 +1,690 @@
+"""
+Author(s):      Nihal Dhamani (nihaldhamani@gmail.com),
+                Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   12/06/2019
+
+Commands for TF Bounding Box plugin, loaded lazily by the command group in core.py.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from comet_ml import Experiment
+import os
+import click
+import io
+import sys
+import yaml
+import importlib
+import re
+import glob
+import json
+import traceback
+import time
+import numpy as np
+import tensorflow as tf
+import rmltraintfbbox.validation.utils as utils
+from contextlib import ExitStack
+from pathlib import Path
+from datetime import datetime
+from ravenml.train.options import pass_train
+from ravenml.train.interfaces import TrainInput, TrainOutput
+from ravenml.utils.question import cli_spinner, user_selects, user_input
+from ravenml.utils.plugins import raise_parameter_error
+from ravenml.utils.local_cache import RMLCache
+from rmltraintfbbox.utils.helpers import prepare_for_training, download_model_arch, get_input_pipeline_config, \
+    get_profile_steps, get_early_stopping_config, ARCHS_SUBPATH
+from rmltraintfcommon.arch_cache import fetch_model_arch
+from rmltraintfbbox.utils.input_pipeline import apply_input_pipeline_options, benchmark_input_pipeline, \
+    build_train_input
+from rmltraintfbbox.utils.instrumentation import ThroughputMonitor
+from rmltraintfbbox.utils.tflite import export_tflite, evaluate_tflite
+from rmltraintfbbox.utils.optimize import optimize_saved_model
+from rmltraintfbbox.utils.benchmark import run_benchmark, compare_saved_models
+from rmltraintfbbox.utils.packaging import write_zip, package_artifacts
+from rmltraintfbbox.utils.early_stopping import EarlyStopping
+from rmltraintfbbox.utils.exporter import export_inference_graph, DetectionFromFloatImageModule, \
+    DETECTION_MODULE_MAP
+from rmltraintfbbox.validation.stats import BoundingBoxEvaluator
+from rmltraintfcommon.gradient_accumulation import GradientAccumulationOptimizer
+from google.protobuf import text_format
+from matplotlib import pyplot as plt
+from object_detection import model_lib, model_lib_v2, inputs, protos
+from object_detection.builders import optimizer_builder, model_builder
+from object_detection.utils import label_map_util, config_util
+
+# regex to ignore 0 indexed checkpoints
+checkpoint_regex = re.compile(r'model.ckpt-[1-9][0-9]*.[a-zA-Z0-9_-]+')
+
+### OPTIONS ###
+
+### COMMANDS ###
+@click.command(help='Train a model.')
+@pass_train
+@click.pass_context
+def train(ctx: click.Context, train: TrainInput):
+    # If the context has a TrainInput already, it is passed as "train"
+    # If it does not, the constructor is called AUTOMATICALLY
+    # by Click because the @pass_train decorator is set to ensure
+    # object creation, after which execution will fail as this means
+    # the user did not pass a config. see ravenml core file train/commands.py for more detail
+
+    # NOTE: after training, you must create an instance of TrainOutput and return it
+
+    ## SET UP CONFIG ##
+    config = train.plugin_config
+    metadata = train.plugin_metadata
+    comet = config.get('comet')
+
+    if config.get('verbose'):
+        tf.autograph.set_verbosity(level=10, alsologtostdout=True)
+    else:
+        tf.autograph.set_verbosity(level=0, alsologtostdout=True)
+    
+    # set base directory for model artifacts 
+    base_dir = train.artifact_path
+
+    # load model choices from YAML
+    models = {}
+    models_path = os.path.dirname(__file__) / Path('utils') / Path('model_info.yml')
+    with open(models_path, 'r') as stream:
+        try:
+            models = yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            print(exc)
+
+    # prompt for model selection if not in config
+    model_name = config.get('model')
+    model_name = model_name if model_name else user_selects('Choose model', models.keys())
+    # grab fields and add to metadata
+    try:
+        model = models[model_name]
+    except KeyError as e:
+        hint = 'model name, model is not supported by this plugin.'
+        raise_parameter_error(model_name, hint)
+
+    # extract information and add to metadata
+    model_type = model['type']
+    model_url = model['url']
+    metadata['architecture'] = model_name
+
+    # download model arch
+    arch_path = download_model_arch(model_url, train.plugin_cache, model.get('sha256'))
+
+    # prepare directory for training/prompt for hyperparams
+    if not prepare_for_training(train.plugin_cache, train.artifact_path, train.dataset.path,
+                                arch_path, model_type, metadata, train.plugin_config):
+        ctx.exit('Training cancelled.')
+
+    model_dir = os.path.join(base_dir, 'models/model')
+    train_dir = os.path.join(model_dir, 'train')
+    eval_dir = os.path.join(model_dir, 'eval')
+    pipeline_config_path = os.path.join(model_dir, 'pipeline.config')
+
+    experiment = None
+    if comet:
+        experiment = Experiment(workspace='seeker-rd', project_name='bounding-box')
+        experiment.set_name(comet)
+        experiment.log_parameters(metadata['hyperparameters'])
+        experiment.set_git_metadata()
+        experiment.set_os_packages()
+        experiment.set_pip_packages()
+        experiment.log_asset(pipeline_config_path)
+
+    # get number of training steps
+    num_train_steps = int(metadata['hyperparameters']['train_steps'])
+
+    # each training step accumulates gradients over this many batches before applying them
+    accumulation_steps = config.get('gradient_accumulation_steps', 1)
+    if not isinstance(accumulation_steps, int) or accumulation_steps < 1:
+        hint = 'gradient_accumulation_steps, must be a positive integer.'
+        raise_parameter_error(accumulation_steps, hint)
+    metadata['gradient_accumulation_steps'] = accumulation_steps
+
+    # serving signature of the exported SavedModel
+    export_config = config.get('export') or {}
+    metadata['export'] = {
+        'input_type': export_config.get('input_type', 'image_tensor'),
+        'batch_size': export_config.get('batch_size', 1),
+        'image_shape': export_config.get('image_shape'),
+        'optimize': export_config.get('optimize', False)
+    }
+    if metadata['export']['input_type'] not in DETECTION_MODULE_MAP:
+        hint = f'export, input_type must be one of {", ".join(DETECTION_MODULE_MAP)}.'
+        raise_parameter_error(metadata['export']['input_type'], hint)
+
+    configs = config_util.get_configs_from_pipeline_file(pipeline_config_path)
+    model_config = configs['model']
+    train_config = configs['train_config']
+    train_input_config = configs['train_input_config']
+    eval_input_config = configs['eval_input_config']
+    eval_config = configs['eval_config']
+
+    # optional TFLite export, only SSD models with a fixed_shape_resizer can be converted
+    tflite_config = config.get('tflite')
+    resizer = config_util.get_image_resizer_config(model_config).WhichOneof('image_resizer_oneof')
+    if tflite_config and (model_config.WhichOneof('model') != 'ssd' or resizer != 'fixed_shape_resizer'):
+        hint = 'tflite, TFLite export is only supported for SSD models with a fixed_shape_resizer.'
+        raise_parameter_error(model_name, hint)
+
+    detection_model = model_builder.build(model_config=model_config, is_training=True)
+
+    # create tf.data.Dataset()
+    input_config = get_input_pipeline_config(config)
+    train_input, metadata['input_cache'] = build_train_input(train_config, train_input_config, model_config,
+                                                             detection_model, input_config,
+                                                             os.path.join(base_dir, 'input_cache'))
+    if metadata['input_cache'].get('fallback'):
+        click.echo(f'Not caching decoded training images: {metadata["input_cache"]["fallback"]}.')
+    eval_input = inputs.eval_input(eval_config, eval_input_config, model_config, model=detection_model)
+    train_input = apply_input_pipeline_options(train_input, input_config)
+    eval_input = apply_input_pipeline_options(eval_input, input_config)
+
+    # benchmark mode: measure input throughput on its own and stop before training
+    if input_config['benchmark_steps']:
+        click.echo('Benchmarking input pipeline...')
+        results = benchmark_input_pipeline(train_input, int(input_config['benchmark_steps']),
+                                           train_config.batch_size)
+        click.echo(json.dumps(results, indent=2))
+        ctx.exit()
+
+    train_input_iterator = iter(train_input)
+
+    global_step = tf.Variable(
+        0, trainable=False, dtype=tf.int64, name='global_step',
+        aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+    optimizer, (learning_rate,) = optimizer_builder.build(
+        train_config.optimizer, global_step=global_step)
+
+    if callable(learning_rate):
+        learning_rate_fn = learning_rate
+    else:
+        learning_rate_fn = lambda: learning_rate
+
+    # restore from checkpoint
+    load_fine_tune_checkpoint(detection_model, train_config.fine_tune_checkpoint,
+                                    train_config.fine_tune_checkpoint_type,
+                                    train_config.fine_tune_checkpoint_version,
+                                    train_input,
+                                    train_config.unpad_groundtruth_tensors)
+
+    # gradient accumulation: the wrapper sums the gradients of each batch and applies their
+    # mean once every accumulation_steps batches. The wrapped optimizer's iterations, and so
+    # global_step and the learning rate schedule, only advance when they are applied.
+    train_optimizer = optimizer
+    if accumulation_steps > 1:
+        train_optimizer = GradientAccumulationOptimizer(optimizer, accumulation_steps)
+
+    # the input iterator is advanced outside of train_step so time blocked on
+    # input can be measured separately from compute
+    @tf.function
+    def train_step(detection_model, features, labels, optimizer, learning_rate_fn, global_step):
+
+        loss = model_lib_v2.eager_train_step(detection_model, features,
+                            labels, train_config.unpad_groundtruth_tensors,
+                            optimizer, learning_rate_fn(),
+                            add_regularization_loss=True,
+                            clip_gradients_value=None,
+                            global_step=global_step)
+        global_step.assign(optimizer.iterations)
+        return loss
+
+    def run_train_step():
+        """Runs one training step, returning its loss, input time and compute time."""
+        loss, input_time, compute_time = 0.0, 0.0, 0.0
+        for _ in range(accumulation_steps):
+            fetch_start = time.time()
+            features, labels = train_input_iterator.next()
+            compute_start = time.time()
+            batch_loss = train_step(detection_model, features, labels, train_optimizer,
+                                    learning_rate_fn, global_step)
+            # block on the loss so compute time covers the whole step
+            loss += batch_loss.numpy() / accumulation_steps
+            input_time += compute_start - fetch_start
+            compute_time += time.time() - compute_start
+        return loss, input_time, compute_time
+
+    # @tf.function
+    def evaluate(detection_model, configs, eval_input, global_step):
+
+        text_trap = io.StringIO()
+        sys.stdout = text_trap
+        sys.stderr = text_trap
+
+        metrics = model_lib_v2.eager_eval_loop(detection_model, configs, eval_input, global_step=global_step)
+
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+
+        click.echo(f'Evaluation loss: {metrics["Loss/total_loss"]}, Evaluation mAP: {metrics["DetectionBoxes_Precision/mAP"]}')
+
+        return metrics
+
+    # optional tf.profiler capture window, traces are written to the artifact directory
+    profile_steps = get_profile_steps(config)
+    profile_dir = os.path.join(base_dir, 'profile')
+    profiling = False
+
+    checkpoint = tf.train.Checkpoint(optimizer=optimizer, model=detection_model)
+    manager = tf.train.CheckpointManager(checkpoint, directory=model_dir, max_to_keep=5)
+
+    # optional early stopping on an eval metric. the best weights are kept in a separate
+    # checkpoint so the manager cannot rotate them out.
+    stopping_config = get_early_stopping_config(config)
+    early_stopping = EarlyStopping(**stopping_config) if stopping_config else None
+    best_checkpoint_prefix = os.path.join(model_dir, 'best', 'ckpt')
+    best_checkpoint_path = None
+
+    with ExitStack() as stack:
+        if comet:
+            stack.enter_context(experiment.train())
+        click.echo('Training model...')
+
+        monitor = ThroughputMonitor(train_config.batch_size * accumulation_steps,
+                                    log_dir=train_dir, experiment=experiment)
+
+        start = time.time()
+        # main training loop
+        losses = []
+        for step in range(1, num_train_steps+1):
+
+            if profile_steps and step == profile_steps[0]:
+                click.echo(f'Profiling steps {profile_steps[0]}-{profile_steps[1]}...')
+                tf.profiler.experimental.start(profile_dir)
+                profiling = True
+
+            loss, input_time, compute_time = run_train_step()
+            losses.append(loss)
+            monitor.record_step(input_time, compute_time)
+
+            if profiling and step == profile_steps[1]:
+                tf.profiler.experimental.stop()
+                profiling = False
+            
+            if step % config.get('log_train_every') == 0:
+                avg_loss = sum(losses) / len(losses)
+                print(f'Avg train loss at step {step}: {avg_loss}')
+                losses = []
+                if comet:
+                    experiment.log_metric('avg_loss', avg_loss)
+                interval = monitor.log_interval(step)
+                print(f'Throughput at step {step}: {interval["examples_per_sec"]:.2f} examples/sec, '
+                      f'p50 step time {interval["step_time_p50"]:.3f}s, '
+                      f'{interval["input_time_fraction"]:.0%} of step time waiting on input')
+    
+            if step % config.get('log_eval_every') == 0:
+                with monitor.time('checkpoint'):
+                    manager.save()
+                with monitor.time('eval'):
+                    eval_metrics = evaluate(detection_model, configs, eval_input, global_step)
+                if comet:
+                    stack.enter_context(experiment.validate())
+                    experiment.log_metrics(eval_metrics, step=step)
+                    stack.enter_context(experiment.train())
+
+                if early_stopping:
+                    if early_stopping.update(eval_metrics, step):
+                        best_checkpoint_path = checkpoint.write(best_checkpoint_prefix)
+                    if early_stopping.should_stop:
+                        click.echo(f'{early_stopping.metric} has not improved for {early_stopping.patience} '
+                                   f'evaluations, stopping at step {step}.')
+                        break
+
+        # training ended inside the capture window
+        if profiling:
+            tf.profiler.experimental.stop()
+
+        training_time = time.time() - start
+        metadata['throughput'] = monitor.summary()
+
+        # restore the best weights and make them the latest checkpoint for evaluation and export
+        if early_stopping:
+            metadata['early_stopping'] = early_stopping.summary()
+        if early_stopping and best_checkpoint_path and early_stopping.best_step != step:
+            click.echo(f'Restoring best checkpoint from step {early_stopping.best_step}.')
+            checkpoint.read(best_checkpoint_path).expect_partial()
+            manager.save()
+        elif step % config.get('log_eval_every') != 0:
+            # the final weights have not been checkpointed yet
+            manager.save()
+
+        click.echo(f'Training complete. Took {training_time} seconds.')
+
+    # final metadata and return of TrainOutput object
+    datetime_finished = datetime.utcnow().isoformat() + "Z"
+    metadata['date_completed_at'] = datetime_finished
+
+    # get extra config files
+    extra_files = _get_paths_for_extra_files(base_dir)
+
+    # add profiler traces
+    for dirpath, _, filenames in os.walk(profile_dir):
+        extra_files += [os.path.join(dirpath, f) for f in filenames]
+
+    float_stats = None
+    if config.get('evaluate'):
+        click.echo("Evaluating model...")
+        with ExitStack() as stack:
+            if comet:
+                stack.enter_context(experiment.test())
+            # path to label_map.pbtxt
+            label_path = str(train.dataset.path / 'label_map.pbtxt')
+            test_path = str(train.dataset.path / 'test')
+            output_path = str(base_dir / 'validation')
+            os.mkdir(output_path)
+
+            eval_batch_size = config.get('eval_batch_size', 8)
+            visualize_every = config.get('eval_visualize_every', 0)
+            image_dataset = utils.get_image_dataset(test_path, dtype=tf.float32, batch_size=eval_batch_size)
+            truth_data = iter(utils.gen_truth_data(test_path))
+
+            category_index = label_map_util.create_category_index_from_labelmap(label_path)
+            evaluator = BoundingBoxEvaluator(category_index)
+
+            # compile preprocess, predict and postprocess into a single graph, the same way
+            # the exported SavedModel serves them, and warm it up so that timings exclude tracing.
+            # like the exporter, an inference model is built and restored from the latest checkpoint
+            eval_model = model_builder.build(model_config=model_config, is_training=False)
+            tf.train.Checkpoint(model=eval_model).restore(manager.latest_checkpoint).expect_partial()
+            inference_fn = DetectionFromFloatImageModule(eval_model, batch_size=None).get_concrete_function()
+            for warmup_images, _ in image_dataset.take(1):
+                for _ in range(config.get('eval_warmup_steps', 3)):
+                    inference_fn(warmup_images)
+
+            with utils.VisualizationWriter(category_index) as vis_writer:
+                i = 0
+                for images, true_shapes in image_dataset:
+                    start = time.time()
+                    batch_output = inference_fn(images)
+                    # block until the results are ready so the timing covers the whole model
+                    batch_output['num_detections'].numpy()
+                    # inference time is amortized over the images in the batch
+                    inference_time = (time.time() - start) / len(true_shapes)
+                    detections = utils.unbatch_detections(batch_output, images.shape, true_shapes)
+                    for j, (output, true_shape) in enumerate(detections):
+                        # the inference module offsets classes to match the label map, the evaluator expects 0-indexed
+                        output['detection_classes'] = output['detection_classes'] - 1
+                        bbox, centroid, z = next(truth_data)
+                        evaluator.add_single_result(output, true_shape, inference_time, bbox, centroid)
+                        if visualize_every and i % visualize_every == 0:
+                            height, width = true_shape[0, 0], true_shape[0, 1]
+                            image = images[j, :height, :width]
+                            vis_writer.submit(image, output, output_path + f'/img{i}.png')
+                        i += 1
+
+            evaluator.dump(os.path.join(output_path, 'validation_results.pickle'))
+            if comet:
+                experiment.log_asset(os.path.join(output_path, 'validation_results.pickle'))
+            evaluator.calculate_default_and_save(output_path)
+            # kept to compare the TFLite model against
+            float_stats = dict(evaluator.stats, mean_latency=float(np.mean(evaluator.times)))
+
+            extra_files.append(os.path.join(output_path, 'stats.json'))
+            extra_files.append(os.path.join(output_path, 'validation_results.pickle'))
+            extra_files += glob.glob(os.path.join(output_path, '*_curve_*.png'))
+            if comet:
+                experiment.log_asset(os.path.join(output_path, 'stats.json'))
+                for img in glob.glob(os.path.join(output_path, '*_curve_*.png')):
+                    experiment.log_image(img)
+
+    # export detection_model as SavedModel
+    saved_model_dir = os.path.join(model_dir, 'export')
+    configproto = config_util.create_pipeline_proto_from_configs(configs)
+    export_inference_graph(metadata['export']['input_type'], configproto, model_dir, saved_model_dir,
+                           batch_size=metadata['export']['batch_size'],
+                           image_shape=metadata['export']['image_shape'])
+
+    #zip files in export directory and add to extra_files
+    write_zip(os.path.join(saved_model_dir, 'export.zip'), model_dir, 'export')
+    extra_files.append(os.path.join(saved_model_dir, 'export.zip'))
+
+    # save a Grappler-optimized SavedModel beside the plain one and compare the two. This step is optional,
+    # so a failure is recorded in the metadata instead of ending a finished training run
+    if metadata['export']['optimize']:
+        click.echo('Optimizing exported model...')
+        try:
+            optimize_saved_model(os.path.join(saved_model_dir, 'saved_model'),
+                                 os.path.join(saved_model_dir, 'optimized_saved_model'))
+            # synthetic input at the size of the first test image, or the benchmark default without one
+            resolution = 640
+            for image in utils.get_image_dataset(str(train.dataset.path / 'test')).take(1):
+                resolution = tuple(image.shape[:2])
+            report = compare_saved_models(os.path.join(saved_model_dir, 'saved_model'),
+                                          os.path.join(saved_model_dir, 'optimized_saved_model'),
+                                          metadata['export']['input_type'],
+                                          batch_size=metadata['export']['batch_size'],
+                                          resolution=resolution, steps=export_config.get('benchmark_steps', 50))
+        except Exception as e:
+            click.echo(f'Optimizing the exported model failed, skipping it: {e}')
+            metadata['export']['optimization_error'] = f'{type(e).__name__}: {e}'
+        else:
+            click.echo(json.dumps(report, indent=2))
+            metadata['export']['optimization_report'] = report
+            with open(os.path.join(saved_model_dir, 'optimization_report.json'), 'w') as f:
+                json.dump(report, f, indent=2)
+            extra_files.append(os.path.join(saved_model_dir, 'optimization_report.json'))
+            write_zip(os.path.join(saved_model_dir, 'optimized_saved_model.zip'), saved_model_dir,
+                      'optimized_saved_model')
+            extra_files.append(os.path.join(saved_model_dir, 'optimized_saved_model.zip'))
+
+    if tflite_config:
+        click.echo('Exporting TFLite model...')
+        tflite_path = export_tflite(configproto, model_dir, os.path.join(model_dir, 'tflite'),
+                                    quantize=tflite_config.get('quantize', False),
+                                    num_calibration_examples=tflite_config.get('calibration_examples', 100),
+                                    max_detections=tflite_config.get('max_detections', 10))
+        extra_files.append(tflite_path)
+        if tflite_config.get('evaluate'):
+            click.echo('Evaluating TFLite model...')
+            category_index = label_map_util.create_category_index_from_labelmap(
+                str(train.dataset.path / 'label_map.pbtxt'))
+            tflite_output_path = str(base_dir / 'validation' / 'tflite')
+            report = evaluate_tflite(tflite_path, configproto, str(train.dataset.path / 'test'), category_index,
+                                     tflite_output_path, float_stats=float_stats,
+                                     num_threads=tflite_config.get('num_threads'))
+            click.echo(json.dumps(report, indent=2))
+            metadata['tflite'] = report
+            extra_files.append(os.path.join(tflite_output_path, 'tflite_report.json'))
+            extra_files.append(os.path.join(tflite_output_path, 'stats.json'))
+            extra_files += glob.glob(os.path.join(tflite_output_path, '*_curve_*.png'))
+            if comet:
+                experiment.log_asset(os.path.join(tflite_output_path, 'tflite_report.json'))
+
+    saved_model_path = os.path.join(saved_model_dir, 'saved_model', 'saved_model.pb')
+
+    if comet:
+        experiment.log_parameter('training_title', comet)
+        experiment.log_asset_data(train.metadata, file_name="metadata.json")
+        experiment.log_parameter('dataset_name', train.config['dataset'])
+
+
+    # export metadata locally
+    with open(base_dir / 'metadata.json', 'w') as f:
+        json.dump(train.metadata, f, indent=2)
+
+    extra_files = [Path(f) for f in extra_files]
+
+    # upload only content the model bucket does not hold yet and hand ravenML a manifest of every file.
+    # ravenML uploads nothing in local mode, so there is nothing to dedupe against
+    if config.get('incremental_packaging'):
+        click.echo('Packaging artifacts...')
+        extra_files = package_artifacts(extra_files, base_dir, upload=not train.config.get('artifact_path'))
+    result = TrainOutput(Path(saved_model_path), extra_files)
+    return result
+
+
+@click.command(help='Populate the model architecture cache from local tarballs.')
+@click.argument('tarballs', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--cache-path', type=click.Path(file_okay=False),
+              help=f'Root of the plugin cache, the directory holding {ARCHS_SUBPATH}. '
+                   'Defaults to the cache ravenML gives this plugin when training.')
+@click.pass_context
+def seed_cache(ctx, tarballs, cache_path):
+    # ravenML names the plugin cache after the command the plugin is invoked as
+    cache_path = Path(cache_path) if cache_path else RMLCache(ctx.parent.info_name).path
+    archs_path = cache_path / ARCHS_SUBPATH
+    # tarballs are named after the architecture they hold, as on download.tensorflow.org
+    for tarball in tarballs:
+        model_name = os.path.basename(tarball)
+        for suffix in ('.tar.gz', '.tgz', '.tar'):
+            if model_name.endswith(suffix):
+                model_name = model_name[:-len(suffix)]
+                break
+        click.echo(f'Seeding {model_name}...')
+        fetch_model_arch(os.path.abspath(tarball), archs_path, model_name)
+
+
+
+@click.command(help='Benchmark the latency and throughput of an exported SavedModel on synthetic images.')
+@click.argument('saved_model', type=click.Path(exists=True, file_okay=False))
+@click.option('-b', '--batch-size', 'batch_sizes', type=int, multiple=True, default=(1,), show_default=True,
+              help='Batch size to benchmark, repeat to sweep. Ignored for signatures with a fixed batch size.')
+@click.option('-r', '--resolution', 'resolutions', type=int, multiple=True, default=(640,), show_default=True,
+              help='Side length of the square synthetic images, repeat to sweep. Ignored for fixed-resolution '
+                   'signatures.')
+@click.option('--intra-op-threads', type=int, multiple=True, default=(0,), show_default=True,
+              help='Intra-op thread count, 0 for the TensorFlow default, repeat to sweep.')
+@click.option('--inter-op-threads', type=int, multiple=True, default=(0,), show_default=True,
+              help='Inter-op thread count, 0 for the TensorFlow default, repeat to sweep.')
+@click.option('--input-type', type=click.Choice(list(DETECTION_MODULE_MAP)),
+              help='Input type the model was exported with, inferred from the signature by default.')
+@click.option('--steps', type=int, default=50, show_default=True, help='Timed calls per setting.')
+@click.option('--warmup-steps', type=int, default=5, show_default=True, help='Untimed calls per setting.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Path to write the results as JSON.')
+def benchmark(saved_model, batch_sizes, resolutions, intra_op_threads, inter_op_threads, input_type, steps,
+              warmup_steps, output):
+    report = run_benchmark(saved_model, batch_sizes, resolutions, intra_op_threads, inter_op_threads,
+                           input_type=input_type, steps=steps, warmup_steps=warmup_steps)
+    for threads in report['threads']:
+        click.echo(f"intra {threads['intra_op_threads']}, inter {threads['inter_op_threads']}: "
+                   f"cold load {threads['cold_load_time']:.2f} s")
+        for result in threads['results']:
+            click.echo(f"  {result['height']}x{result['width']} batch {result['batch_size']:>3}: "
+                       f"first call {result['first_call_latency'] * 1000:.1f} ms, "
+                       f"p50 {result['steady_state_latency_p50'] * 1000:.1f} ms, "
+                       f"p99 {result['steady_state_latency_p99'] * 1000:.1f} ms, "
+                       f"{result['images_per_sec']:.2f} images/sec")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+### HELPERS ###
+
+def load_fine_tune_checkpoint(
+        model, checkpoint_path, checkpoint_type, checkpoint_version, input_dataset,
+        unpad_groundtruth_tensors):
+
+    # NOTE: Moved this function from OD API to add 'expect_partial' to the restore
+    """ Load a fine tuning classification or detection checkpoint.
+        To make sure the model variables are all built, this method first executes
+        the model by computing a dummy loss. (Models might not have built their
+        variables before their first execution)
+        It then loads an object-based classification or detection checkpoint.
+        This method updates the model in-place and does not return a value.
+    Args:
+        model: A DetectionModel (based on Keras) to load a fine-tuning
+            checkpoint for.
+        checkpoint_path: Directory with checkpoints file or path to checkpoint.
+        checkpoint_type: Whether to restore from a full detection
+            checkpoint (with compatible variable names) or to restore from a
+            classification checkpoint for initialization prior to training.
+            Valid values: `detection`, `classification`.
+        checkpoint_version: train_pb2.CheckpointVersion.V1 or V2 enum indicating
+            whether to load checkpoints in V1 style or V2 style.  In this binary
+            we only support V2 style (object-based) checkpoints.
+        input_dataset: The tf.data Dataset the model is being trained on. Needed
+            to get the shapes for the dummy loss computation.
+        unpad_groundtruth_tensors: A parameter passed to unstack_batch.
+    Raises:
+        IOError: if `checkpoint_path` does not point at a valid object-based
+            checkpoint
+        ValueError: if `checkpoint_version` is not train_pb2.CheckpointVersion.V2
+    """
+    if not model_lib_v2.is_object_based_checkpoint(checkpoint_path):
+        raise IOError('Checkpoint is expected to be an object-based checkpoint.')
+    if checkpoint_version == protos.train_pb2.CheckpointVersion.V1:
+        raise ValueError('Checkpoint version should be V2')
+
+    features, labels = iter(input_dataset).next()
+
+    @tf.function
+    def _dummy_computation_fn(features, labels):
+        model._is_training = False  # pylint: disable=protected-access
+        tf.keras.backend.set_learning_phase(False)
+        labels = model_lib.unstack_batch(
+            labels, unpad_groundtruth_tensors=unpad_groundtruth_tensors)
+
+        return model_lib_v2._compute_losses_and_predictions_dicts(
+            model,
+            features,
+            labels)
+
+    strategy = tf.compat.v2.distribute.get_strategy()
+    if hasattr(tf.distribute.Strategy, 'run'):
+        strategy.run(
+            _dummy_computation_fn, args=(
+                features,
+                labels,
+            ))
+    else:
+        strategy.experimental_run_v2(
+            _dummy_computation_fn, args=(
+                features,
+                labels,
+            ))
+
+    restore_from_objects_dict = model.restore_from_objects(
+        fine_tune_checkpoint_type=checkpoint_type)
+    ckpt = tf.train.Checkpoint(**restore_from_objects_dict)
+    ckpt.restore(checkpoint_path).expect_partial()
+
+
+def _get_paths_for_extra_files(artifact_path: Path):
+    """Returns the filepaths for all checkpoint, config, and pbtxt (label)
+    files in the artifact directory. Gets filepath for the exported inference
+    graph.
+
+    Args:
+        artifact_path (Path): path to training artifacts
+
+    Returns:
+        list: list of Paths that point to files
+    """
+    extras = []
+    # get checkpoints
+    extras_path = artifact_path / 'models' / 'model'
+    files = os.listdir(extras_path)
+
+    # path to label map
+    labels_path = artifact_path / 'label_map.pbtxt'
+
+    checkpoints = [f for f in files if checkpoint_regex.match(f)]
+
+    # calculate the max checkpoint
+    max_checkpoint = 0
+    for checkpoint in checkpoints:
+        checkpoint_num = int(checkpoint.split('-')[1].split('.')[0])
+        if checkpoint_num > max_checkpoint:
+            max_checkpoint = checkpoint_num
+
+    ckpt_prefix = 'model.ckpt-' + str(max_checkpoint)
+    checkpoint_path = extras_path / ckpt_prefix
+    pipeline_path = extras_path / 'pipeline.config'
+
+    # append files to include in extras directory
+    extras = [extras_path / f for f in checkpoints]
+    extras.append(pipeline_path)
+
+    # append event checkpoints for tensorboard
+    for f in os.listdir(extras_path):
+        if f.startswith('events.out'):
+            extras.append(extras_path / f)
+
+    # append throughput summaries written during training
+    train_path = extras_path / 'train'
+    if train_path.is_dir():
+        extras += [train_path / f for f in os.listdir(train_path) if f.startswith('events.out')]
+
+    extras.append(labels_path)
+    return extras
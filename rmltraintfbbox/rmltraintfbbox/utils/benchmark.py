@@ -0,0 +1,219 @@
+"""
+Latency and throughput benchmark of exported SavedModels for the TF Bounding
+Box plugin.
+
+TensorFlow fixes its thread pools when the runtime starts, so each intra/inter-op
+thread setting is measured in a fresh Python process running this module. This
+also makes the measured load time a true cold load. Inputs are synthetic images,
+so no dataset is needed.
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import itertools
+import subprocess
+import numpy as np
+import tensorflow as tf
+
+# serving signature dtype to input type, string signatures are told apart by infer_input_type
+_INPUT_TYPES = {'uint8': 'image_tensor', 'float32': 'float_image_tensor', 'string': 'encoded_image_string_tensor'}
+# ops that parse serialized tf.Examples, only found in tf_example exports
+_PARSE_EXAMPLE_OPS = {'ParseExample', 'ParseExampleV2', 'ParseSingleExample'}
+
+
+def infer_input_type(serving_fn):
+    """Infers the input type a SavedModel was exported with from its serving signature.
+
+    Both encoded_image_string_tensor and tf_example exports take strings, so a string
+    signature is a tf_example export when its graph, or a function it calls, parses
+    tf.Examples.
+
+    Args:
+        serving_fn: the serving_default signature of the SavedModel
+
+    Returns:
+        str: input type, see exporter.DETECTION_MODULE_MAP
+    """
+    dtype = serving_fn.structured_input_signature[1]['input_tensor'].dtype.name
+    if dtype != 'string':
+        return _INPUT_TYPES[dtype]
+    graph_def = serving_fn.graph.as_graph_def()
+    nodes = itertools.chain(graph_def.node, *(function.node_def for function in graph_def.library.function))
+    if any(node.op in _PARSE_EXAMPLE_OPS for node in nodes):
+        return 'tf_example'
+    return _INPUT_TYPES[dtype]
+
+
+def benchmark_threads(saved_model_dir: str, batch_sizes, resolutions, input_type: str = None, steps: int = 50,
+                      warmup_steps: int = 5):
+    """Benchmarks a SavedModel in the current process with its current thread settings.
+
+    Fixed dimensions of the serving signature override batch_sizes and resolutions.
+
+    Args:
+        saved_model_dir (str): path to the SavedModel
+        batch_sizes (list): batch sizes to benchmark
+        resolutions (list): side lengths of the square synthetic images to benchmark
+        input_type (str): input type the model was exported with, inferred from the signature by default
+        steps (int): number of calls timed for the steady-state latency
+        warmup_steps (int): number of untimed calls after the first one
+
+    Returns:
+        dict: cold-load time and a list of results per resolution and batch size with the first-call
+            latency, steady-state latency quantiles in seconds and images/sec
+    """
+    start = time.time()
+    serving_fn = tf.saved_model.load(saved_model_dir).signatures['serving_default']
+    load_time = time.time() - start
+
+    input_spec = serving_fn.structured_input_signature[1]['input_tensor']
+    input_type = input_type or infer_input_type(serving_fn)
+    if input_spec.shape[0] is not None:
+        batch_sizes = [input_spec.shape[0]]
+    if input_spec.shape.rank == 4 and input_spec.shape[1] is not None:
+        resolutions = [(input_spec.shape[1], input_spec.shape[2])]
+
+    results = []
+    rng = np.random.RandomState(0)
+    for resolution, batch_size in itertools.product(resolutions, batch_sizes):
+        height, width = resolution if isinstance(resolution, (tuple, list)) else (resolution, resolution)
+        image = tf.constant(rng.randint(0, 256, size=(height, width, 3), dtype=np.uint8))
+        input_tensor = make_benchmark_input(input_type, image, batch_size=batch_size)
+
+        start = time.time()
+        serving_fn(input_tensor=input_tensor)['num_detections'].numpy()
+        first_call = time.time() - start
+        for _ in range(warmup_steps):
+            serving_fn(input_tensor=input_tensor)['num_detections'].numpy()
+
+        latencies = []
+        for _ in range(steps):
+            start = time.time()
+            serving_fn(input_tensor=input_tensor)['num_detections'].numpy()
+            latencies.append(time.time() - start)
+        results.append({
+            'batch_size': batch_size,
+            'height': height,
+            'width': width,
+            'first_call_latency': first_call,
+            'steady_state_latency_p50': float(np.percentile(latencies, 50)),
+            'steady_state_latency_p99': float(np.percentile(latencies, 99)),
+            'images_per_sec': steps * batch_size / float(np.sum(latencies))
+        })
+    return {'input_type': input_type, 'cold_load_time': load_time, 'results': results}
+
+
+def compare_saved_models(plain_dir: str, optimized_dir: str, input_type: str, batch_size: int = None,
+                         resolution=640, steps: int = 50):
+    """Benchmarks a plain and an optimized SavedModel on the same synthetic input.
+
+    Each model is loaded and measured in its own fresh process, so both load times are cold loads.
+
+    Args:
+        plain_dir (str): path to the SavedModel written by the exporter
+        optimized_dir (str): path to the SavedModel written by utils.optimize.optimize_saved_model
+        input_type (str): input type the models were exported with
+        batch_size (int): batch size to benchmark, None for a batch of one
+        resolution (int or tuple): side length or (height, width) of the synthetic image, ignored
+            for fixed-resolution signatures
+        steps (int): number of calls timed for the steady-state latency
+
+    Returns:
+        dict: results of benchmark_threads for both models and the steady-state speedup of the optimized one
+    """
+    report = {name: run_benchmark(saved_model_dir, [batch_size or 1], [resolution], input_type=input_type,
+                                  steps=steps)['threads'][0]
+              for name, saved_model_dir in [('plain', plain_dir), ('optimized', optimized_dir)]}
+    report['steady_state_speedup'] = (report['plain']['results'][0]['steady_state_latency_p50'] /
+                                      report['optimized']['results'][0]['steady_state_latency_p50'])
+    return report
+
+
+def make_benchmark_input(input_type: str, image, batch_size=1, image_shape=None):
+    """Builds an input for a serving signature from a single image.
+
+    Args:
+        input_type (str): input type the model was exported with, see exporter.DETECTION_MODULE_MAP
+        image (tf.Tensor): image of shape [height, width, 3]
+        batch_size (int): batch dimension of the signature, None for dynamic (a batch of one is used)
+        image_shape (list): [height, width] of a fixed-resolution signature (optional)
+
+    Returns:
+        tf.Tensor: input tensor matching the serving signature
+    """
+    if image_shape:
+        image = tf.image.resize(image, image_shape)
+    image = tf.cast(tf.round(image), tf.uint8)
+    if input_type == 'float_image_tensor':
+        single = tf.cast(image, tf.float32)
+    elif input_type == 'image_tensor':
+        single = image
+    else:
+        single = tf.io.encode_png(image)
+        if input_type == 'tf_example':
+            feature = {'image/encoded': tf.train.Feature(bytes_list=tf.train.BytesList(value=[single.numpy()])),
+                       'image/format': tf.train.Feature(bytes_list=tf.train.BytesList(value=[b'png']))}
+            example = tf.train.Example(features=tf.train.Features(feature=feature))
+            single = tf.constant(example.SerializeToString())
+    return tf.stack([single] * (batch_size or 1))
+
+
+def run_benchmark(saved_model_dir: str, batch_sizes=(1,), resolutions=(640,), intra_op_threads=(0,),
+                  inter_op_threads=(0,), input_type: str = None, steps: int = 50, warmup_steps: int = 5):
+    """Benchmarks a SavedModel across batch sizes, resolutions and thread settings.
+
+    Each thread setting runs in its own process.
+
+    Args:
+        saved_model_dir (str): path to the SavedModel
+        batch_sizes (list): batch sizes to benchmark
+        resolutions (list): side lengths of the square synthetic images to benchmark
+        intra_op_threads (list): intra-op thread counts to benchmark, 0 for the TensorFlow default
+        inter_op_threads (list): inter-op thread counts to benchmark, 0 for the TensorFlow default
+        input_type (str): input type the model was exported with, inferred from the signature by default
+        steps (int): number of calls timed for the steady-state latency
+        warmup_steps (int): number of untimed calls after the first one
+
+    Returns:
+        dict: the benchmark settings and one entry per thread setting as returned by benchmark_threads
+    """
+    report = {
+        'saved_model': os.path.abspath(saved_model_dir),
+        'steps': steps,
+        'warmup_steps': warmup_steps,
+        'threads': []
+    }
+    for intra, inter in itertools.product(intra_op_threads, inter_op_threads):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_path = os.path.join(tmp_dir, 'result.json')
+            args = {
+                'saved_model_dir': saved_model_dir,
+                'batch_sizes': list(batch_sizes),
+                'resolutions': list(resolutions),
+                'input_type': input_type,
+                'steps': steps,
+                'warmup_steps': warmup_steps
+            }
+            subprocess.run([sys.executable, '-m', __name__, json.dumps(args), str(intra), str(inter), result_path],
+                           check=True)
+            with open(result_path, 'r') as f:
+                result = json.load(f)
+        report['threads'].append(dict(intra_op_threads=intra, inter_op_threads=inter, **result))
+    return report
+
+
+def _main():
+    args, intra, inter, result_path = sys.argv[1:]
+    # must be set before TensorFlow runs its first op
+    tf.config.threading.set_intra_op_parallelism_threads(int(intra))
+    tf.config.threading.set_inter_op_parallelism_threads(int(inter))
+    result = benchmark_threads(**json.loads(args))
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+if __name__ == '__main__':
+    _main()
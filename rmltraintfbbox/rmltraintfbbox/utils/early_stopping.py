@@ -0,0 +1,62 @@
+"""
+Metric-driven early stopping for the TF Bounding Box training loop.
+"""
+
+
+class EarlyStopping:
+
+    def __init__(self, metric, mode='max', patience=5, min_delta=0.0):
+        """
+        :param metric: name of the eval metric to monitor (e.g. 'DetectionBoxes_Precision/mAP')
+        :param mode: 'max' if the metric should increase, 'min' if it should decrease
+        :param patience: number of evaluations without improvement before stopping
+        :param min_delta: minimum change in the metric that counts as an improvement
+        """
+        self.metric = metric
+        self.mode = mode
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_value = None
+        self.best_step = None
+        self.stopped_step = None
+        self._bad_evals = 0
+
+    def update(self, metrics, step):
+        """
+        Records the result of an evaluation.
+        :param metrics: dict of eval metrics, must contain the monitored metric
+        :param step: training step of the evaluation
+        :return: True if the monitored metric improved on the best value so far
+        """
+        value = float(metrics[self.metric])
+        if self.best_value is None:
+            improved = True
+        elif self.mode == 'max':
+            improved = value > self.best_value + self.min_delta
+        else:
+            improved = value < self.best_value - self.min_delta
+
+        if improved:
+            self.best_value = value
+            self.best_step = step
+            self._bad_evals = 0
+        else:
+            self._bad_evals += 1
+            if self._bad_evals >= self.patience:
+                self.stopped_step = step
+        return improved
+
+    @property
+    def should_stop(self):
+        return self.stopped_step is not None
+
+    def summary(self):
+        """
+        :return: a dict describing the early stopping outcome, for the training metadata.
+        """
+        return {
+            'metric': self.metric,
+            'best_value': self.best_value,
+            'best_step': self.best_step,
+            'stopped_step': self.stopped_step
+        }
@@ -24,24 +24,54 @@ def _decode_tf_example(tf_example_string_tensor):
 class DetectionInferenceModule(tf.Module):
   """Detection Inference Module."""
 
-  def __init__(self, detection_model):
+  def __init__(self, detection_model, batch_size=1, image_shape=None):
     """Initializes a module for detection.
     Args:
       detection_model: The detection model to use for inference.
+      batch_size: Batch dimension of the input signature, None for a dynamic
+        batch size.
+      image_shape: Optional [height, width] for a fixed-resolution input
+        signature. Image inputs are of any size by default.
     """
     self._model = detection_model
+    self._batch_size = batch_size
+    self._image_shape = list(image_shape) if image_shape else [None, None]
+
+  def get_input_spec(self):
+    """Returns the TensorSpec of the module's input."""
+    raise NotImplementedError
+
+  def get_concrete_function(self):
+    """Traces the module for its input signature.
+    Returns:
+      Concrete function taking a batch of inputs and returning detections.
+    """
+    return self.__call__.get_concrete_function(self.get_input_spec())
 
   def _run_inference_on_images(self, image):
     """Cast image to float and run inference.
     Args:
-      image: uint8 Tensor of shape [1, None, None, 3]
+      image: uint8 Tensor of shape [batch_size, None, None, 3]
     Returns:
       Tensor dictionary holding detections.
     """
-    label_id_offset = 1
-
     image = tf.cast(image, tf.float32)
     image, shapes = self._model.preprocess(image)
+    return self._run_inference_on_preprocessed(image, shapes)
+
+  def _run_inference_on_preprocessed(self, image, shapes):
+    """Run inference on preprocessed images.
+    Args:
+      image: float32 Tensor of shape [batch_size, height, width, 3] output by
+        the model's preprocess.
+      shapes: int32 Tensor of shape [batch_size, 3] with the true shape of
+        each image.
+    Returns:
+      Tensor dictionary holding batched detections, with a per-image
+      `num_detections`.
+    """
+    label_id_offset = 1
+
     prediction_dict = self._model.predict(image, shapes)
     detections = self._model.postprocess(prediction_dict, shapes)
     classes_field = fields.DetectionResultFields.detection_classes
@@ -53,13 +83,41 @@ class DetectionInferenceModule(tf.Module):
 
     return detections
 
+  def _run_inference_on_encoded(self, input_tensor, decode_fn):
+    """Decode and preprocess each input in parallel, then run inference.
+    Preprocessing resizes every image to the model's input size, so a batch
+    may hold images of different sizes.
+    Args:
+      input_tensor: string Tensor of shape [batch_size].
+      decode_fn: function decoding one string into a uint8 image.
+    Returns:
+      Tensor dictionary holding detections.
+    """
+    def _decode_and_preprocess(encoded):
+      image = decode_fn(encoded)
+      image.set_shape(self._image_shape + [3])
+      image, shapes = self._model.preprocess(
+          tf.cast(image, tf.float32)[tf.newaxis])
+      return image[0], shapes[0]
+
+    with tf.device('cpu:0'):
+      image, shapes = tf.map_fn(
+          _decode_and_preprocess,
+          elems=input_tensor,
+          fn_output_signature=(tf.float32, tf.int32),
+          parallel_iterations=32,
+          back_prop=False)
+    return self._run_inference_on_preprocessed(image, shapes)
+
 
 class DetectionFromImageModule(DetectionInferenceModule):
   """Detection Inference Module for image inputs."""
 
-  @tf.function(
-      input_signature=[
-          tf.TensorSpec(shape=[1, None, None, 3], dtype=tf.uint8)])
+  def get_input_spec(self):
+    return tf.TensorSpec(
+        shape=[self._batch_size] + self._image_shape + [3], dtype=tf.uint8)
+
+  @tf.function
   def __call__(self, input_tensor):
     return self._run_inference_on_images(input_tensor)
 
@@ -67,9 +125,11 @@ class DetectionFromImageModule(DetectionInferenceModule):
 class DetectionFromFloatImageModule(DetectionInferenceModule):
   """Detection Inference Module for float image inputs."""
 
-  @tf.function(
-      input_signature=[
-          tf.TensorSpec(shape=[1, None, None, 3], dtype=tf.float32)])
+  def get_input_spec(self):
+    return tf.TensorSpec(
+        shape=[self._batch_size] + self._image_shape + [3], dtype=tf.float32)
+
+  @tf.function
   def __call__(self, input_tensor):
     return self._run_inference_on_images(input_tensor)
 
@@ -77,31 +137,23 @@ class DetectionFromFloatImageModule(DetectionInferenceModule):
 class DetectionFromEncodedImageModule(DetectionInferenceModule):
   """Detection Inference Module for encoded image string inputs."""
 
-  @tf.function(input_signature=[tf.TensorSpec(shape=[1], dtype=tf.string)])
+  def get_input_spec(self):
+    return tf.TensorSpec(shape=[self._batch_size], dtype=tf.string)
+
+  @tf.function
   def __call__(self, input_tensor):
-    with tf.device('cpu:0'):
-      image = tf.map_fn(
-          _decode_image,
-          elems=input_tensor,
-          dtype=tf.uint8,
-          parallel_iterations=32,
-          back_prop=False)
-    return self._run_inference_on_images(image)
+    return self._run_inference_on_encoded(input_tensor, _decode_image)
 
 
 class DetectionFromTFExampleModule(DetectionInferenceModule):
   """Detection Inference Module for TF.Example inputs."""
 
-  @tf.function(input_signature=[tf.TensorSpec(shape=[1], dtype=tf.string)])
+  def get_input_spec(self):
+    return tf.TensorSpec(shape=[self._batch_size], dtype=tf.string)
+
+  @tf.function
   def __call__(self, input_tensor):
-    with tf.device('cpu:0'):
-      image = tf.map_fn(
-          _decode_tf_example,
-          elems=input_tensor,
-          dtype=tf.uint8,
-          parallel_iterations=32,
-          back_prop=False)
-    return self._run_inference_on_images(image)
+    return self._run_inference_on_encoded(input_tensor, _decode_tf_example)
 
 DETECTION_MODULE_MAP = {
     'image_tensor': DetectionFromImageModule,
@@ -115,7 +167,9 @@ DETECTION_MODULE_MAP = {
 def export_inference_graph(input_type,
                            pipeline_config,
                            trained_checkpoint_dir,
-                           output_directory):
+                           output_directory,
+                           batch_size=1,
+                           image_shape=None):
   """Exports inference graph for the model specified in the pipeline config.
   This function creates `output_directory` if it does not already exist,
   which will hold a copy of the pipeline config with filename `pipeline.config`,
@@ -127,6 +181,10 @@ def export_inference_graph(input_type,
     pipeline_config: pipeline_pb2.TrainAndEvalPipelineConfig proto.
     trained_checkpoint_dir: Path to the trained checkpoint file.
     output_directory: Path to write outputs.
+    batch_size: Batch dimension of the serving signature, None for a dynamic
+      batch size.
+    image_shape: Optional [height, width] for a fixed-resolution serving
+      signature.
   Raises:
     ValueError: if input_type is invalid.
   """
@@ -144,11 +202,12 @@ def export_inference_graph(input_type,
 
   if input_type not in DETECTION_MODULE_MAP:
     raise ValueError('Unrecognized `input_type`')
-  detection_module = DETECTION_MODULE_MAP[input_type](detection_model)
+  detection_module = DETECTION_MODULE_MAP[input_type](
+      detection_model, batch_size=batch_size, image_shape=image_shape)
   # Getting the concrete function traces the graph and forces variables to
   # be constructed --- only after this can we save the checkpoint and
   # saved model.
-  concrete_function = detection_module.__call__.get_concrete_function()
+  concrete_function = detection_module.get_concrete_function()
   #status.assert_existing_objects_matched()
 
   exported_checkpoint_manager = tf.train.CheckpointManager(
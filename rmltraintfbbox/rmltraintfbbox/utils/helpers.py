@@ -8,18 +8,45 @@ Helper functions for the TF Bounding Box plugin.
 
 import os
 import shutil
-import tarfile
 import yaml
 import click
-import urllib.request
 from colorama import init, Fore
 from pathlib import Path
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.question import user_confirms, user_input, user_selects
 from ravenml.utils.plugins import raise_parameter_error
+from rmltraintfcommon.dataset_manifest import load_manifest
+from rmltraintfcommon.arch_cache import fetch_model_arch, is_cached, ChecksumError
 
 init()
 
+# subpath of the plugin cache holding downloaded model architectures
+ARCHS_SUBPATH = 'bbox_model_archs'
+
+# defaults for the input_pipeline section of the plugin config. A prefetch_batches value of -1
+# is tf.data AUTOTUNE; a deterministic value of None leaves the tf.data default untouched.
+# cache is None (stream), 'memory' or 'disk' (snapshot file in the artifact directory).
+INPUT_PIPELINE_DEFAULTS = {
+    'num_readers': 64,
+    'num_parallel_batches': 8,
+    'prefetch_batches': -1,
+    'deterministic': None,
+    'private_threadpool_size': 0,
+    'benchmark_steps': 0,
+    'cache': None,
+    'cache_resize': True,
+    'cache_memory_budget_mb': 8192
+}
+
+# defaults for the early_stopping section of the plugin config. patience is counted in
+# evaluations (every log_eval_every steps); mode is 'max' for metrics like mAP, 'min' for losses.
+EARLY_STOPPING_DEFAULTS = {
+    'metric': 'DetectionBoxes_Precision/mAP',
+    'mode': 'max',
+    'patience': 5,
+    'min_delta': 0.0
+}
+
 def prepare_for_training(
     bbox_cache: RMLCache,
     base_dir: Path, 
@@ -53,20 +80,15 @@ def prepare_for_training(
     pbtxt_file = data_path / 'label_map.pbtxt'
     shutil.copy(pbtxt_file, base_dir)
 
+    # dataset facts come from the cached manifest rather than rescanning the dataset
+    manifest = load_manifest(data_path)
+
     # calculate number of classes from pbtxt file
-    with open(pbtxt_file, "r") as f:
-        ids = [line for line in f if "id:" in line]
-        num_classes = len(ids)
+    num_classes = manifest.num_classes(pbtxt_file)
     
     # get num eval examples from file
-    num_eval_file = data_path / 'splits/complete/train/test.record.numexamples'
-    try:
-        with open(num_eval_file, "r") as f:
-            lines = f.readlines()
-            num_eval_examples = int(lines[0])
-
-    except:
-        num_eval_examples = 1
+    records_path = data_path / 'splits/complete/train'
+    num_eval_examples = manifest.num_examples(records_path, 'test') or 1
 
     # create models, model, eval, and train folders
     model_folder = base_dir / 'models' / 'model'
@@ -131,15 +153,8 @@ def prepare_for_training(
             pipeline_contents = pipeline_contents.replace('<replace_arch_path>', str(arch_path) + '/')
 
     # place TF record files into training directory
-    num_train_records = 0
-    num_test_records = 0
-    records_path = data_path / 'splits/complete/train'
-    for record_file in os.listdir(records_path):
-        if record_file.startswith('train.record-'):
-           num_train_records += 1
-        if record_file.startswith('test.record-'):
-            num_test_records += 1
-
+    num_train_records = len(manifest.record_shards(records_path, 'train'))
+    num_test_records = len(manifest.record_shards(records_path, 'test'))
 
     # convert int to left zero padded string of length 5
     user_config['num_train_records'] = str(num_train_records).zfill(5)
@@ -156,6 +171,15 @@ def prepare_for_training(
     # insert num eval examples into config file
     pipeline_contents = pipeline_contents.replace('<replace_num_eval_examples>', str(num_eval_examples))
 
+    # insert input pipeline settings into config file
+    input_config = get_input_pipeline_config(config)
+    pipeline_contents = pipeline_contents.replace('<replace_num_readers>', str(input_config['num_readers']))
+    pipeline_contents = pipeline_contents.replace('<replace_num_parallel_batches>',
+                                                  str(input_config['num_parallel_batches']))
+    pipeline_contents = pipeline_contents.replace('<replace_num_prefetch_batches>',
+                                                  str(input_config['prefetch_batches']))
+    metadata['input_pipeline'] = input_config
+
     # output final configuration file for training
     with open(model_folder / 'pipeline.config', 'w') as file:
         file.write(pipeline_contents)
@@ -164,41 +188,94 @@ def prepare_for_training(
     metadata['hyperparameters'] = hp_metadata
     return True
 
-def download_model_arch(model_name: str, bbox_cache: RMLCache):
-    """Downloads the model architecture with the given name.
+def get_input_pipeline_config(config: dict):
+    """Builds the input pipeline settings from the plugin config, filling in defaults.
+
+    Args:
+        config (dict): plugin config from user provided config yaml
+
+    Returns:
+        dict: input pipeline settings with every key in INPUT_PIPELINE_DEFAULTS
+    """
+    input_config = dict(INPUT_PIPELINE_DEFAULTS)
+    for field, value in (config.get('input_pipeline') or {}).items():
+        if field not in INPUT_PIPELINE_DEFAULTS:
+            hint = f'input_pipeline, {field} is not a supported input pipeline setting.'
+            raise_parameter_error(field, hint)
+        input_config[field] = value
+    if input_config['cache'] not in (None, 'memory', 'disk'):
+        raise_parameter_error(input_config['cache'], 'input_pipeline, cache must be memory or disk.')
+    return input_config
+
+def get_early_stopping_config(config: dict):
+    """Builds the early stopping settings from the plugin config, filling in defaults.
+
+    Args:
+        config (dict): plugin config from user provided config yaml
+
+    Returns:
+        dict: early stopping settings with every key in EARLY_STOPPING_DEFAULTS,
+            or None if early stopping is disabled
+    """
+    if not config.get('early_stopping'):
+        return None
+    stopping_config = dict(EARLY_STOPPING_DEFAULTS)
+    for field, value in config['early_stopping'].items():
+        if field not in EARLY_STOPPING_DEFAULTS:
+            hint = f'early_stopping, {field} is not a supported early stopping setting.'
+            raise_parameter_error(field, hint)
+        stopping_config[field] = value
+    if stopping_config['mode'] not in ('min', 'max'):
+        raise_parameter_error(stopping_config['mode'], 'early_stopping, mode must be min or max.')
+    return stopping_config
+
+def get_profile_steps(config: dict):
+    """Reads the profiler capture window from the plugin config.
+
+    Args:
+        config (dict): plugin config from user provided config yaml
+
+    Returns:
+        tuple: (start, stop) training steps to trace, inclusive, or None if
+            profiling is disabled
+    """
+    window = config.get('profile_steps')
+    if not window:
+        return None
+    try:
+        start, stop = (int(step) for step in window)
+    except (TypeError, ValueError):
+        raise_parameter_error(window, 'profile_steps, must be a list of two training steps [start, stop].')
+    if not 0 < start <= stop:
+        raise_parameter_error(window, 'profile_steps, start must be positive and no greater than stop.')
+    return start, stop
+
+def download_model_arch(model_name: str, bbox_cache: RMLCache, sha256: str = None):
+    """Downloads the model architecture with the given name into the plugin cache.
+
+    The download is streamed into the cache and guarded by a lock file, see rmltraintfcommon.arch_cache.
 
     Args:
         model_name (str): model type
         bbox_cache (RMLCache): cache object for the bbox plugin
+        sha256 (str): expected sha256 of the architecture tarball (optional)
     
     Returns:
         Path: path to model architecture
     """
     url = 'http://download.tensorflow.org/models/object_detection/tf2/20200711/%s.tar.gz' %(model_name)
     # make paths within bbox cache 
-    bbox_cache.ensure_subpath_exists('bbox_model_archs')
-    archs_path = bbox_cache.path / 'bbox_model_archs'
-    untarred_path = archs_path / model_name
+    bbox_cache.ensure_subpath_exists(ARCHS_SUBPATH)
+    archs_path = bbox_cache.path / ARCHS_SUBPATH
     # check if download is required
-    if not bbox_cache.subpath_exists(untarred_path):
+    if not is_cached(archs_path, model_name):
         click.echo("Model checkpoint not found in cache. Downloading...")
-        # download tar file
-        tar_name = url.split('/')[-1]
-        tar_path = archs_path / tar_name
-        urllib.request.urlretrieve(url, tar_path)
-        
-        click.echo("Untarring model checkpoint...")
-        if (tar_name.endswith("tar.gz")):
-            tar = tarfile.open(tar_path, "r:gz")
-            tar.extractall(path=archs_path)
-            tar.close()
-
-        # get rid of tar file
-        os.remove(tar_path)
     else:
         click.echo('Model checkpoint found in cache.')
-        
-    return untarred_path
+    try:
+        return fetch_model_arch(url, archs_path, model_name, sha256)
+    except ChecksumError as e:
+        raise_parameter_error(model_name, f'model, {e}')
     
 def _configuration_prompt(current_config: dict):
     """Prompts user to allow editing of current training configuration.
@@ -0,0 +1,228 @@
+"""
+Helpers for tuning and measuring the tf.data input pipelines built by the
+Object Detection API for the TF Bounding Box plugin.
+"""
+
+import os
+import time
+import functools
+from contextlib import contextmanager
+import tensorflow as tf
+from object_detection import inputs
+from object_detection.builders import decoder_builder
+from object_detection.core import standard_fields as fields
+from object_detection.utils import config_util
+
+
+def apply_input_pipeline_options(dataset, input_config: dict):
+    """Applies the tf.data options from the input pipeline settings to a dataset.
+
+    Args:
+        dataset (tf.data.Dataset): dataset built by the Object Detection API
+        input_config (dict): input pipeline settings, see helpers.get_input_pipeline_config
+
+    Returns:
+        tf.data.Dataset: dataset with the options applied
+    """
+    options = tf.data.Options()
+    if input_config['deterministic'] is not None:
+        options.experimental_deterministic = input_config['deterministic']
+    if input_config['private_threadpool_size']:
+        options.experimental_threading.private_threadpool_size = input_config['private_threadpool_size']
+    # let tf.data parallelize and tune any map stages the pipeline config does not parallelize itself
+    options.experimental_optimization.autotune = True
+    options.experimental_optimization.map_parallelization = True
+    return dataset.with_options(options)
+
+
+def build_train_input(train_config, train_input_config, model_config, model, input_config: dict,
+                      cache_dir: str):
+    """Builds the training input, caching decoded images if the input pipeline settings ask for it.
+
+    With caching enabled, examples are decoded (and optionally resized to the size
+    the model's image resizer would produce) once, cached in memory or in a snapshot
+    file under cache_dir, and only then shuffled, repeated and augmented according
+    to the pipeline config. An in-memory cache whose estimated size exceeds
+    cache_memory_budget_mb falls back to the streaming pipeline; the estimate reads
+    every record, so it is only made for a memory cache.
+
+    Args:
+        train_config (TrainConfig): train config from the pipeline config
+        train_input_config (InputReader): train input reader config from the pipeline config
+        model_config (DetectionModel): model config from the pipeline config
+        model (DetectionModel): model whose preprocessing the input applies
+        input_config (dict): input pipeline settings, see helpers.get_input_pipeline_config
+        cache_dir (str): directory for the snapshot file when cache is 'disk'
+
+    Returns:
+        tuple: the training tf.data.Dataset and a dict describing the cache that was used
+    """
+    train_input = functools.partial(inputs.train_input, train_config, train_input_config,
+                                    model_config, model=model)
+    mode = input_config['cache']
+    if not mode:
+        return train_input(), {'mode': None}
+
+    image_size = _get_cache_image_size(model_config) if input_config['cache_resize'] else None
+    cache_info = {'mode': mode, 'image_size': image_size}
+    cache_file = ''
+    if mode == 'memory':
+        # counting the records reads the whole input once, only worth it to decide on a memory cache
+        estimated_mb = _estimate_cache_size(train_input_config, image_size) / 2**20
+        cache_info['estimated_mb'] = estimated_mb
+        if estimated_mb > input_config['cache_memory_budget_mb']:
+            cache_info['mode'] = None
+            cache_info['fallback'] = 'estimated size exceeds cache_memory_budget_mb, streaming instead'
+            return train_input(), cache_info
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, 'train')
+
+    build_fn = functools.partial(_build_cached_dataset, cache_file=cache_file, image_size=image_size)
+    with _dataset_builder(build_fn):
+        return train_input(), cache_info
+
+
+@contextmanager
+def _dataset_builder(build_fn):
+    """Makes inputs.train_input build its dataset with build_fn while the context is open.
+
+    train_input looks its dataset builder up in inputs.INPUT_BUILDER_UTIL_MAP, the hook the
+    Object Detection API provides for replacing it, so the rest of train_input (preprocessing,
+    augmentation, padding) is untouched. The dataset is built when train_input is called, so
+    the original builder is restored before any training step runs.
+    """
+    original = inputs.INPUT_BUILDER_UTIL_MAP['dataset_build']
+    inputs.INPUT_BUILDER_UTIL_MAP['dataset_build'] = build_fn
+    try:
+        yield
+    finally:
+        inputs.INPUT_BUILDER_UTIL_MAP['dataset_build'] = original
+
+
+def _get_input_files(input_reader_config):
+    files = []
+    for pattern in input_reader_config.tf_record_input_reader.input_path:
+        files.extend(tf.io.gfile.glob(pattern))
+    return sorted(files)
+
+
+def _get_cache_image_size(model_config):
+    """Returns the size the model's image resizer produces, as (height, width) for a
+    fixed shape resizer or the max dimension for a keep aspect ratio resizer, or None."""
+    resizer_config = config_util.get_image_resizer_config(model_config)
+    resizer = resizer_config.WhichOneof('image_resizer_oneof')
+    if resizer == 'fixed_shape_resizer':
+        return (resizer_config.fixed_shape_resizer.height, resizer_config.fixed_shape_resizer.width)
+    if resizer == 'keep_aspect_ratio_resizer':
+        return resizer_config.keep_aspect_ratio_resizer.max_dimension
+    return None
+
+
+def _resize_for_cache(tensor_dict, image_size):
+    """Shrinks the decoded image to image_size. Box coordinates are normalized and unaffected."""
+    image = tensor_dict[fields.InputDataFields.image]
+    if isinstance(image_size, int):
+        # keep aspect ratio, only ever shrink so the longer side is image_size
+        shape = tf.cast(tf.shape(image)[:2], tf.float32)
+        scale = tf.minimum(1.0, image_size / tf.reduce_max(shape))
+        size = tf.cast(tf.round(shape * scale), tf.int32)
+    else:
+        size = image_size
+    resized = tf.image.resize(image, size)
+    tensor_dict[fields.InputDataFields.image] = tf.cast(tf.round(resized), image.dtype)
+    return tensor_dict
+
+
+def _estimate_cache_size(input_reader_config, image_size):
+    """Estimates the bytes needed to cache every decoded image of an input."""
+    files = _get_input_files(input_reader_config)
+    records = tf.data.TFRecordDataset(files)
+    num_examples = int(records.reduce(tf.constant(0, tf.int64), lambda count, _: count + 1))
+    if isinstance(image_size, tuple):
+        height, width = image_size
+    else:
+        decoder = decoder_builder.build(input_reader_config)
+        example = decoder.decode(next(iter(records)))
+        height, width = example[fields.InputDataFields.image].shape[:2]
+        if image_size:
+            scale = min(1.0, image_size / max(height, width))
+            height, width = height * scale, width * scale
+    return num_examples * height * width * 3
+
+
+def _build_cached_dataset(input_reader_config, batch_size=None, transform_input_data_fn=None,
+                          input_context=None, reduce_to_frame_fn=None, cache_file='', image_size=None):
+    """Replacement for the Object Detection API's dataset_builder.build that caches decoded examples.
+
+    Follows dataset_builder.build, except that examples are decoded, resized and cached
+    before being shuffled and repeated.
+    """
+    decoder = decoder_builder.build(input_reader_config)
+    files = _get_input_files(input_reader_config)
+    if not files:
+        raise ValueError('At least one input path must be specified in `input_reader_config`.')
+
+    if batch_size:
+        num_parallel_calls = batch_size * input_reader_config.num_parallel_batches
+    else:
+        num_parallel_calls = input_reader_config.num_parallel_map_calls
+
+    def dataset_map_fn(dataset, fn_to_map, batch_size=None, input_reader_config=None):
+        return dataset.map(fn_to_map, num_parallel_calls=num_parallel_calls)
+
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+    if input_context is not None:
+        dataset = dataset.shard(input_context.num_input_pipelines, input_context.input_pipeline_id)
+        batch_size = input_context.get_per_replica_batch_size(batch_size)
+    dataset = dataset.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(input_reader_config.num_readers, len(files)),
+        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    if input_reader_config.sample_1_of_n_examples > 1:
+        dataset = dataset.shard(input_reader_config.sample_1_of_n_examples, 0)
+    dataset = dataset.map(decoder.decode, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    if reduce_to_frame_fn:
+        dataset = reduce_to_frame_fn(dataset, dataset_map_fn, batch_size, input_reader_config)
+    if image_size:
+        dataset = dataset.map(functools.partial(_resize_for_cache, image_size=image_size),
+                              num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    dataset = dataset.cache(cache_file)
+
+    # everything after the cache runs every epoch
+    if input_reader_config.shuffle:
+        dataset = dataset.shuffle(input_reader_config.shuffle_buffer_size)
+    dataset = dataset.repeat(input_reader_config.num_epochs or None)
+    if transform_input_data_fn is not None:
+        dataset = dataset_map_fn(dataset, transform_input_data_fn)
+    if batch_size:
+        dataset = dataset.batch(batch_size, drop_remainder=input_reader_config.drop_remainder)
+    return dataset.prefetch(input_reader_config.num_prefetch_batches)
+
+
+def benchmark_input_pipeline(dataset, num_steps: int, batch_size: int, warmup_steps: int = 10):
+    """Measures the throughput of an input pipeline without running a model.
+
+    Args:
+        dataset (tf.data.Dataset): batched dataset to iterate over
+        num_steps (int): number of timed batches to pull
+        batch_size (int): examples per batch
+        warmup_steps (int): untimed batches pulled first so buffers fill up
+
+    Returns:
+        dict: timing results, including examples per second
+    """
+    iterator = iter(dataset)
+    for _ in range(warmup_steps):
+        next(iterator)
+    start = time.time()
+    for _ in range(num_steps):
+        next(iterator)
+    elapsed = time.time() - start
+    return {
+        'steps': num_steps,
+        'batch_size': batch_size,
+        'seconds': elapsed,
+        'steps_per_sec': num_steps / elapsed,
+        'examples_per_sec': num_steps * batch_size / elapsed
+    }
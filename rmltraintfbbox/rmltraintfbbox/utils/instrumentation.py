@@ -0,0 +1,117 @@
+"""
+Training throughput instrumentation for the TF Bounding Box plugin.
+
+Collects per-step input and compute timings plus checkpoint and evaluation
+durations, and reports them per logging interval to TensorBoard and Comet,
+and as a summary for the training metadata.
+"""
+
+import time
+import numpy as np
+import tensorflow as tf
+from contextlib import contextmanager
+from collections import defaultdict
+from rmltraintfcommon.host_memory import host_rss_mb
+
+
+class ThroughputMonitor:
+
+    def __init__(self, batch_size, log_dir=None, experiment=None):
+        """
+        :param batch_size: examples per training step
+        :param log_dir: directory to write TensorBoard scalars to (optional)
+        :param experiment: Comet experiment to log metrics to (optional)
+        """
+        self.batch_size = batch_size
+        self.experiment = experiment
+        self.writer = tf.summary.create_file_writer(log_dir) if log_dir else None
+        self.intervals = []
+        self._input_times = []
+        self._compute_times = []
+        self._durations = defaultdict(list)
+        self._totals = defaultdict(float)
+        self._steps = 0
+        self._start = time.time()
+
+    def record_step(self, input_time, compute_time):
+        """
+        Records the timings of a single training step.
+        :param input_time: seconds spent blocked on the input iterator
+        :param compute_time: seconds spent running the train step
+        """
+        self._input_times.append(input_time)
+        self._compute_times.append(compute_time)
+        self._totals['input'] += input_time
+        self._totals['compute'] += compute_time
+        self._steps += 1
+
+    @contextmanager
+    def time(self, name):
+        """
+        Context manager that records the duration of its body under `name` (e.g. 'checkpoint', 'eval').
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            self._durations[name].append(duration)
+            self._totals[name] += duration
+
+    def log_interval(self, step):
+        """
+        Summarizes the steps recorded since the last call and writes the summary to
+        TensorBoard and Comet.
+        :param step: the current training step
+        :return: the interval summary dict
+        """
+        if not self._compute_times:
+            return {}
+        step_times = np.array(self._input_times) + np.array(self._compute_times)
+        input_total = float(np.sum(self._input_times))
+        interval = {
+            'step_time_p50': float(np.percentile(step_times, 50)),
+            'step_time_p90': float(np.percentile(step_times, 90)),
+            'step_time_p99': float(np.percentile(step_times, 99)),
+            'step_time_max': float(np.max(step_times)),
+            'examples_per_sec': len(step_times) * self.batch_size / float(np.sum(step_times)),
+            'input_time_fraction': input_total / float(np.sum(step_times)),
+            'host_rss_mb': host_rss_mb()
+        }
+        for name, durations in self._durations.items():
+            interval[f'{name}_time'] = float(np.sum(durations))
+
+        if self.writer:
+            with self.writer.as_default():
+                for key, value in interval.items():
+                    tf.summary.scalar(f'throughput/{key}', value, step=step)
+            self.writer.flush()
+        if self.experiment:
+            self.experiment.log_metrics({f'throughput_{k}': v for k, v in interval.items()}, step=step)
+
+        self.intervals.append(dict(interval, step=step))
+        self._input_times = []
+        self._compute_times = []
+        self._durations = defaultdict(list)
+        return interval
+
+    def summary(self):
+        """
+        :return: a dict summarizing throughput over the whole run, for the training metadata.
+        """
+        wall_time = time.time() - self._start
+        step_time = self._totals['input'] + self._totals['compute']
+        summary = {
+            'steps': self._steps,
+            'wall_time': wall_time,
+            'examples_per_sec': self._steps * self.batch_size / step_time if step_time else 0.0,
+            'input_time': self._totals['input'],
+            'compute_time': self._totals['compute'],
+            'checkpoint_time': self._totals['checkpoint'],
+            'eval_time': self._totals['eval'],
+            'peak_host_rss_mb': max([i['host_rss_mb'] for i in self.intervals], default=host_rss_mb())
+        }
+        if self.intervals:
+            summary['step_time_p50'] = float(np.median([i['step_time_p50'] for i in self.intervals]))
+            summary['step_time_p99'] = float(np.max([i['step_time_p99'] for i in self.intervals]))
+        return summary
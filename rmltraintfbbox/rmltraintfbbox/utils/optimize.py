@@ -0,0 +1,65 @@
+"""
+Graph optimization of exported SavedModels for the TF Bounding Box plugin.
+
+The serving function of an exported SavedModel is frozen, run through Grappler
+and saved again as a standalone SavedModel. See
+utils.benchmark.compare_saved_models to measure the effect.
+"""
+
+import tensorflow as tf
+from tensorflow.core.protobuf import config_pb2, meta_graph_pb2
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+from tensorflow.python.grappler import tf_optimizer
+
+# Grappler passes applied to the frozen serving graph
+GRAPPLER_OPTIMIZERS = ['pruning', 'debug_stripper', 'constfold', 'shape', 'arithmetic', 'remap', 'layout',
+                       'dependency', 'loop', 'function']
+
+
+def optimize_saved_model(saved_model_dir: str, output_dir: str):
+    """Saves a Grappler-optimized copy of a SavedModel's serving signature.
+
+    Args:
+        saved_model_dir (str): SavedModel written by exporter.export_inference_graph
+        output_dir (str): directory to save the optimized SavedModel to
+    """
+    serving_fn = tf.saved_model.load(saved_model_dir).signatures['serving_default']
+    input_spec = serving_fn.structured_input_signature[1]['input_tensor']
+
+    # fold variables into constants so Grappler sees the whole graph
+    frozen_fn = convert_variables_to_constants_v2(serving_fn)
+    output_names = sorted(frozen_fn.structured_outputs)
+    input_name = [tensor.name for tensor in frozen_fn.inputs if tensor.dtype != tf.resource][0]
+    output_tensor_names = [frozen_fn.structured_outputs[name].name for name in output_names]
+    graph_def = _run_grappler(frozen_fn.graph, output_tensor_names)
+
+    # rebuild a function from the optimized graph and save it as the serving signature
+    def _import_graph_def():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+
+    wrapped = tf.compat.v1.wrap_function(_import_graph_def, [])
+    pruned_fn = wrapped.prune(wrapped.graph.as_graph_element(input_name),
+                              [wrapped.graph.as_graph_element(name) for name in output_tensor_names])
+
+    def serve(input_tensor):
+        return dict(zip(output_names, pruned_fn(input_tensor)))
+
+    module = tf.Module()
+    module.serve = tf.function(serve)
+    signature = module.serve.get_concrete_function(
+        tf.TensorSpec(input_spec.shape, input_spec.dtype, name='input_tensor'))
+    tf.saved_model.save(module, output_dir, signatures=signature)
+
+
+def _run_grappler(graph, output_tensor_names):
+    meta_graph = tf.compat.v1.train.export_meta_graph(graph_def=graph.as_graph_def(), graph=graph)
+    # Grappler keeps whatever the train_op collection fetches and prunes everything else
+    fetch_collection = meta_graph_pb2.CollectionDef()
+    fetch_collection.node_list.value.extend(output_tensor_names)
+    meta_graph.collection_def['train_op'].CopyFrom(fetch_collection)
+
+    config = config_pb2.ConfigProto()
+    rewrite_options = config.graph_options.rewrite_options
+    rewrite_options.optimizers.extend(GRAPPLER_OPTIMIZERS)
+    rewrite_options.meta_optimizer_iterations = rewrite_options.TWO
+    return tf_optimizer.OptimizeGraph(config, meta_graph)
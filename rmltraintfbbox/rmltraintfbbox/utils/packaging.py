@@ -0,0 +1,175 @@
+"""
+Content-hashed artifact packaging for the TF Bounding Box plugin.
+
+Artifacts are hashed in parallel and recorded in a manifest. Content is stored in
+the model bucket as blobs keyed by their sha256 (blobs/<sha256>), so content the
+bucket already holds from an earlier run is found with a direct lookup and not
+uploaded again.
+"""
+
+import os
+import json
+import hashlib
+import zipfile
+import boto3
+from botocore.exceptions import ClientError
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from ravenml.utils.config import get_config
+
+# files that are already compressed or are dense binary tensors gain little from deflate
+STORED_SUFFIXES = ('.zip', '.gz', '.png', '.jpg', '.jpeg', '.pb', '.tflite', '.pickle', '.index')
+STORED_SUBSTRINGS = ('.data-',)
+
+# content-addressed blobs in the model bucket, at blobs/<sha256>
+REMOTE_BLOB_PREFIX = 'blobs'
+
+
+def _should_store(path: str):
+    name = os.path.basename(path).lower()
+    return name.endswith(STORED_SUFFIXES) or any(s in name for s in STORED_SUBSTRINGS)
+
+
+def write_zip(zip_path: str, root_dir: str, base_dir: str):
+    """Zips a directory, storing compressed and binary files uncompressed and deflating the rest.
+
+    Args:
+        zip_path (str): path of the zip file to write
+        root_dir (str): directory the archive paths are relative to
+        base_dir (str): directory within root_dir to archive
+
+    Returns:
+        str: path to the zip file
+    """
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        for dirpath, _, filenames in os.walk(os.path.join(root_dir, base_dir)):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if os.path.abspath(path) == os.path.abspath(zip_path):
+                    continue
+                compression = zipfile.ZIP_STORED if _should_store(path) else zipfile.ZIP_DEFLATED
+                archive.write(path, os.path.relpath(path, root_dir), compress_type=compression)
+    return zip_path
+
+
+def hash_file(path: str, chunk_size: int = 2**20):
+    """Returns the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(paths: list, num_workers: int = 8):
+    """Hashes files in parallel.
+
+    Args:
+        paths (list): paths of files to hash
+        num_workers (int): number of hashing threads
+
+    Returns:
+        dict: sha256 hex digest of each path
+    """
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return dict(zip(paths, executor.map(hash_file, paths)))
+
+
+def blob_key(digest: str):
+    """Returns the key in the model bucket of the blob with this sha256 hex digest."""
+    return f'{REMOTE_BLOB_PREFIX}/{digest}'
+
+
+def _model_bucket():
+    # clients, unlike resources, are safe to share between threads
+    return boto3.client('s3'), get_config()['model_bucket_name']
+
+
+def find_remote_blobs(digests, num_workers: int = 8):
+    """Finds which blobs the model bucket already holds.
+
+    Each digest is looked up directly with a HEAD request, so the cost depends only on
+    the artifacts of this run and not on how much the bucket holds.
+
+    Args:
+        digests (iterable): sha256 hex digests to look up
+        num_workers (int): number of concurrent requests
+
+    Returns:
+        set: the digests whose blob exists
+    """
+    client, bucket = _model_bucket()
+
+    def exists(digest):
+        try:
+            client.head_object(Bucket=bucket, Key=blob_key(digest))
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    digests = list(digests)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return {digest for digest, found in zip(digests, executor.map(exists, digests)) if found}
+
+
+def upload_blobs(blobs: dict, num_workers: int = 8):
+    """Uploads files to the model bucket under their content-addressed keys.
+
+    Args:
+        blobs (dict): path of the file to upload for each sha256 hex digest
+        num_workers (int): number of concurrent uploads
+    """
+    client, bucket = _model_bucket()
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for future in [executor.submit(client.upload_file, str(path), bucket, blob_key(digest))
+                       for digest, path in blobs.items()]:
+            future.result()
+
+
+def package_artifacts(paths: list, artifact_dir: Path, upload: bool = True, num_workers: int = 8):
+    """Writes a manifest of the artifacts and returns the files to hand ravenML for upload.
+
+    Every artifact is hashed and recorded in artifact_dir/manifest.json with its path
+    relative to artifact_dir and the key of its blob in the model bucket. Only the
+    digests of these artifacts are looked up in the bucket, and content it does not
+    hold yet is uploaded once, however many files share it. ravenML is then handed
+    the manifest alone.
+
+    Args:
+        paths (list): artifact files that would otherwise be uploaded
+        artifact_dir (Path): training artifact directory
+        upload (bool): False when nothing is uploaded (local mode): the manifest is written
+            and every file returned
+        num_workers (int): number of hashing threads and concurrent requests
+
+    Returns:
+        list: Paths to hand ravenML, the manifest, preceded by every file in local mode
+    """
+    paths = [str(path) for path in dict.fromkeys(paths) if os.path.isfile(path)]
+    hashes = hash_files(paths, num_workers)
+    stored = find_remote_blobs(set(hashes.values()), num_workers) if upload else set()
+
+    manifest = {'files': [], 'new_bytes': 0, 'total_bytes': 0}
+    new_blobs = {}
+    for path in paths:
+        digest = hashes[path]
+        size = os.path.getsize(path)
+        entry = {'path': os.path.relpath(path, artifact_dir), 'sha256': digest, 'size': size}
+        if not upload:
+            manifest['new_bytes'] += size
+        else:
+            entry['key'] = blob_key(digest)
+            if digest not in stored and digest not in new_blobs:
+                new_blobs[digest] = path
+                manifest['new_bytes'] += size
+        manifest['total_bytes'] += size
+        manifest['files'].append(entry)
+    if new_blobs:
+        upload_blobs(new_blobs, num_workers)
+
+    manifest_path = Path(artifact_dir) / 'manifest.json'
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return ([] if upload else [Path(path) for path in paths]) + [manifest_path]
@@ -0,0 +1,154 @@
+"""
+TFLite export and evaluation for the TF Bounding Box plugin.
+
+Only SSD models with a fixed_shape_resizer can be converted. The converted model
+contains the TFLite detection postprocess op and takes a single image that has
+already been resized and normalized by the model's preprocess.
+"""
+
+import os
+import json
+import time
+import numpy as np
+import tensorflow as tf
+import rmltraintfbbox.validation.utils as utils
+from object_detection import export_tflite_graph_lib_tf2
+from object_detection.builders import decoder_builder, model_builder
+from object_detection.core import standard_fields as fields
+from rmltraintfbbox.validation.stats import BoundingBoxEvaluator
+
+# outputs of the TFLite_Detection_PostProcess op, in the order it produces them
+_POSTPROCESS_OUTPUTS = ['detection_boxes', 'detection_classes', 'detection_scores', 'num_detections']
+
+
+def export_tflite(pipeline_config, trained_checkpoint_dir: str, output_directory: str, quantize: bool = False,
+                  num_calibration_examples: int = 100, max_detections: int = 10):
+    """Exports the latest checkpoint as a TFLite model.
+
+    Args:
+        pipeline_config (TrainEvalPipelineConfig): pipeline config proto
+        trained_checkpoint_dir (str): directory holding the trained checkpoints
+        output_directory (str): directory to write the intermediate SavedModel and .tflite file to
+        quantize (bool): apply full-int8 post-training quantization, calibrated on examples
+            from the eval input of the pipeline config
+        num_calibration_examples (int): number of examples used for calibration
+        max_detections (int): maximum number of detections the model outputs
+
+    Returns:
+        str: path to the .tflite file
+    """
+    export_tflite_graph_lib_tf2.export_tflite_model(pipeline_config, trained_checkpoint_dir, output_directory,
+                                                    max_detections, use_regular_nms=False)
+    converter = tf.lite.TFLiteConverter.from_saved_model(os.path.join(output_directory, 'saved_model'))
+    if quantize:
+        preprocess_fn = _get_preprocess_fn(pipeline_config)
+        decoder = decoder_builder.build(pipeline_config.eval_input_reader[0])
+        input_paths = pipeline_config.eval_input_reader[0].tf_record_input_reader.input_path
+        records = tf.data.TFRecordDataset([f for path in input_paths for f in tf.io.gfile.glob(path)])
+
+        def representative_dataset():
+            for record in records.take(num_calibration_examples):
+                image = decoder.decode(record)[fields.InputDataFields.image]
+                yield [preprocess_fn(image)[0]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+    tflite_path = os.path.join(output_directory, 'model_int8.tflite' if quantize else 'model.tflite')
+    with open(tflite_path, 'wb') as f:
+        f.write(converter.convert())
+    return tflite_path
+
+
+def evaluate_tflite(tflite_path: str, pipeline_config, test_path: str, category_index: dict, output_path: str,
+                    float_stats: dict = None, num_threads: int = None):
+    """Runs a TFLite model over a test directory through BoundingBoxEvaluator.
+
+    Args:
+        tflite_path (str): path to the .tflite file
+        pipeline_config (TrainEvalPipelineConfig): pipeline config proto of the model
+        test_path (str): directory of test images and metadata
+        category_index (dict): category index from the label map
+        output_path (str): directory to write statistics and the comparison report to
+        float_stats (dict): stats of the float model on the same test set, from
+            BoundingBoxEvaluator.stats, to report deltas against (optional)
+        num_threads (int): number of threads for the TFLite interpreter (optional)
+
+    Returns:
+        dict: report with the mAP and mean latency of the TFLite model, and deltas
+            against the float model when float_stats and its latency are given
+    """
+    os.makedirs(output_path, exist_ok=True)
+    preprocess_fn = _get_preprocess_fn(pipeline_config)
+    interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_details = interpreter.get_output_details()
+
+    evaluator = BoundingBoxEvaluator(category_index)
+    truth_data = utils.gen_truth_data(test_path)
+    for image, (bbox, centroid, z) in zip(utils.get_image_dataset(test_path), truth_data):
+        model_input, _ = preprocess_fn(image)
+        interpreter.set_tensor(input_index, model_input.numpy())
+        start = time.time()
+        interpreter.invoke()
+        inference_time = time.time() - start
+        outputs = {detail['name']: interpreter.get_tensor(detail['index']) for detail in output_details}
+        # boxes are normalized, so the evaluator scales them by the original image's shape
+        true_shape = tf.expand_dims(tf.shape(image), 0)
+        evaluator.add_single_result(_parse_outputs(outputs), true_shape, inference_time, bbox, centroid)
+
+    evaluator.calculate_default_and_save(output_path)
+    report = {
+        'tflite_file': os.path.basename(tflite_path),
+        'mAP': evaluator.stats['coco_statistics']['DetectionBoxes_Precision/mAP'],
+        'mean_latency': float(np.mean(evaluator.times))
+    }
+    if float_stats:
+        report['float_mAP'] = float_stats['coco_statistics']['DetectionBoxes_Precision/mAP']
+        report['mAP_delta'] = report['mAP'] - report['float_mAP']
+        if float_stats.get('mean_latency'):
+            report['float_mean_latency'] = float_stats['mean_latency']
+            report['latency_delta'] = report['mean_latency'] - report['float_mean_latency']
+    with open(os.path.join(output_path, 'tflite_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _get_preprocess_fn(pipeline_config):
+    """Returns a function mapping one image to the model input and its true shape."""
+    detection_model = model_builder.build(pipeline_config.model, is_training=False)
+
+    @tf.function
+    def preprocess(image):
+        return detection_model.preprocess(tf.cast(image, tf.float32)[tf.newaxis])
+
+    return preprocess
+
+
+def _parse_outputs(outputs: dict):
+    """Maps the outputs of the TFLite detection postprocess op to the format of the exported SavedModel.
+
+    The op always produces boxes, classes, scores and num_detections, in that order, but the
+    converter may list the model outputs in any order. Each output tensor is named after the op
+    output it holds, i.e 'StatefulPartitionedCall:2' or 'TFLite_Detection_PostProcess:2', with
+    no suffix for the first output, so they are ordered by that index.
+    """
+    if len(outputs) != len(_POSTPROCESS_OUTPUTS):
+        raise ValueError(f'Expected the {len(_POSTPROCESS_OUTPUTS)} outputs of the TFLite detection '
+                         f'postprocess op, got {sorted(outputs)}')
+    ordered = [outputs[name] for name in sorted(outputs, key=_output_index)]
+    parsed = dict(zip(_POSTPROCESS_OUTPUTS, ordered))
+    # classes come out of the postprocess op 0-indexed, as the evaluator expects
+    return {
+        'detection_boxes': tf.constant(parsed['detection_boxes'], tf.float32),
+        'detection_classes': tf.constant(parsed['detection_classes'], tf.float32),
+        'detection_scores': tf.constant(parsed['detection_scores'], tf.float32),
+        'num_detections': tf.constant(parsed['num_detections'].reshape(1), tf.float32)
+    }
+
+
+def _output_index(name: str):
+    """Returns the op output index of a tensor name, i.e 2 for 'StatefulPartitionedCall:2'."""
+    _, _, index = name.rpartition(':')
+    return int(index) if index.isdigit() else 0
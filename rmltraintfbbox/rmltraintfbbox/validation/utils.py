@@ -1,12 +1,15 @@
-import os
-import glob
+import threading
 import tensorflow as tf
-import json
+from concurrent.futures import ThreadPoolExecutor
+from object_detection.utils import visualization_utils
+from rmltraintfcommon.truth_index import load_truth_index
+from rmltraintfcommon.image_dataset import get_image_dataset, add_gaussian_noise  # noqa: F401
 
 
 def gen_truth_data(dir_path, rescale=1.0):
     """
-    Gets ground truth bboxes and centroids from meta_*.json files.
+    Gets ground truth bboxes and centroids from meta_*.json files, through the truth index cached beside
+    the directory.
     :param dir_path: the directory to load metadata from
     :param rescale: adjust the bboxes and centroids to be correct for an image rescaled by this factor
     :return: a generator that, for each image, yield a tuple (bbox_dict, centroid_dict) where:
@@ -14,37 +17,69 @@ def gen_truth_data(dir_path, rescale=1.0):
         and centroid_dict = {classname: centroid} where each centroid = (y, x).
         Both bboxes and centroids are in non-normalized (pixel) coordinates.
     """
-    meta_files = sorted(glob.glob(os.path.join(dir_path, "meta_*")))
-    for meta_file in meta_files:
-        with open(meta_file, 'r') as f:
-            meta = json.load(f)
-        meta['bboxes'] = {cls: {k: v * rescale for k, v in bbox.items()} for cls, bbox in meta['bboxes'].items()}
-        meta['centroids'] = {cls: tuple(v * rescale for v in centroid) for cls, centroid in meta['centroids'].items()}
-        yield meta['bboxes'], meta['centroids'], meta['distance']
+    return load_truth_index(dir_path).iter_truth(rescale)
 
 
-def get_image_dataset(dir_path, rescale=1.0, gaussian_stddev=0.0):
+def unbatch_detections(output, padded_shape, true_shapes):
     """
-    Get a tf.data.Dataset that yields image files from a directory in sorted order.
+    Splits the output of a batched detection model call into per-image outputs.
+    :param output: a dict of detection Tensors with a leading batch dimension
+    :param padded_shape: the shape of the (padded) image batch passed into the model
+    :param true_shapes: a [batch, 3] Tensor of unpadded image shapes, as yielded by `get_image_dataset`
+        with a batch_size
+    :return: a generator that, for each image, yields (output, true_shape) where output keeps a batch dimension
+        of 1 and true_shape has shape [1, 3], as expected by `BoundingBoxEvaluator.add_single_result`.
+        Normalized boxes are corrected for any padding so they are relative to the unpadded image.
     """
-    def image_parser(image_path):
-        img = tf.io.decode_image(tf.io.read_file(image_path), channels=3, expand_animations=False)
-        if gaussian_stddev > 0:
-            img = add_gaussian_noise(img, gaussian_stddev)
-        if rescale != 1:
-            dims = tf.cast(tf.shape(img), tf.float32)[:2]
-            dims = tf.cast(dims * rescale, tf.int32)
-            img = tf.image.resize(img, dims)
-        return tf.cast(img, tf.float32)
-
-    image_files = sorted(glob.glob(os.path.join(dir_path, "image_*")))
-    image_dataset = tf.data.Dataset.from_tensor_slices(image_files).map(image_parser, num_parallel_calls=16)
-    return image_dataset
-
-
-def add_gaussian_noise(img, stddev):
-    img = tf.cast(img, tf.float32) / 255
-    img += tf.random.normal(tf.shape(img), stddev=stddev)
-    img = tf.clip_by_value(img, 0, 1)
-    return tf.cast(img * 255, tf.uint8)
+    padded_dims = tf.cast(padded_shape[1:3], tf.float32)
+    for i in range(true_shapes.shape[0]):
+        true_shape = true_shapes[i:i + 1]
+        scale = padded_dims / tf.cast(true_shape[0, :2], tf.float32)
+        single = {k: v[i:i + 1] for k, v in output.items()}
+        boxes = single['detection_boxes'] * tf.tile(scale, [2])
+        single['detection_boxes'] = tf.clip_by_value(boxes, 0.0, 1.0)
+        yield single, true_shape
+
+
+class VisualizationWriter:
+    """
+    Draws detections on images and writes them to disk on a bounded pool of background threads,
+    so that visualization does not stall inference. Use as a context manager; exiting waits for
+    all pending writes to finish.
+    """
+
+    def __init__(self, category_index, num_threads=4, max_pending=16):
+        self.category_index = category_index
+        self._executor = ThreadPoolExecutor(max_workers=num_threads)
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown(wait=True)
+
+    def submit(self, image, output, path):
+        """
+        Queues a visualization of the top detection on `image` to be written to `path`. Blocks if
+        `max_pending` writes are already queued.
+        :param image: a [h, w, 3] Tensor
+        :param output: a single-image detection output with a batch dimension of 1
+        :param path: output file path
+        """
+        self._pending.acquire()
+        future = self._executor.submit(self._write, image, output, path)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def _write(self, image, output, path):
+        drawn_img = visualization_utils.draw_bounding_boxes_on_image_tensors(
+                                        tf.cast(tf.expand_dims(image, axis=0), dtype=tf.uint8),
+                                        output['detection_boxes'],
+                                        tf.cast(output['detection_classes'] + 1, dtype=tf.int32),
+                                        output['detection_scores'],
+                                        self.category_index,
+                                        max_boxes_to_draw=1,
+                                        min_score_thresh=0)
+        tf.keras.preprocessing.image.save_img(path, drawn_img[0])
 
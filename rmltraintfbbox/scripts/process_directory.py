@@ -3,10 +3,13 @@ import argparse
 import sys
 import os
 import cv2
+import csv
 import time
+import itertools
 from PIL import Image
 import rmltraintfbbox.validation.utils as utils
 from rmltraintfbbox.validation.stats import BoundingBoxEvaluator
+from rmltraintfcommon.runtime import add_runtime_args, configure_runtime, apply_dataset_options
 import object_detection.utils.visualization_utils as visualization
 from object_detection.utils import label_map_util, config_util
 from object_detection.builders import model_builder
@@ -25,6 +28,97 @@ def get_num_classes(label_path):
         num_classes = len(ids)
     return num_classes
 
+
+@tf.function(input_signature=[tf.TensorSpec([None, None, 3], tf.uint8), tf.TensorSpec([None], tf.float32),
+                              tf.TensorSpec([], tf.float32)])
+def perturb(image, stddevs, rescale):
+    """Makes one variant of an image per noise stddev, all rescaled by the same factor, as a single batch.
+
+    Noise and rescaling are applied in the same order and rounding as get_image_dataset, so a grid point
+    matches a run with the same --gaussian-noise and --rescale.
+    """
+    stddevs = stddevs[:, tf.newaxis, tf.newaxis, tf.newaxis]
+    images = tf.tile(image[tf.newaxis], [tf.shape(stddevs)[0], 1, 1, 1])
+    noisy = tf.cast(images, tf.float32) / 255
+    noisy += tf.random.normal(tf.shape(noisy)) * stddevs
+    noisy = tf.cast(tf.clip_by_value(noisy, 0, 1) * 255, tf.uint8)
+    images = tf.where(stddevs > 0, noisy, images)
+    dims = tf.cast(tf.cast(tf.shape(image)[:2], tf.float32) * rescale, tf.int32)
+    return tf.cond(rescale != 1, lambda: tf.cast(tf.image.resize(images, dims), tf.uint8), lambda: images)
+
+
+def sweep(args, runtime, detection_model, category_index):
+    """Evaluates every combination of noise stddev and rescale factor in one pass over the directory.
+
+    Each image is decoded once and all of its variants for a rescale factor are run through the model
+    as one batch, or in batches of the serving signature's fixed batch size. Stats for each grid point
+    are saved in their own subdirectory and summarized in robustness.csv.
+    """
+    stddevs = list(dict.fromkeys(args.sweep_noise or [args.gaussian_noise]))
+    rescales = list(dict.fromkeys(args.sweep_rescale or [args.rescale]))
+    serving_fn = detection_model.signatures['serving_default']
+    input_spec = serving_fn.structured_input_signature[1]['input_tensor']
+    if input_spec.dtype == tf.string:
+        sys.exit('Sweep mode needs a model exported with image_tensor or float_image_tensor input.')
+    if input_spec.shape[1:3].is_fully_defined() and any(rescale != 1 for rescale in rescales):
+        sys.exit(f'The model was exported with a fixed image shape {input_spec.shape[1:3].as_list()}, '
+                 'so it cannot run rescaled images. Sweep rescale factors with a model exported without '
+                 'a fixed image_shape.')
+    chunk = input_spec.shape[0] or len(stddevs)
+
+    image_dataset = utils.get_image_dataset(args.directory, cache_file=args.cache_file)
+    image_dataset = apply_dataset_options(image_dataset, runtime)
+    truth_data = {rescale: list(utils.gen_truth_data(args.directory, rescale=rescale)) for rescale in rescales}
+    if args.num:
+        image_dataset = image_dataset.take(args.num)
+    evaluators = {key: BoundingBoxEvaluator(category_index) for key in itertools.product(stddevs, rescales)}
+
+    for i, image in enumerate(image_dataset):
+        for rescale in rescales:
+            bbox, centroid, z = truth_data[rescale][i]
+            variants = perturb(image, tf.constant(stddevs, tf.float32), rescale)
+            true_shape = tf.expand_dims(tf.shape(variants)[1:], axis=0)
+            for start in range(0, len(stddevs), chunk):
+                batch = tf.cast(variants[start:start + chunk], input_spec.dtype)
+                num_variants = len(batch)
+                if num_variants < chunk:
+                    # a fixed batch size needs the last batch padded, the padded outputs are dropped below
+                    batch = tf.pad(batch, [[0, chunk - num_variants], [0, 0], [0, 0], [0, 0]])
+                begin = time.time()
+                batch_output = serving_fn(input_tensor=batch)
+                batch_output['num_detections'].numpy()
+                # inference time is amortized over the variants in the batch
+                inference_time = (time.time() - begin) / num_variants
+                for j, stddev in enumerate(stddevs[start:start + chunk]):
+                    output = {k: v[j:j + 1] for k, v in batch_output.items()}
+                    output['detection_classes'] = output['detection_classes'] - 1
+                    evaluators[stddev, rescale].add_single_result(output, true_shape, inference_time, bbox, centroid)
+
+    rows = []
+    for (stddev, rescale), evaluator in evaluators.items():
+        output_path = os.path.join(args.output, f'noise_{stddev:g}_rescale_{rescale:g}')
+        os.makedirs(output_path, exist_ok=True)
+        evaluator.dump(os.path.join(output_path, 'validation_results.pickle'))
+        evaluator.calculate_default_and_save(output_path)
+        coco = evaluator.stats['coco_statistics']
+        rows.append({
+            'gaussian_noise': stddev,
+            'rescale': rescale,
+            'mAP': coco['DetectionBoxes_Precision/mAP'],
+            'mAP@.50IOU': coco['DetectionBoxes_Precision/mAP@.50IOU'],
+            'AR@100': coco['DetectionBoxes_Recall/AR@100'],
+            'mean_latency': evaluator.stats['average_inference_time']
+        })
+
+    with open(os.path.join(args.output, 'robustness.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(' '.join(f'{name:>14}' for name in rows[0]))
+    for row in rows:
+        print(' '.join(f'{value:>14.4f}' for value in row.values()))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-e', '--exportdir', type=str, help="Path to export directory", required=True)
@@ -35,12 +129,26 @@ def main():
     parser.add_argument('-v', '--vis', action="store_true", help="Write out visualizations (optional)")
     parser.add_argument('--gaussian-noise', type=float, help="Add Gaussian noise with a certain stddev (optional)", default=0.0)
     parser.add_argument('-r', '--rescale', type=float, help="Rescale images by this much (optional)", default=1.0)
+    parser.add_argument('--cache-file', type=str, help="Cache decoded images in this file for repeated runs (optional)")
+    parser.add_argument('--sweep-noise', type=float, nargs='+',
+                        help="Evaluate each of these Gaussian noise stddevs in one pass (optional)")
+    parser.add_argument('--sweep-rescale', type=float, nargs='+',
+                        help="Evaluate each of these rescale factors in one pass (optional)")
+    add_runtime_args(parser)
     args = parser.parse_args()
+    runtime = configure_runtime(**vars(args))
 
     if not os.path.exists(args.output):
         os.mkdir(args.output)
 
-    image_dataset = utils.get_image_dataset(args.directory, rescale=args.rescale, gaussian_stddev=args.gaussian_noise)
+    if args.sweep_noise or args.sweep_rescale:
+        detection_model = tf.saved_model.load(args.exportdir + '/saved_model')
+        sweep(args, runtime, detection_model, get_category_index(args.labelmap))
+        return
+
+    image_dataset = utils.get_image_dataset(args.directory, rescale=args.rescale, gaussian_stddev=args.gaussian_noise,
+                                            cache_file=args.cache_file)
+    image_dataset = apply_dataset_options(image_dataset, runtime)
     truth_data = list(utils.gen_truth_data(args.directory, rescale=args.rescale))
 
     if args.num:
@@ -54,12 +162,12 @@ def main():
     for (i, (bbox, centroid, z)), image in zip(enumerate(truth_data), image_dataset):
         true_shape = tf.expand_dims(tf.convert_to_tensor(image.shape), axis=0)
         start = time.time()
-        output = detection_model(tf.cast(tf.expand_dims(image, axis=0), dtype=tf.uint8))
+        output = detection_model(tf.expand_dims(image, axis=0))
         inference_time = time.time() - start
         output['detection_classes'] = output['detection_classes'] - 1
         evaluator.add_single_result(output, true_shape, inference_time, bbox, centroid)
         if args.vis:
-            drawn_img = visualization.draw_bounding_boxes_on_image_tensors(tf.cast(tf.expand_dims(image, axis=0), dtype=tf.uint8), 
+            drawn_img = visualization.draw_bounding_boxes_on_image_tensors(tf.expand_dims(image, axis=0), 
                                         output['detection_boxes'], tf.cast(output['detection_classes'] + 1, dtype=tf.int32), 
                                         output['detection_scores'], category_index, max_boxes_to_draw=1, min_score_thresh=0, 
                                         use_normalized_coordinates=True)
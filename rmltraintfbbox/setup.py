@@ -37,6 +37,7 @@ setup(
     description='Tensorflow Bounding Box training plugin for ravenml',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.16.4',
         'object-detection @ https://github.com/autognc/object-detection/tarball/object-detection-v2#egg=object-detection-v2',
         'slim @ https://github.com/autognc/object-detection/tarball/slim-v2#slim-v2',
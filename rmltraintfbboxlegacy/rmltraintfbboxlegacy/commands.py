@@ -0,0 +1,334 @@
+"""
+Author(s):      Nihal Dhamani (nihaldhamani@gmail.com), 
+                Carson Schubert (carson.schubert14@gmail.com)
+Date Created:   12/06/2019
+
+Commands for TF Bounding Box plugin, loaded lazily by the command group in core.py.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from comet_ml import Experiment
+import os
+import click 
+import yaml
+import re
+import glob
+import json
+import traceback
+import rmltraintfbboxlegacy.validation.utils as utils
+from contextlib import ExitStack
+from pathlib import Path
+from datetime import datetime
+from ravenml.train.options import pass_train
+from ravenml.train.interfaces import TrainInput, TrainOutput
+from ravenml.utils.question import user_selects, user_input
+from ravenml.utils.plugins import raise_parameter_error
+from ravenml.utils.local_cache import RMLCache
+from rmltraintfbboxlegacy.utils.helpers import prepare_for_training, download_model_arch, ARCHS_SUBPATH
+from rmltraintfcommon.run_config import create_run_config
+from rmltraintfcommon.arch_cache import fetch_model_arch
+from rmltraintfcommon.graph_optimizer import optimize_frozen_graph, load_sample_images
+from rmltraintfbboxlegacy.validation.model import BoundingBoxModel
+from rmltraintfbboxlegacy.validation.stats import BoundingBoxEvaluator
+from google.protobuf import text_format
+import tensorflow as tf
+from object_detection import model_hparams, model_lib, exporter
+from object_detection.protos import pipeline_pb2
+
+# regex to ignore 0 indexed checkpoints
+checkpoint_regex = re.compile(r'model.ckpt-[1-9][0-9]*.[a-zA-Z0-9_-]+')
+
+### OPTIONS ###
+
+### COMMANDS ###
+@click.command(help='Train a model.')
+@pass_train
+@click.pass_context
+def train(ctx: click.Context, train: TrainInput):
+    # If the context has a TrainInput already, it is passed as "train"
+    # If it does not, the constructor is called AUTOMATICALLY
+    # by Click because the @pass_train decorator is set to ensure
+    # object creation, after which execution will fail as this means 
+    # the user did not pass a config. see ravenml core file train/commands.py for more detail
+    
+    # NOTE: after training, you must create an instance of TrainOutput and return it
+    
+
+    ## SET UP CONFIG ##
+    config = train.plugin_config
+    metadata = train.plugin_metadata
+    comet = config.get('comet')
+
+    # set up TF verbosity
+    if config['verbose']:
+        tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+    else:
+        tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.FATAL)
+    
+    # set base directory for model artifacts 
+    base_dir = train.artifact_path
+ 
+    # load model choices from YAML
+    models = {}
+    models_path = os.path.dirname(__file__) / Path('utils') / Path('model_info.yml')
+    with open(models_path, 'r') as stream:
+        try:
+            models = yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            print(exc)
+    
+    # prompt for model selection if not in config
+    model_name = config.get('model')
+    model_name = model_name if model_name else user_selects('Choose model', models.keys())
+    # grab fields and add to metadata
+    try:
+        model = models[model_name]
+    except KeyError as e:
+        hint = 'model name, model is not supported by this plugin.'
+        raise_parameter_error(model_name, hint)
+    
+    # extract information and add to metadata
+    model_type = model['type']
+    model_url = model['url']
+    metadata['architecture'] = model_name
+    
+    # download model arch
+    arch_path = download_model_arch(model_url, train.plugin_cache, model.get('sha256'))
+
+    # prepare directory for training/prompt for hyperparams
+    if not prepare_for_training(train.plugin_cache, train.artifact_path, train.dataset.path, 
+        arch_path, model_type, metadata, train.plugin_config):
+        ctx.exit('Training cancelled.')
+
+    model_dir = os.path.join(base_dir, 'models/model')
+    pipeline_config_path = os.path.join(model_dir, 'pipeline.config')
+
+    experiment = None
+    if comet:
+        experiment = Experiment(workspace='seeker-rd', project_name='bounding-box')
+        experiment.set_name(comet)
+        experiment.log_parameters(metadata['hyperparameters'])
+        experiment.set_git_metadata()
+        experiment.set_os_packages()
+        experiment.set_pip_packages()
+        experiment.log_parameter('dataset_name', train.config['dataset'])
+        experiment.log_asset(pipeline_config_path)
+
+    # get number of training steps
+    num_train_steps = metadata['hyperparameters']['train_steps']
+    num_train_steps = int(num_train_steps)
+
+    tf_config = create_run_config(model_dir, metadata['run_config'])
+    train_and_eval_dict = model_lib.create_estimator_and_inputs(
+        run_config=tf_config,
+        sample_1_of_n_eval_examples=1,
+        hparams=model_hparams.create_hparams(None),
+        pipeline_config_path=pipeline_config_path,
+        train_steps=num_train_steps)
+    
+    estimator = train_and_eval_dict['estimator']
+    train_input_fn = train_and_eval_dict['train_input_fn']
+    eval_input_fns = train_and_eval_dict['eval_input_fns']
+    eval_on_train_input_fn = train_and_eval_dict['eval_on_train_input_fn']
+    predict_input_fn = train_and_eval_dict['predict_input_fn']
+    train_steps = train_and_eval_dict['train_steps']
+
+    train_spec, eval_specs = model_lib.create_train_and_eval_specs(
+        train_input_fn,
+        eval_input_fns,
+        eval_on_train_input_fn,
+        predict_input_fn,
+        train_steps,
+        final_exporter_name='exported_model',
+        eval_on_train_data=False)
+
+    # actually train
+    with ExitStack() as stack:
+        if comet:
+            stack.enter_context(experiment.train())
+        click.echo('Training model...')
+        tf.estimator.train_and_evaluate(estimator, train_spec, eval_specs[0])
+        click.echo('Training complete')
+
+    # final metadata and return of TrainOutput object
+    metadata['date_completed_at'] = datetime.utcnow().isoformat() + "Z"
+
+    # get extra config files
+    extra_files, frozen_graph_path = _get_paths_for_extra_files(base_dir)
+    model_path = str(frozen_graph_path)
+    if comet:
+        experiment.log_asset(model_path)
+
+    # TODO: make evaluation optional
+    try:
+        click.echo("Evaluating model...")
+        with ExitStack() as stack:
+            if comet:
+                stack.enter_context(experiment.validate())
+
+            # path to label_map.pbtxt
+            label_path = str(extra_files[-1])
+            test_path = str(train.dataset.path / 'test')
+            output_path = str(base_dir / 'validation')
+
+            eval_batch_size = config.get('eval_batch_size', 8)
+            truth_data = utils.gen_truth_data(test_path)
+
+            model = BoundingBoxModel(model_path, label_path)
+            evaluator = BoundingBoxEvaluator(model.category_index)
+            results = model.run_inference_on_dataset(
+                lambda: utils.get_image_dataset(test_path, batch_size=eval_batch_size))
+            for outputs, _, inference_time in results:
+                for output, (bbox, centroid, _) in zip(outputs, truth_data):
+                    evaluator.add_single_result(output, inference_time, bbox, centroid)
+
+            evaluator.dump(os.path.join(output_path, 'validation_results.pickle'))
+            if comet:
+                experiment.log_asset('validation_results.pickle')
+            evaluator.calculate_default_and_save(output_path)
+
+            extra_files.append(os.path.join(output_path, 'stats.json'))
+            extra_files.append(os.path.join(output_path, 'validation_results.pickle'))
+            extra_files += glob.glob(os.path.join(output_path, '*_curve_*.png'))
+            if comet:
+                experiment.log_asset(os.path.join(output_path, 'stats.json'))
+                for img in glob.glob(os.path.join(output_path, '*_curve_*.png')):
+                    experiment.log_image(img)
+    except Exception:
+        metadata['validation_error'] = traceback.format_exc()
+
+    if comet:
+        experiment.log_asset_data(train.metadata, file_name="metadata.json")
+
+    # export metadata locally
+    with open(base_dir / 'metadata.json', 'w') as f:
+        json.dump(train.metadata, f, indent=2)
+        
+    result = TrainOutput(Path(model_path), extra_files)
+    return result
+    
+
+@click.command(help='Populate the model architecture cache from local tarballs.')
+@click.argument('tarballs', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--cache-path', type=click.Path(file_okay=False),
+              help=f'Root of the plugin cache, the directory holding {ARCHS_SUBPATH}. '
+                   'Defaults to the cache ravenML gives this plugin when training.')
+@click.pass_context
+def seed_cache(ctx, tarballs, cache_path):
+    # ravenML names the plugin cache after the command the plugin is invoked as
+    cache_path = Path(cache_path) if cache_path else RMLCache(ctx.parent.info_name).path
+    archs_path = cache_path / ARCHS_SUBPATH
+    # tarballs are named after the architecture they hold, as on download.tensorflow.org
+    for tarball in tarballs:
+        model_name = os.path.basename(tarball)
+        for suffix in ('.tar.gz', '.tgz', '.tar'):
+            if model_name.endswith(suffix):
+                model_name = model_name[:-len(suffix)]
+                break
+        click.echo(f'Seeding {model_name}...')
+        fetch_model_arch(os.path.abspath(tarball), archs_path, model_name)
+
+
+@click.command(help='Write an inference-optimized copy of a frozen graph beside it.')
+@click.argument('model_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('-d', '--directory', type=click.Path(exists=True, file_okay=False),
+              help='Directory of image_* files to validate the optimized graph on, random images otherwise.')
+@click.option('-n', '--num', type=int, default=10, show_default=True, help='Number of sample images.')
+@click.option('--steps', type=int, default=20, show_default=True, help='Timed calls per graph.')
+def optimize_graph(model_path, directory, num, steps):
+    report = optimize_frozen_graph(model_path, load_sample_images(directory, num), steps=steps)
+    click.echo(f"nodes: {report['nodes']} -> {report['optimized_nodes']}")
+    click.echo(f"latency: {report['latency'] * 1000:.1f} ms -> {report['optimized_latency'] * 1000:.1f} ms "
+               f"({report['speedup']:.2f}x)")
+    if report['outputs_match']:
+        click.echo(f"Wrote {report['optimized_path']}")
+    else:
+        click.echo('Outputs of the optimized graph differ from the original, nothing was written.')
+
+
+### HELPERS ###
+def _get_paths_for_extra_files(artifact_path: Path):
+    """Returns the filepaths for all checkpoint, config, and pbtxt (label)
+    files in the artifact directory. Gets filepath for the exported inference
+    graph.
+
+    Args:
+        artifact_path (Path): path to training artifacts
+    
+    Returns:
+        list: list of Paths that point to files
+    """
+    extras = []
+    # get checkpoints
+    extras_path = artifact_path / 'models' / 'model'
+    files = os.listdir(extras_path)
+
+    # path to saved_model.pb
+    saved_model_path = extras_path / 'export' / 'exported_model'
+    saved_model_path = saved_model_path / os.listdir(saved_model_path)[0] / 'saved_model.pb'
+
+    # path to label map
+    labels_path = artifact_path / 'data' / 'label_map.pbtxt'
+
+    checkpoints = [f for f in files if checkpoint_regex.match(f)]
+
+    # calculate the max checkpoint
+    max_checkpoint = 0
+    for checkpoint in checkpoints:
+        checkpoint_num = int(checkpoint.split('-')[1].split('.')[0])
+        if checkpoint_num > max_checkpoint:
+            max_checkpoint = checkpoint_num
+
+    ckpt_prefix = 'model.ckpt-' + str(max_checkpoint)
+    checkpoint_path = extras_path / ckpt_prefix
+    pipeline_path = extras_path / 'pipeline.config'
+    exported_dir = artifact_path / 'frozen_model'
+
+    # export frozen inference graph
+    _export_frozen_inference_graph(str(pipeline_path), str(checkpoint_path), str(exported_dir))
+
+    # append files to include in extras directory
+    extras = [extras_path / f for f in checkpoints]
+    extras.append(pipeline_path)
+    extras.append(extras_path / 'graph.pbtxt')
+    extras.append(saved_model_path)
+
+    # path to exported frozen inference model
+    frozen_graph_path = exported_dir / 'frozen_inference_graph.pb'
+
+    # append event checkpoints for tensorboard
+    for f in os.listdir(extras_path):
+        if f.startswith('events.out'):
+            extras.append(extras_path / f)
+
+    for f in os.listdir(extras_path / 'eval_0'):
+        if f.startswith('events.out'):
+            extras.append(extras_path / 'eval_0' / f)
+
+    extras.append(labels_path)
+    return extras, frozen_graph_path
+
+def _export_frozen_inference_graph(pipeline_config_path, checkpoint_path, output_directory):
+    """Exports frozen inference graph from model checkpoints
+
+    Args: 
+        pipeline_config_path (str): path to pipeline config file
+        checkpoint_path (str): path to checkpoint prefix with highest steps
+            e.g. the checkpoint_path for /model/model.ckpt-100.index is 
+            /model/model.ckpt-100
+        output_directory (str): directory where the frozen_inference_graph will
+            be outputted to
+    """
+    
+    pipeline_config = pipeline_pb2.TrainEvalPipelineConfig()
+    with tf.gfile.GFile(pipeline_config_path, 'r') as f:
+        text_format.Merge(f.read(), pipeline_config)
+    text_format.Merge('', pipeline_config)
+    
+    input_shape = None
+    exporter.export_inference_graph(
+        'image_tensor', pipeline_config, checkpoint_path,
+        output_directory, input_shape=input_shape,
+        write_inference_graph=False)
@@ -5,6 +5,7 @@ from contextlib import contextmanager
 from collections import defaultdict
 from object_detection.utils import label_map_util
 import object_detection.utils.visualization_utils as visualization
+from rmltraintfcommon.graph_optimizer import load_graph_def
 
 
 class BoundingBoxModel:
@@ -52,6 +53,76 @@ class BoundingBoxModel:
             return parsed, inference_time, image
         return parsed, inference_time
 
+    def run_inference_on_batch(self, images, true_shapes=None):
+        """
+        Runs inference on a batch of images with a single session call. Must be called inside a
+        "with start_session():" block.
+
+        :param images: NumPy array, shape (n, h, w, 3), or a list of (h, w, 3) arrays, which are zero-padded
+            on the bottom and right to the largest of them.
+        :param true_shapes: the unpadded (h, w, ...) of each image, shape (n, >= 2), if images is an array
+            that was already padded, e.g by `utils.get_image_dataset` with a batch_size. (optional)
+        :return: A tuple (outputs, inference_time) where outputs is a list holding the parsed output of each
+            image and inference_time is the time of the call divided by the number of images.
+        """
+        if not self.sess:
+            raise ValueError('Please call this method inside of a "with start_session():" block')
+        if isinstance(images, (list, tuple)):
+            images, true_shapes = self.pad_images(images)
+        start_time = time.time()
+        raw_output = self.sess.run(self.output_tensors, feed_dict={self.input_tensor: images})
+        inference_time = (time.time() - start_time) / len(images)
+        parsed = self.parse_batch_output(self.category_index, raw_output, images.shape[1], images.shape[2],
+                                         true_shapes=true_shapes)
+        return parsed, inference_time
+
+    def run_inference_on_dataset(self, dataset_fn, **kwargs):
+        """
+        Runs inference on a tf.data pipeline in a single session. The model is imported into the graph of
+        the pipeline with its input bound to the iterator, so decoding and prefetching overlap with inference
+        and images never pass through NumPy or feed_dict. Does not need a "with start_session():" block.
+
+        :param dataset_fn: a function that builds the pipeline, called inside its graph. The pipeline must
+            yield uint8 (images, true_shapes) batches, as `utils.get_image_dataset` does with a batch_size.
+        :param kwargs: passed on to the tf.Session, i.e a config
+        :return: A generator yielding a tuple (outputs, true_shapes, inference_time) for each batch, where
+            outputs is a list holding the parsed output of each image and inference_time is the time of the
+            call divided by the number of images. As the pipeline runs ahead, this is the time spent waiting
+            on inference rather than on decoding.
+        """
+        with tf.Graph().as_default() as graph:
+            images, true_shapes = dataset_fn().make_one_shot_iterator().get_next()
+            output_tensors = dict(zip(self.output_tensors, tf.import_graph_def(
+                self.graph.as_graph_def(), input_map={self.input_tensor.name: images},
+                return_elements=[tensor.name for tensor in self.output_tensors.values()], name='model'
+            )))
+            fetches = (output_tensors, tf.shape(images), true_shapes)
+        with tf.Session(graph=graph, **kwargs) as sess:
+            while True:
+                start_time = time.time()
+                try:
+                    raw_output, batch_shape, batch_true_shapes = sess.run(fetches)
+                except tf.errors.OutOfRangeError:
+                    return
+                inference_time = (time.time() - start_time) / batch_shape[0]
+                parsed = self.parse_batch_output(self.category_index, raw_output, batch_shape[1], batch_shape[2],
+                                                 true_shapes=batch_true_shapes)
+                yield parsed, batch_true_shapes, inference_time
+
+    @classmethod
+    def pad_images(cls, images):
+        """
+        Zero-pads images on the bottom and right to a common size.
+        :param images: a list of NumPy arrays, shape (h, w, 3)
+        :return: a tuple (batch, true_shapes) where batch has shape (n, max h, max w, 3) and true_shapes
+            holds the (h, w, 3) of each image.
+        """
+        true_shapes = np.array([image.shape for image in images])
+        batch = np.zeros((len(images), *true_shapes[:, :2].max(axis=0), 3), dtype=images[0].dtype)
+        for i, image in enumerate(images):
+            batch[i, :image.shape[0], :image.shape[1]] = image
+        return batch, true_shapes
+
     @classmethod
     def get_num_classes(cls, label_path):
         with open(label_path, "r") as f:
@@ -69,9 +140,10 @@ class BoundingBoxModel:
 
     @classmethod
     def get_model_graph(cls, model_path):
-        with tf.gfile.GFile(model_path, "rb") as f:
-            graph_def = tf.GraphDef()
-            graph_def.ParseFromString(f.read())
+        """
+        Loads a frozen graph, or its inference-optimized copy if one was written by `optimize-graph`.
+        """
+        graph_def = load_graph_def(model_path)
         with tf.Graph().as_default() as graph:
             tf.import_graph_def(graph_def, name="")
         return graph
@@ -101,24 +173,41 @@ class BoundingBoxModel:
         :return: a dictionary of the form {classname: [(confidence, bbox)]} where bbox is a
         dict with keys xmin, xmax, ymin, ymax (non-normalized).
         """
-        # unpack the outputs, which come with a batch dimension
-        num_detections = int(output['num_detections'][0])
-        detection_classes = output['detection_classes'][0].astype(np.int)
-        detection_boxes = output['detection_boxes'][0]
-        detection_scores = output['detection_scores'][0]
-
-        detections = defaultdict(list)
-        for i in range(num_detections):
-            score = detection_scores[i]
-            box = detection_boxes[i]
-            class_id = detection_classes[i]
-            class_name = category_index[class_id]['name']
-            bbox = {
-                'xmin': box[1] * image_width,
-                'xmax': box[3] * image_width,
-                'ymin': box[0] * image_height,
-                'ymax': box[2] * image_height
-            }
-            detections[class_name].append((score, bbox))
-
-        return dict(detections)
+        return cls.parse_batch_output(category_index, output, image_height, image_width)[0]
+
+    @classmethod
+    def parse_batch_output(cls, category_index, output, image_height, image_width, true_shapes=None):
+        """
+        Parses the raw output of the object detection model for a batch of images, scaling all boxes at once.
+        :param category_index: a category index created with `get_category_index`
+        :param output: a dict obtained by running the model on a batch and fetching, at the very least, all of
+        the output tensors provided by `get_input_and_output_tensors`.
+        :param image_height: the height of the (padded) images fed to the model
+        :param image_width: the width of the (padded) images fed to the model
+        :param true_shapes: the unpadded (h, w, ...) of each image, boxes are clipped to them. (optional)
+        :return: a list holding, for each image, a dictionary of the form {classname: [(confidence, bbox)]}
+        where bbox is a dict with keys xmin, xmax, ymin, ymax (non-normalized).
+        """
+        num_detections = output['num_detections'].astype(np.int)
+        detection_classes = output['detection_classes'].astype(np.int)
+        detection_scores = output['detection_scores']
+        # padding is on the bottom and right, so pixel coordinates in the padded image hold for the unpadded one
+        detection_boxes = output['detection_boxes'] * np.array([image_height, image_width] * 2)
+        if true_shapes is not None:
+            limits = np.tile(np.asarray(true_shapes)[:, None, :2], 2)
+            detection_boxes = np.minimum(detection_boxes, limits)
+
+        results = []
+        for n, count in enumerate(num_detections):
+            detections = defaultdict(list)
+            for score, box, class_id in zip(detection_scores[n, :count], detection_boxes[n, :count],
+                                            detection_classes[n, :count]):
+                bbox = {
+                    'xmin': box[1],
+                    'xmax': box[3],
+                    'ymin': box[0],
+                    'ymax': box[2]
+                }
+                detections[category_index[class_id]['name']].append((score, bbox))
+            results.append(dict(detections))
+        return results
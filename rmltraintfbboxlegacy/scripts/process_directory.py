@@ -6,6 +6,8 @@ import cv2
 import rmltraintfbboxlegacy.validation.utils as utils
 from rmltraintfbboxlegacy.validation.model import BoundingBoxModel
 from rmltraintfbboxlegacy.validation.stats import BoundingBoxEvaluator
+from rmltraintfcommon.runtime import add_runtime_args, configure_runtime, session_config, \
+    apply_dataset_options
 import object_detection.utils.visualization_utils as visualization
 
 
@@ -19,34 +21,56 @@ def main():
     parser.add_argument('-v', '--vis', action="store_true", help="Write out visualizations (optional)")
     parser.add_argument('--gaussian-noise', type=float, help="Add Gaussian noise with a certain stddev (optional)", default=0.0)
     parser.add_argument('-r', '--rescale', type=float, help="Rescale images by this much (optional)", default=1.0)
+    parser.add_argument('-b', '--batch-size', type=int, help="Images per inference call, ignored with --vis (optional)",
+                        default=1)
+    parser.add_argument('--cache-file', type=str, help="Cache decoded images in this file for repeated runs (optional)")
+    add_runtime_args(parser)
     args = parser.parse_args()
+    runtime = configure_runtime(**vars(args))
 
     if not os.path.exists(args.output):
         print(f"Path '{args.output}' does not exist.")
         sys.exit(1)
 
-    image_dataset = utils.get_image_dataset(args.directory, rescale=args.rescale, gaussian_stddev=args.gaussian_noise)
     truth_data = list(utils.gen_truth_data(args.directory, rescale=args.rescale))
     if args.num:
-        image_dataset = image_dataset.take(args.num)
         truth_data = truth_data[:args.num]
 
+    def image_dataset_fn(batch_size=None):
+        image_dataset = utils.get_image_dataset(args.directory, rescale=args.rescale,
+                                                gaussian_stddev=args.gaussian_noise, batch_size=batch_size,
+                                                cache_file=args.cache_file)
+        image_dataset = apply_dataset_options(image_dataset, runtime)
+        if args.num:
+            image_dataset = image_dataset.take(-(-args.num // (batch_size or 1)))
+        return image_dataset
+
     model = BoundingBoxModel(args.model, args.labelmap)
     evaluator = BoundingBoxEvaluator(model.category_index, fov=39.59775533586952, distance_unit='meters')
-    image_tensor = image_dataset.make_one_shot_iterator().get_next()
-    with tf.Session() as sess:
-        with model.start_session():
-            for i, (bbox, centroid, distance) in enumerate(truth_data):
-                image = sess.run(image_tensor)
-                if args.vis:
+    if args.vis:
+        # visualizations are drawn one image at a time, so the images are fetched to NumPy
+        image_tensor = image_dataset_fn().make_one_shot_iterator().get_next()
+        with tf.Session(config=session_config(runtime)) as sess:
+            with model.start_session(config=session_config(runtime)):
+                for i, (bbox, centroid, distance) in enumerate(truth_data):
+                    image = sess.run(image_tensor)
                     output, inference_time, vis_img =\
                         model.run_inference_on_single_image(image, vis=True, vis_threshold=0.0)
                     cv2.imwrite(os.path.join(args.output, f'{str(i).zfill(5)}.png'), vis_img)
-                else:
-                    output, inference_time = model.run_inference_on_single_image(image)
+                    evaluator.add_single_result(
+                        output, inference_time, bbox, centroid,
+                        image_size=image.shape[1], distance=distance / 17
+                    )
+    else:
+        # decoding, prefetching and inference run in one session
+        truth = iter(truth_data)
+        results = model.run_inference_on_dataset(lambda: image_dataset_fn(args.batch_size),
+                                                 config=session_config(runtime))
+        for outputs, true_shapes, inference_time in results:
+            for output, true_shape, (bbox, centroid, distance) in zip(outputs, true_shapes, truth):
                 evaluator.add_single_result(
                     output, inference_time, bbox, centroid,
-                    image_size=image.shape[1], distance=distance / 17
+                    image_size=true_shape[1], distance=distance / 17
                 )
 
     evaluator.dump(os.path.join(args.output, 'results.pickle'))
@@ -21,6 +21,7 @@ setup(
     description='Tensorflow Bounding Box training plugin for ravenml',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.16.4',
         'cython==0.29.13',
         'object-detection @ https://github.com/autognc/object-detection/tarball/object-detection#egg=object-detection',
@@ -0,0 +1,178 @@
+"""
+Model architecture cache for the Object Detection API plugins (bbox, bbox legacy,
+instance segmentation).
+
+Architecture tarballs are streamed straight into tarfile while they download, so
+nothing is written to disk except the extracted files. Extraction goes to a
+temporary directory that is renamed into place once complete, and a manifest of
+checksums is written beside it, so an interrupted download never looks like a
+cached architecture. A lock file serializes trainings on the same host that
+fetch the same architecture.
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import urllib.request
+from pathlib import Path
+from contextlib import contextmanager
+
+CHUNK_SIZE = 2**20
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts the bytes read through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+    def drain(self):
+        """Reads to the end of the stream, tarfile stops before the trailing padding."""
+        for _ in iter(lambda: self.read(CHUNK_SIZE), b''):
+            pass
+
+
+@contextmanager
+def _lock(lock_path: Path):
+    with open(lock_path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _hash_file(path: Path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(archs_path: Path, model_name: str):
+    return archs_path / f'{model_name}.manifest.json'
+
+
+def _open_source(source: str):
+    """Opens a URL or local path for streaming."""
+    if os.path.exists(source):
+        return open(source, 'rb')
+    return urllib.request.urlopen(source)
+
+
+def _is_safe_member(member: tarfile.TarInfo):
+    if not (member.isfile() or member.isdir()):
+        return False
+    path = os.path.normpath(member.name)
+    return not (os.path.isabs(path) or path == '..' or path.startswith('..' + os.sep))
+
+
+def is_cached(archs_path: Path, model_name: str, verify: bool = False):
+    """Checks that an architecture is in the cache and matches its manifest.
+
+    Args:
+        archs_path (Path): directory holding cached architectures
+        model_name (str): name of the architecture
+        verify (bool): check the sha256 of every file rather than only its size
+
+    Returns:
+        bool: True if the architecture is cached and intact
+    """
+    manifest_path = _manifest_path(archs_path, model_name)
+    model_path = archs_path / model_name
+    if not (manifest_path.exists() and model_path.is_dir()):
+        return False
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        for entry in manifest['files']:
+            path = model_path / entry['path']
+            if not path.is_file() or path.stat().st_size != entry['size']:
+                return False
+            if verify and _hash_file(path) != entry['sha256']:
+                return False
+    except (ValueError, KeyError, OSError):
+        return False
+    return True
+
+
+def fetch_model_arch(source: str, archs_path: Path, model_name: str, sha256: str = None):
+    """Streams an architecture tarball into the cache unless it is already cached.
+
+    Args:
+        source (str): URL or local path of a .tar.gz of the architecture
+        archs_path (Path): directory holding cached architectures
+        model_name (str): name of the architecture, the tarball's top level directory
+        sha256 (str): expected sha256 of the tarball (optional)
+
+    Returns:
+        Path: path to the extracted architecture
+
+    Raises:
+        ChecksumError: if the tarball does not match sha256
+    """
+    archs_path = Path(archs_path)
+    archs_path.mkdir(parents=True, exist_ok=True)
+    model_path = archs_path / model_name
+    with _lock(archs_path / f'.{model_name}.lock'):
+        # another process may have filled the cache while this one waited on the lock
+        if is_cached(archs_path, model_name):
+            return model_path
+
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f'.{model_name}.', dir=archs_path))
+        try:
+            with _open_source(source) as f:
+                reader = _HashingReader(f)
+                with tarfile.open(fileobj=reader, mode='r|*') as tar:
+                    for member in tar:
+                        if _is_safe_member(member):
+                            tar.extract(member, tmp_dir)
+                reader.drain()
+            tar_sha256 = reader.digest.hexdigest()
+            if sha256 and tar_sha256 != sha256:
+                raise ChecksumError(f'{source} has sha256 {tar_sha256}, expected {sha256}.')
+
+            # tarballs hold a single top level directory named after the model
+            extracted = tmp_dir / model_name if (tmp_dir / model_name).is_dir() else tmp_dir
+            files = sorted(path for path in extracted.rglob('*') if path.is_file())
+            manifest = {
+                'source': source,
+                'sha256': tar_sha256,
+                'size': reader.size,
+                'files': [{
+                    'path': str(path.relative_to(extracted)),
+                    'size': path.stat().st_size,
+                    'sha256': _hash_file(path)
+                } for path in files]
+            }
+
+            # drop the manifest first so a crash between the renames leaves an uncached entry
+            manifest_path = _manifest_path(archs_path, model_name)
+            if manifest_path.exists():
+                manifest_path.unlink()
+            if model_path.exists():
+                shutil.rmtree(model_path)
+            os.replace(extracted, model_path)
+            with open(str(manifest_path) + '.tmp', 'w') as mf:
+                json.dump(manifest, mf, indent=2)
+            os.replace(str(manifest_path) + '.tmp', manifest_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return model_path
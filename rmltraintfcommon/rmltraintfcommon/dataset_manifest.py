@@ -0,0 +1,341 @@
+"""
+Cached dataset manifest shared by the Tensorflow training plugins.
+
+Facts about a dataset (class count, TFRecord shards and their record counts, and
+an index of the image_*/meta_* files of evaluation directories with image
+dimensions and byte sizes) are collected once and stored in a manifest. The
+manifest has the same format in every plugin, so a dataset indexed by one plugin
+is not scanned again by another.
+
+The manifest of a ravenML dataset (a directory holding splits/) is kept at its
+root. A standalone directory, or a dataset that cannot be written to, has its
+manifest in ravenML's local cache instead, so that nothing is written into a
+directory the manifest indexes.
+
+Each section is validated before use: label maps and shards by size and mtime,
+and file indexes by the mtime of their directory, which changes whenever a file
+is added, removed or renamed, and by the size and mtime of each meta_* file, so
+metadata edited in place (i.e a label fix) is picked up. Validation only stats,
+it never lists a directory.
+
+Remote paths (i.e gs://) are read through tf.io.gfile. Their manifests are kept
+in memory for the life of the process and never validated or saved.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import posixpath
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = 'dataset_manifest.json'
+MANIFEST_VERSION = 1
+# manifests of standalone and read-only directories, in ravenML's local cache
+MANIFEST_CACHE_DIR = Path(os.path.expanduser('~/.ravenML')) / 'dataset_manifests'
+
+_manifests = {}
+
+
+def is_remote(path):
+    """Returns True for paths with a URL scheme, i.e gs://bucket/dataset."""
+    return '://' in str(path)
+
+
+def load_manifest(path):
+    """Returns the manifest of the dataset containing path.
+
+    The dataset root is the closest ancestor of path (or path itself) holding a
+    manifest or a splits directory, or path itself when there is none. Manifests
+    are loaded once per process.
+
+    Args:
+        path (Path or str): dataset root or a directory within it, local or remote
+
+    Returns:
+        DatasetManifest: manifest of the dataset
+    """
+    if is_remote(path):
+        root = str(path).rstrip('/')
+        if root not in _manifests:
+            _manifests[root] = DatasetManifest(root, None)
+        return _manifests[root]
+
+    path = Path(path).resolve()
+    dataset_root = next((p for p in [path, *path.parents]
+                         if (p / MANIFEST_NAME).exists() or (p / 'splits').is_dir()), None)
+    root = dataset_root or path
+    if root not in _manifests:
+        if dataset_root is None:
+            _manifests[root] = DatasetManifest(root, _cache_path(root))
+        elif os.access(root, os.W_OK):
+            _manifests[root] = DatasetManifest(root, root / MANIFEST_NAME)
+        else:
+            _manifests[root] = DatasetManifest(root, _cache_path(root), fallback_path=root / MANIFEST_NAME)
+    return _manifests[root]
+
+
+def _cache_path(root: Path):
+    return MANIFEST_CACHE_DIR / f'{hashlib.sha1(str(root).encode()).hexdigest()}.json'
+
+
+def _gfile():
+    # Tensorflow is only needed for remote paths
+    import tensorflow as tf
+    return tf.io.gfile
+
+
+def _open(path, mode='r'):
+    return _gfile().GFile(path, mode) if is_remote(path) else open(path, mode)
+
+
+def _stat(path):
+    if is_remote(path):
+        stat = _gfile().stat(path)
+        return {'size': stat.length, 'mtime': stat.mtime_nsec / 1e9}
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _dir_mtime(path):
+    # object stores have no directory mtimes, remote manifests are never validated
+    return None if is_remote(path) else os.stat(path).st_mtime
+
+
+def _listdir(path):
+    """Returns the sorted names of the files in a directory."""
+    if is_remote(path):
+        return sorted(name.rstrip('/') for name in _gfile().listdir(path))
+    return sorted(os.listdir(path))
+
+
+def count_records(path):
+    """Counts the records of a TFRecord file by seeking over their length headers.
+
+    Each record is framed as a uint64 length, a uint32 length CRC, the data and a
+    uint32 data CRC, so no record is read or parsed.
+    """
+    count = 0
+    with _open(path, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(12)
+            if len(header) < 12:
+                return count
+            length = struct.unpack('<Q', header[:8])[0]
+            offset += 12 + length + 4
+            f.seek(offset)
+            count += 1
+
+
+def image_size(path):
+    """Reads the (height, width) of a PNG or JPEG from its header, or (None, None) for other formats."""
+    with _open(path, 'rb') as f:
+        head = f.read(24)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            width, height = struct.unpack('>II', head[16:24])
+            return height, width
+        if head[:2] != b'\xff\xd8':
+            return None, None
+        # walk the JPEG markers to the start of frame, which holds the dimensions
+        offset = 2
+        f.seek(offset)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xff:
+                return None, None
+            length = struct.unpack('>H', f.read(2))[0]
+            if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return height, width
+            offset += 2 + length
+            f.seek(offset)
+
+
+class DatasetManifest:
+
+    def __init__(self, root, path, fallback_path=None):
+        """
+        :param root: root directory of the dataset, a Path or a remote path
+        :param path: path the manifest is read from and saved to, None to keep it in memory only
+        :param fallback_path: manifest read when there is none at path, i.e one shipped with
+            a read-only dataset (optional)
+        """
+        self.root = root
+        self.path = path
+        self.data = {'version': MANIFEST_VERSION, 'label_maps': {}, 'records': {}, 'files': {}}
+        for manifest_path in (path, fallback_path):
+            if manifest_path is None:
+                continue
+            try:
+                with open(manifest_path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('version') == MANIFEST_VERSION:
+                self.data = data
+                break
+
+    def _key(self, path):
+        if is_remote(self.root):
+            return posixpath.relpath(str(path).rstrip('/'), self.root)
+        return os.path.relpath(Path(path).resolve(), self.root)
+
+    def save(self):
+        """Writes the manifest atomically. Manifests without a path, or that cannot be written, stay in memory."""
+        if self.path is None:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def num_classes(self, label_map_path=None):
+        """Returns the number of classes in a label map.
+
+        Args:
+            label_map_path (Path): path to the label map, label_map.pbtxt at the root by default
+
+        Returns:
+            int: number of items in the label map
+        """
+        label_map_path = label_map_path or os.path.join(self.root, 'label_map.pbtxt')
+        key = self._key(label_map_path)
+        stat = _stat(label_map_path)
+        entry = self.data['label_maps'].get(key)
+        if not entry or entry['stat'] != stat:
+            with _open(label_map_path, 'r') as f:
+                num_classes = len([line for line in f if 'id:' in line])
+            entry = self.data['label_maps'][key] = {'stat': stat, 'num_classes': num_classes}
+            self.save()
+        return entry['num_classes']
+
+    def _records(self, records_dir):
+        key = self._key(records_dir)
+        entry = self.data['records'].get(key)
+        if entry and is_remote(records_dir):
+            return entry
+        mtime = _dir_mtime(records_dir)
+        valid = entry and entry['mtime'] == mtime and all(
+            os.path.exists(os.path.join(records_dir, name)) and _stat(os.path.join(records_dir, name)) == shard['stat']
+            for name, shard in entry['shards'].items())
+        if not valid:
+            shards = {}
+            numexamples = {}
+            for name in _listdir(records_dir):
+                path = os.path.join(records_dir, name)
+                if '.record-' in name:
+                    shards[name] = {'stat': _stat(path), 'num_records': count_records(path)}
+                elif name.endswith('.record.numexamples'):
+                    with _open(path, 'r') as f:
+                        numexamples[name[:-len('.record.numexamples')]] = int(f.read().split()[0])
+            entry = self.data['records'][key] = {'mtime': mtime, 'shards': shards, 'numexamples': numexamples}
+            self.save()
+        return entry
+
+    def record_shards(self, records_dir, split: str):
+        """Returns the TFRecord shards of a split.
+
+        Args:
+            records_dir (Path): directory holding the <split>.record-* shards
+            split (str): split name, i.e train or test
+
+        Returns:
+            list: sorted paths to the shards
+        """
+        shards = self._records(records_dir)['shards']
+        return [os.path.join(records_dir, name) for name in shards if name.startswith(f'{split}.record-')]
+
+    def num_examples(self, records_dir, split: str):
+        """Returns the number of examples in a split.
+
+        Uses the <split>.record.numexamples file written with the dataset when there is one,
+        and the record counts of the shards otherwise.
+
+        Args:
+            records_dir (Path): directory holding the <split>.record-* shards
+            split (str): split name, i.e train or test
+
+        Returns:
+            int: number of examples
+        """
+        entry = self._records(records_dir)
+        if split in entry['numexamples']:
+            return entry['numexamples'][split]
+        return sum(shard['num_records'] for name, shard in entry['shards'].items()
+                   if name.startswith(f'{split}.record-'))
+
+    def file_index(self, directory, num_workers: int = 16):
+        """Returns an index of the image_* and meta_* files in a directory.
+
+        Args:
+            directory (Path): directory of images and metadata, i.e the test directory
+            num_workers (int): number of threads reading image headers when indexing
+
+        Returns:
+            dict: 'images', a sorted list of dicts with the name, bytes, height and width
+                of each image, and 'meta', a sorted list of dicts with the name and bytes
+                of each metadata file
+        """
+        key = self._key(directory)
+        entry = self.data['files'].get(key)
+        if entry and is_remote(directory):
+            return entry
+        mtime = _dir_mtime(directory)
+        if not entry or entry['mtime'] != mtime or self._meta_changed(directory, entry['meta'], num_workers):
+            names = [name for name in _listdir(directory) if name.startswith(('image_', 'meta_'))]
+            paths = [os.path.join(directory, name) for name in names]
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                stats = dict(zip(names, executor.map(_stat, paths)))
+                images = [{'name': name, 'bytes': stats[name]['size']} for name in names if name.startswith('image_')]
+                meta = [{'name': name, 'bytes': stats[name]['size'], 'mtime': stats[name]['mtime']}
+                        for name in names if name.startswith('meta_')]
+                dims = executor.map(image_size, [os.path.join(directory, image['name']) for image in images])
+                for image, (height, width) in zip(images, dims):
+                    image['height'], image['width'] = height, width
+            entry = self.data['files'][key] = {'mtime': mtime, 'images': images, 'meta': meta}
+            self.save()
+        return entry
+
+    @staticmethod
+    def _meta_changed(directory, meta, num_workers):
+        """Returns True if any indexed meta_* file was rewritten, which leaves the directory mtime alone."""
+        paths = [os.path.join(directory, m['name']) for m in meta]
+        try:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                stats = list(executor.map(_stat, paths))
+        except OSError:
+            return True
+        return any(stat['size'] != m['bytes'] or stat['mtime'] != m.get('mtime') for stat, m in zip(stats, meta))
+
+    def index_cache_path(self, directory, suffix: str):
+        """Returns a path in the manifest cache for data derived from the files of a directory.
+
+        The name is a digest of the directory and its file index, so it changes whenever the
+        index is rebuilt, and data cached under it never needs validating against the directory.
+
+        Args:
+            directory (Path): directory of images and metadata, i.e the test directory
+            suffix (str): suffix of the file name, i.e '_truth_index.npz'
+
+        Returns:
+            Path: path of the cache file, whose parent directory may not exist yet
+        """
+        entry = self.file_index(directory)
+        directory = str(directory).rstrip('/') if is_remote(directory) else str(Path(directory).resolve())
+        digest = hashlib.sha256(json.dumps([directory, entry], sort_keys=True).encode()).hexdigest()
+        return MANIFEST_CACHE_DIR / f'{digest}{suffix}'
+
+    def image_files(self, directory):
+        """Returns the sorted paths of the image_* files in a directory."""
+        return [os.path.join(directory, image['name']) for image in self.file_index(directory)['images']]
+
+    def meta_files(self, directory, suffix: str = ''):
+        """Returns the sorted paths of the meta_* files in a directory ending with suffix."""
+        return [os.path.join(directory, m['name']) for m in self.file_index(directory)['meta']
+                if m['name'].endswith(suffix)]
@@ -0,0 +1,91 @@
+"""
+Gradient accumulation for Keras optimizers.
+
+The gradients of each batch are summed into a slot per variable and their mean
+is applied by the wrapped optimizer once every `steps` batches, for an effective
+batch size of batch_size * steps at the memory cost of a single batch. As the
+wrapper only replaces apply_gradients, it works with `model.fit` on every
+Tensorflow version the plugins pin (Keras hands gradients to apply_gradients
+whether or not Model.train_step exists) and with custom training loops.
+"""
+
+import tensorflow as tf
+
+
+class GradientAccumulationOptimizer(tf.keras.optimizers.Optimizer):
+    """Wraps an optimizer so that it applies the mean of the gradients of every `steps` batches.
+
+    The wrapped optimizer's `iterations`, and so any learning rate schedule, only advance
+    when gradients are applied. Hyperparameters such as the learning rate are read from and
+    written to the wrapped optimizer. Like Keras' LossScaleOptimizer, the conditional update
+    is made in cross-replica context, so it also works under a distribution strategy.
+
+    :param optimizer: the Keras optimizer applying the accumulated gradients
+    :param steps: number of batches per update
+    """
+
+    def __init__(self, optimizer, steps, name='GradientAccumulationOptimizer'):
+        super().__init__(name)
+        if steps < 1:
+            raise ValueError(f'steps must be a positive integer, got {steps}')
+        self.optimizer = optimizer
+        self.steps = steps
+        self._batches = None
+
+    def __getattr__(self, name):
+        # only reached for attributes the wrapper does not have, i.e learning_rate or lr
+        if name.startswith('_') or name == 'optimizer':
+            raise AttributeError(name)
+        return getattr(self.optimizer, name)
+
+    @property
+    def iterations(self):
+        return self.optimizer.iterations
+
+    @iterations.setter
+    def iterations(self, variable):
+        self.optimizer.iterations = variable
+
+    def apply_gradients(self, grads_and_vars, name=None, **kwargs):
+        grads_and_vars = [(gradient, var) for gradient, var in grads_and_vars if gradient is not None]
+        var_list = [var for _, var in grads_and_vars]
+        with tf.init_scope():
+            if self._batches is None:
+                self._batches = self.add_weight('batches', shape=[], dtype=tf.int64, trainable=False,
+                                                aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+            for var in var_list:
+                self.add_slot(var, 'accumulator')
+        updates = [self.get_slot(var, 'accumulator').assign_add(tf.convert_to_tensor(gradient) / self.steps)
+                   for gradient, var in grads_and_vars]
+        with tf.control_dependencies(updates):
+            batches = self._batches.assign_add(1)
+        return tf.distribute.get_replica_context().merge_call(
+            self._apply_cross_replica, args=(var_list, batches, name, kwargs))
+
+    def _apply_cross_replica(self, distribution, var_list, batches, name, kwargs):
+        def apply_fn():
+            distribution.extended.call_for_each_replica(self._apply_accumulated, args=(var_list, name, kwargs))
+            return tf.constant(True)
+
+        return tf.cond(tf.equal(batches % self.steps, 0), apply_fn, lambda: tf.constant(False))
+
+    def _apply_accumulated(self, var_list, name, kwargs):
+        accumulators = [self.get_slot(var, 'accumulator') for var in var_list]
+        apply_op = self.optimizer.apply_gradients(
+            zip([accumulator.read_value() for accumulator in accumulators], var_list), name=name, **kwargs)
+        with tf.control_dependencies([apply_op]):
+            for accumulator in accumulators:
+                accumulator.assign(tf.zeros_like(accumulator))
+
+    def get_config(self):
+        return {
+            'name': self._name,
+            'optimizer': tf.keras.optimizers.serialize(self.optimizer),
+            'steps': self.steps
+        }
+
+    @classmethod
+    def from_config(cls, config, custom_objects=None):
+        config = dict(config)
+        optimizer = tf.keras.optimizers.deserialize(config.pop('optimizer'), custom_objects=custom_objects)
+        return cls(optimizer, **config)
@@ -0,0 +1,159 @@
+"""
+Inference optimization of frozen graphs for the Tensorflow 1 detection plugins.
+
+The frozen_inference_graph.pb written by the exporter is run through the
+graph_transforms passes for deployment (unused node stripping, constant and
+batchnorm folding) and saved beside the original as
+<name>.optimized-<hash>.pb. The hash covers the original graph and the list of
+transforms, so a retrained or re-exported graph, or a change to the transforms,
+is never served by a stale optimized copy. The optimized graph is only written
+if its outputs match those of the original on sample images.
+
+Graphs are read and written through tf.gfile, so models may live on remote
+storage (i.e gs://). The outputs to keep are passed by the caller, as detection
+and instance segmentation graphs differ only in their outputs.
+"""
+
+import os
+import time
+import hashlib
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+from tensorflow.tools.graph_transforms import TransformGraph
+from rmltraintfcommon.dataset_manifest import load_manifest
+
+INPUT_NAME = 'image_tensor'
+# outputs of a detection graph, instance segmentation graphs add detection_masks
+OUTPUT_NAMES = ['num_detections', 'detection_boxes', 'detection_scores', 'detection_classes']
+# the input keeps a dynamic batch and image size so batched inference still works
+TRANSFORMS = [
+    'strip_unused_nodes(type=uint8, shape="-1,-1,-1,3")',
+    'remove_nodes(op=CheckNumerics)',
+    'fold_constants(ignore_errors=true)',
+    'fold_batch_norms',
+    'fold_old_batch_norms',
+    'sort_by_execution_order'
+]
+
+
+def _read(path):
+    with tf.gfile.GFile(path, 'rb') as f:
+        return f.read()
+
+
+def _parse(data):
+    graph_def = tf.GraphDef()
+    graph_def.ParseFromString(data)
+    return graph_def
+
+
+def optimized_graph_path(model_path: str, data: bytes = None):
+    """Returns the path of the optimized copy of a frozen graph, whether or not it exists.
+
+    Args:
+        model_path (str): path to the frozen graph
+        data (bytes): contents of the frozen graph, read from model_path if not given
+
+    Returns:
+        str: path of the optimized graph
+    """
+    digest = hashlib.sha256(data if data is not None else _read(model_path))
+    digest.update('\n'.join(TRANSFORMS).encode())
+    root, ext = os.path.splitext(model_path)
+    return f'{root}.optimized-{digest.hexdigest()[:16]}{ext}'
+
+
+def load_graph_def(model_path: str, optimized: bool = True):
+    """Loads a frozen graph, preferring its optimized copy when there is one.
+
+    Args:
+        model_path (str): path to the frozen graph as exported
+        optimized (bool): use the optimized copy written by optimize_frozen_graph if present
+
+    Returns:
+        tf.GraphDef: the graph
+    """
+    data = _read(model_path)
+    if optimized:
+        path = optimized_graph_path(model_path, data)
+        if tf.gfile.Exists(path):
+            data = _read(path)
+    return _parse(data)
+
+
+def load_sample_images(directory: str = None, num: int = 10, image_size: int = 300):
+    """Loads up to num image_* files from a directory, or makes random images if no directory is given."""
+    if directory:
+        paths = load_manifest(directory).image_files(directory)[:num]
+        return [np.array(Image.open(path).convert('RGB')) for path in paths]
+    rng = np.random.RandomState(0)
+    return [rng.randint(0, 256, size=(image_size, image_size, 3), dtype=np.uint8) for _ in range(num)]
+
+
+def _run(graph_def, output_names, images, steps):
+    """Returns the outputs for each image and the mean latency of a call after warm up."""
+    with tf.Graph().as_default() as graph:
+        tf.import_graph_def(graph_def, name='')
+    fetches = {name: graph.get_tensor_by_name(name + ':0') for name in output_names}
+    image_tensor = graph.get_tensor_by_name(INPUT_NAME + ':0')
+    with tf.Session(graph=graph) as sess:
+        # the first pass over the images doubles as warm up
+        outputs = [sess.run(fetches, feed_dict={image_tensor: image[None, ...]}) for image in images]
+        start = time.time()
+        for i in range(steps):
+            sess.run(fetches, feed_dict={image_tensor: images[i % len(images)][None, ...]})
+        latency = (time.time() - start) / steps
+    return outputs, latency
+
+
+def _outputs_match(outputs, other_outputs, atol):
+    for output, other in zip(outputs, other_outputs):
+        num_detections = int(output['num_detections'][0])
+        if num_detections != int(other['num_detections'][0]):
+            return False
+        for name in output:
+            if name != 'num_detections' and not np.allclose(output[name][0, :num_detections],
+                                                            other[name][0, :num_detections], atol=atol):
+                return False
+    return True
+
+
+def optimize_frozen_graph(model_path: str, images, output_names=OUTPUT_NAMES, steps: int = 20,
+                          atol: float = 1e-3):
+    """Writes an inference-optimized copy of a frozen graph beside it if its outputs match the original.
+
+    Args:
+        model_path (str): path to the frozen graph as exported
+        images (list): uint8 images of shape [height, width, 3] to validate and time both graphs on
+        output_names (list): outputs to keep and compare, those missing from the graph are skipped
+        steps (int): number of calls timed for each graph
+        atol (float): tolerance on the outputs, folding reorders floating point operations
+
+    Returns:
+        dict: path of the optimized graph, node counts, mean latencies, speedup and whether the
+            outputs matched, in which case the optimized graph was written
+    """
+    data = _read(model_path)
+    path = optimized_graph_path(model_path, data)
+    graph_def = _parse(data)
+    node_names = {node.name for node in graph_def.node}
+    output_names = [name for name in output_names if name in node_names]
+    optimized_def = TransformGraph(graph_def, [INPUT_NAME], output_names, TRANSFORMS)
+
+    outputs, latency = _run(graph_def, output_names, images, steps)
+    optimized_outputs, optimized_latency = _run(optimized_def, output_names, images, steps)
+    report = {
+        'optimized_path': path,
+        'nodes': len(graph_def.node),
+        'optimized_nodes': len(optimized_def.node),
+        'latency': latency,
+        'optimized_latency': optimized_latency,
+        'speedup': latency / optimized_latency,
+        'outputs_match': _outputs_match(outputs, optimized_outputs, atol)
+    }
+    if report['outputs_match']:
+        with tf.gfile.GFile(path + '.tmp', 'wb') as f:
+            f.write(optimized_def.SerializeToString())
+        tf.gfile.Rename(path + '.tmp', path, overwrite=True)
+    return report
@@ -0,0 +1,31 @@
+"""
+Host memory usage of the training process, reported by the throughput instrumentation.
+"""
+
+import os
+import sys
+
+
+def host_rss_mb():
+    """Returns the resident set size of this process in MB.
+
+    Reads the current RSS from /proc where available and falls back to the
+    peak RSS reported by getrusage elsewhere.
+
+    Returns:
+        float: resident set size in MB
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # no getrusage on Windows
+        return float('nan')
+    # ru_maxrss is in bytes on macOS and KB on Linux and the BSDs
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
@@ -0,0 +1,77 @@
+"""
+tf.data readers for directories of test images, shared by the Tensorflow training plugins.
+
+Every reader is built by `build_image_dataset`: images are decoded with an
+autotuned number of threads, optionally cached once decoded, transformed after
+the cache (so the cache does not depend on noise or rescaling), optionally
+padded into batches that keep each image's original shape, and prefetched.
+Images stay uint8 unless a reader asks for another dtype.
+"""
+
+import tensorflow as tf
+from rmltraintfcommon.truth_index import load_truth_index
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+
+def decode_image(image_path):
+    """Reads and decodes a PNG, JPEG, BMP or GIF into a uint8 [height, width, 3] Tensor."""
+    return tf.io.decode_image(tf.io.read_file(image_path), channels=3, expand_animations=False)
+
+
+def add_gaussian_noise(img, stddev):
+    """Adds Gaussian noise with this stddev, relative to a [0, 1] pixel range, to a uint8 image."""
+    img = tf.cast(img, tf.float32) / 255
+    img += tf.random.normal(tf.shape(img), stddev=stddev)
+    img = tf.clip_by_value(img, 0, 1)
+    return tf.cast(img * 255, tf.uint8)
+
+
+def build_image_dataset(elements, decode_fn=decode_image, transform_fn=None, batch_size=None, cache_file=None):
+    """
+    Builds a prefetched tf.data.Dataset of decoded images.
+    :param elements: a tf.data.Dataset of image paths, or of tuples that decode_fn takes as arguments
+    :param decode_fn: maps an element to its decoded form, run in parallel with an autotuned number of
+        threads. Decodes the image at the path by default
+    :param transform_fn: maps a decoded element to its final form after the cache, i.e to add noise (optional)
+    :param batch_size: if given, yield (images, true_shapes) batches instead. Only for datasets of single
+        images: images of different sizes are zero-padded on the bottom and right to the largest image in
+        the batch, and true_shapes is a [batch, 3] Tensor holding the unpadded shape of each image
+    :param cache_file: if given, cache the decoded elements, in memory when '' and in this file otherwise, so
+        that repeated iterations and runs skip decoding
+    """
+    dataset = elements.map(decode_fn, num_parallel_calls=AUTOTUNE)
+    if cache_file is not None:
+        dataset = dataset.cache(cache_file)
+    if transform_fn is not None:
+        dataset = dataset.map(transform_fn, num_parallel_calls=AUTOTUNE)
+    if batch_size:
+        dataset = dataset.map(lambda img: (img, tf.shape(img)))
+        dataset = dataset.padded_batch(batch_size, padded_shapes=([None, None, 3], [3]))
+    return dataset.prefetch(AUTOTUNE)
+
+
+def get_image_dataset(dir_path, rescale=1.0, gaussian_stddev=0.0, dtype=tf.uint8, batch_size=None, cache_file=None):
+    """
+    Get a tf.data.Dataset that yields the image_* files of a directory in sorted order.
+    :param dir_path: the directory to load images from
+    :param rescale: resize the images by this factor
+    :param gaussian_stddev: add Gaussian noise with this stddev, relative to a [0, 1] pixel range
+    :param dtype: the dtype of the yielded images. uint8 takes a quarter of the memory and host-to-device
+        traffic of float32, so only use float32 for models that take float input
+    :param batch_size: if given, yield padded (images, true_shapes) batches, see `build_image_dataset`
+    :param cache_file: if given, cache the decoded images, in memory when '' and in this file otherwise.
+        Noise and rescaling are applied after the cache, so the cache does not depend on them
+    """
+    def transform(img):
+        if gaussian_stddev > 0:
+            img = add_gaussian_noise(img, gaussian_stddev)
+        if rescale != 1:
+            dims = tf.cast(tf.shape(img), tf.float32)[:2]
+            dims = tf.cast(dims * rescale, tf.int32)
+            img = tf.image.resize(img, dims)
+        return tf.cast(img, dtype)
+
+    image_files = load_truth_index(dir_path).image_paths
+    return build_image_dataset(tf.data.Dataset.from_tensor_slices(image_files), transform_fn=transform,
+                               batch_size=batch_size, cache_file=cache_file)
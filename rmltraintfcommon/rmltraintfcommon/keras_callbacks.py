@@ -0,0 +1,153 @@
+"""
+Keras callbacks shared by the Tensorflow training plugins.
+"""
+
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from rmltraintfcommon.host_memory import host_rss_mb
+
+# hooks forwarded by _TimedCallback, on_epoch_end is timed
+_FORWARDED_HOOKS = [
+    'on_train_begin', 'on_train_end', 'on_epoch_begin',
+    'on_batch_begin', 'on_batch_end', 'on_train_batch_begin', 'on_train_batch_end',
+    'on_test_begin', 'on_test_end', 'on_test_batch_begin', 'on_test_batch_end',
+    'on_predict_begin', 'on_predict_end', 'on_predict_batch_begin', 'on_predict_batch_end'
+]
+
+
+def tf_version():
+    """Returns the (major, minor) version of the installed Tensorflow."""
+    return tuple(int(part) for part in tf.__version__.split('.')[:2])
+
+
+def get_profile_batch(profile_steps):
+    """Converts the profile_steps option to the profile_batch of the TensorBoard callback.
+
+    :param profile_steps: None or 0 to disable profiling, a batch to profile, or a
+        [start, stop] range of batches, which needs Tensorflow >= 2.2
+    :return: the profile_batch argument
+    """
+    if not profile_steps:
+        return 0
+    if isinstance(profile_steps, int):
+        return profile_steps
+    if tf_version() < (2, 2):
+        raise ValueError(f'profile_steps: {profile_steps}, ranges of batches need Tensorflow >= 2.2, '
+                         f'found {tf.__version__}. Give a single batch instead.')
+    start, stop = (int(step) for step in profile_steps)
+    return start, stop
+
+
+class _TimedCallback(tf.keras.callbacks.Callback):
+    """Forwards every hook to a callback and adds the time spent in its on_epoch_end to a ThroughputCallback."""
+
+    def __init__(self, callback, throughput):
+        super().__init__()
+        self.callback = callback
+        self.throughput = throughput
+        for hook in _FORWARDED_HOOKS:
+            setattr(self, hook, getattr(callback, hook))
+
+    def set_params(self, params):
+        super().set_params(params)
+        self.callback.set_params(params)
+
+    def set_model(self, model):
+        super().set_model(model)
+        self.callback.set_model(model)
+
+    def on_epoch_end(self, epoch, logs=None):
+        start = time.time()
+        self.callback.on_epoch_end(epoch, logs)
+        self.throughput.checkpoint_time += time.time() - start
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Records step times, examples/sec, eval and checkpoint durations and host RSS
+    for each epoch, and writes them to TensorBoard and Comet.
+
+    Keras fetches input inside its train function, so step times include time
+    blocked on input; `host_overhead_time` is the time spent between steps.
+    Checkpoint callbacks are wrapped with `timed` and must come before this
+    callback in the list, so that their time is recorded before the epoch's
+    summary is written.
+    """
+    def __init__(self, batch_size, experiment=None):
+        super().__init__()
+        self.batch_size = batch_size
+        self.experiment = experiment
+        self.writer = None
+        self.epochs = []
+        self.step = 0
+        self.checkpoint_time = 0.0
+
+    def set_log_dir(self, log_dir):
+        self.writer = tf.summary.create_file_writer(os.path.join(log_dir, 'throughput'))
+
+    def timed(self, callback):
+        """Wraps a callback, i.e a ModelCheckpoint, so that its epoch end is recorded as checkpoint_time."""
+        return _TimedCallback(callback, self)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._step_times = []
+        self._overhead = 0.0
+        self._last_batch_end = None
+        self._eval_time = 0.0
+        self.checkpoint_time = 0.0
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._batch_start = time.time()
+        if self._last_batch_end is not None:
+            self._overhead += self._batch_start - self._last_batch_end
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._last_batch_end = time.time()
+        self._step_times.append(self._last_batch_end - self._batch_start)
+        self.step += 1
+
+    def on_test_begin(self, logs=None):
+        self._test_start = time.time()
+
+    def on_test_end(self, logs=None):
+        self._eval_time += time.time() - self._test_start
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self._step_times:
+            return
+        step_times = np.array(self._step_times)
+        summary = {
+            'step_time_p50': float(np.percentile(step_times, 50)),
+            'step_time_p90': float(np.percentile(step_times, 90)),
+            'step_time_p99': float(np.percentile(step_times, 99)),
+            'step_time_max': float(np.max(step_times)),
+            'examples_per_sec': len(step_times) * self.batch_size / float(np.sum(step_times)),
+            'host_overhead_time': self._overhead,
+            'eval_time': self._eval_time,
+            'checkpoint_time': self.checkpoint_time,
+            'host_rss_mb': host_rss_mb()
+        }
+        if self.writer:
+            with self.writer.as_default():
+                for key, value in summary.items():
+                    tf.summary.scalar(f'throughput/{key}', value, step=self.step)
+            self.writer.flush()
+        if self.experiment:
+            self.experiment.log_metrics({f'throughput_{k}': v for k, v in summary.items()}, step=self.step)
+        self.epochs.append(dict(summary, step=self.step))
+
+    def summary(self):
+        """Returns a summary over all recorded epochs, for the training metadata."""
+        if not self.epochs:
+            return {}
+        return {
+            'steps': self.step,
+            'examples_per_sec': float(np.mean([e['examples_per_sec'] for e in self.epochs])),
+            'step_time_p50': float(np.median([e['step_time_p50'] for e in self.epochs])),
+            'step_time_p99': float(np.max([e['step_time_p99'] for e in self.epochs])),
+            'eval_time': float(np.sum([e['eval_time'] for e in self.epochs])),
+            'checkpoint_time': float(np.sum([e['checkpoint_time'] for e in self.epochs])),
+            'peak_host_rss_mb': float(np.max([e['host_rss_mb'] for e in self.epochs])),
+            'epochs': self.epochs
+        }
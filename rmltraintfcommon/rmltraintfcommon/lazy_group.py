@@ -0,0 +1,51 @@
+"""
+Lazily loaded click command group for the Tensorflow training plugins.
+
+ravenML imports the command group of every installed plugin on each invocation,
+so the group must not import TensorFlow or anything else heavy. Commands live in
+their own module and are only imported when they are run or their help is shown.
+This module and the package it is in must only ever import click.
+"""
+
+import importlib
+import click
+
+
+class LazyGroup(click.Group):
+    """Click group whose commands are imported on first use.
+
+    Args:
+        lazy_commands (dict): command name to a tuple (import path, short help), where the
+            import path has the form 'package.module:command'. The short help is shown
+            when listing commands so that --help imports nothing.
+    """
+
+    def __init__(self, *args, lazy_commands: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, attr = self.lazy_commands[cmd_name][0].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), attr), name=cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        names = self.list_commands(ctx)
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            if name in self.commands:
+                if self.commands[name].hidden:
+                    continue
+                rows.append((name, self.commands[name].get_short_help_str(limit)))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
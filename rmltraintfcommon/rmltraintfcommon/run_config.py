@@ -0,0 +1,130 @@
+"""
+Estimator RunConfig settings of the Tensorflow 1 training plugins.
+
+The run_config block of a training config sets how often checkpoints are
+saved and kept, how often steps are logged, the session's thread counts and
+whether to train on every local GPU. Settings that are not given keep the
+defaults of tf.estimator.RunConfig. Without a run_config block the user is
+prompted for the settings, unless use_default_config is set.
+"""
+
+import click
+import tensorflow as tf
+
+# Estimator RunConfig settings and their defaults, those of tf.estimator.RunConfig.
+# save_checkpoints_steps takes precedence over save_checkpoints_secs when nonzero,
+# and thread counts of 0 leave the choice to TensorFlow.
+RUN_CONFIG_DEFAULTS = {
+    'save_checkpoints_steps': 0,
+    'save_checkpoints_secs': 600,
+    'keep_checkpoint_max': 5,
+    'log_step_count_steps': 100,
+    'intra_op_threads': 0,
+    'inter_op_threads': 0,
+    'mirrored_strategy': False
+}
+
+
+def load_run_config(config: dict):
+    """Returns the run configuration of a training config.
+
+    A run_config block applies whenever it is present, use_default_config only skips the prompt.
+
+    Args:
+        config (dict): plugin section of the training config
+
+    Returns:
+        dict: settings of RUN_CONFIG_DEFAULTS, each cast to the type of its default
+    """
+    run_config = dict(RUN_CONFIG_DEFAULTS)
+    if config.get('run_config'):
+        return process_user_run_config(run_config, config['run_config'])
+    if not config.get('use_default_config'):
+        return run_config_prompt(run_config)
+    return run_config
+
+
+def create_run_config(model_dir: str, run_config: dict):
+    """Creates the Estimator RunConfig for training.
+
+    Args:
+        model_dir (str): directory for checkpoints and summaries
+        run_config (dict): settings as in RUN_CONFIG_DEFAULTS, missing keys take their defaults
+
+    Returns:
+        tf.estimator.RunConfig: the run config
+    """
+    run_config = dict(RUN_CONFIG_DEFAULTS, **run_config)
+    save_checkpoints_steps = int(run_config['save_checkpoints_steps']) or None
+    # without thread counts the Estimator keeps its default session config
+    session_config = None
+    if int(run_config['intra_op_threads']) or int(run_config['inter_op_threads']):
+        session_config = tf.ConfigProto(
+            intra_op_parallelism_threads=int(run_config['intra_op_threads']),
+            inter_op_parallelism_threads=int(run_config['inter_op_threads']),
+            allow_soft_placement=True)
+    train_distribute = tf.distribute.MirroredStrategy() if run_config['mirrored_strategy'] else None
+    return tf.estimator.RunConfig(
+        model_dir=model_dir,
+        save_checkpoints_steps=save_checkpoints_steps,
+        save_checkpoints_secs=None if save_checkpoints_steps else int(run_config['save_checkpoints_secs']),
+        keep_checkpoint_max=int(run_config['keep_checkpoint_max']),
+        log_step_count_steps=int(run_config['log_step_count_steps']),
+        session_config=session_config,
+        train_distribute=train_distribute)
+
+
+def cast_like(value, default):
+    """Casts a prompted or configured value to the type of its default."""
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() in ('true', 'yes', 'y', '1')
+    return type(default)(value)
+
+
+def run_config_prompt(current_config: dict):
+    """Prompts user to allow editing of the Estimator run configuration.
+
+    Args:
+        current_config (dict): current run configuration
+
+    Returns:
+        dict: updated run configuration
+    """
+    # only reached from a plugin command, which always runs under ravenML
+    from ravenml.utils.question import user_confirms, user_input
+
+    click.echo('Current run configuration:')
+    for field, value in current_config.items():
+        click.echo(click.style(f'{field}: ', fg='green') + f'{value}')
+    if user_confirms('Edit default run configuration?'):
+        for field in current_config:
+            if user_confirms(f'Edit {field}? (default: {current_config[field]})'):
+                value = user_input(f'{field}:', default=str(current_config[field]))
+                current_config[field] = cast_like(value, current_config[field])
+    return current_config
+
+
+def process_user_run_config(current_config: dict, run_config: dict):
+    """Edits current run configuration based off settings specified.
+
+    Args:
+        current_config (dict): current run configuration
+        run_config (dict): run configuration specified by user
+
+    Returns:
+        dict: updated run configuration
+
+    Raises:
+        click.BadParameter: for an unsupported setting or a value of the wrong type, as
+            ravenml.utils.plugins.raise_parameter_error does
+    """
+    for setting in run_config.keys():
+        if setting not in current_config:
+            hint = f'run_config, {setting} is not a supported setting.'
+            raise click.BadParameter(setting, param=setting, param_hint=hint)
+        try:
+            current_config[setting] = cast_like(run_config[setting], current_config[setting])
+        except ValueError:
+            value = run_config[setting]
+            raise click.BadParameter(value, param=value, param_hint=f'run_config, {setting} must be a number.')
+    return current_config
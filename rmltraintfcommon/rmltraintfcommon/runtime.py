@@ -0,0 +1,195 @@
+"""
+CPU threading and affinity settings for the inference entry points of the
+Tensorflow training plugins.
+
+Settings are read from a YAML file, then RML_* environment variables, then
+command line flags, each overriding the last. The file is given by
+--runtime-config or RML_RUNTIME_CONFIG and may hold any of the keys below:
+
+    intra_op_threads: 4     # threads within an op, 0 for the TensorFlow default
+    inter_op_threads: 2     # ops run concurrently, 0 for the TensorFlow default
+    data_threads: 4         # size of the private tf.data threadpool, 0 for the shared pool
+    cpus: 0-3,8             # cores to pin this process to
+    num_workers: 4          # split the available cores across this many concurrent processes
+    worker_index: 0         # slice of the cores this process takes, claimed automatically if unset
+
+Settings left unset default to the number of pinned cores, so that concurrent
+evaluations on one machine do not each start a thread per core.
+
+Scripts add the settings as flags with add_runtime_args (argparse) and click
+commands with runtime_options. With eager execution (Tensorflow 2) the thread
+pools are sized by configure_runtime; graph mode sessions (Tensorflow 1) are
+sized by passing session_config to each session instead.
+"""
+
+import os
+import fcntl
+import tempfile
+import click
+import yaml
+import tensorflow as tf
+
+RUNTIME_KEYS = {
+    'intra_op_threads': int,
+    'inter_op_threads': int,
+    'data_threads': int,
+    'cpus': str,
+    'num_workers': int,
+    'worker_index': int
+}
+ENV_PREFIX = 'RML_'
+CONFIG_ENV = 'RML_RUNTIME_CONFIG'
+
+# held open for the life of the process so that concurrent workers claim different slices
+_worker_lock = None
+
+
+def add_runtime_args(parser):
+    """Adds the runtime flags to an argparse parser."""
+    group = parser.add_argument_group('runtime', 'CPU threading and affinity, see rmltraintfcommon/runtime.py')
+    group.add_argument('--runtime-config', type=str, help="Path to a YAML file of runtime settings (optional)")
+    group.add_argument('--intra-op-threads', type=int, help="Threads within an op, 0 for the TensorFlow default")
+    group.add_argument('--inter-op-threads', type=int, help="Ops run concurrently, 0 for the TensorFlow default")
+    group.add_argument('--data-threads', type=int, help="Size of the private tf.data threadpool")
+    group.add_argument('--cpus', type=str, help="Cores to pin this process to, i.e 0-3,8")
+    group.add_argument('--num-workers', type=int, help="Split the available cores across this many processes")
+    group.add_argument('--worker-index', type=int, help="Slice of the cores to take, claimed automatically if unset")
+
+
+def runtime_options(f):
+    """Adds the runtime options to a click command, which receives them as keyword arguments."""
+    options = [
+        click.option('--runtime-config', type=click.Path(exists=True, dir_okay=False),
+                     help='Path to a YAML file of runtime settings.'),
+        click.option('--intra-op-threads', type=int, help='Threads within an op, 0 for the TensorFlow default.'),
+        click.option('--inter-op-threads', type=int, help='Ops run concurrently, 0 for the TensorFlow default.'),
+        click.option('--data-threads', type=int, help='Size of the private tf.data threadpool.'),
+        click.option('--cpus', type=str, help='Cores to pin this process to, i.e 0-3,8.'),
+        click.option('--num-workers', type=int, help='Split the available cores across this many processes.'),
+        click.option('--worker-index', type=int, help='Slice of the cores to take, claimed automatically if unset.')
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def parse_cpus(cpus: str):
+    """Parses a list of cores such as '0-3,8', or a YAML list of ints, into a sorted list of ints."""
+    if isinstance(cpus, (list, tuple)):
+        return sorted(int(cpu) for cpu in cpus)
+    result = set()
+    for part in str(cpus).split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            result.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            result.add(int(part))
+    return sorted(result)
+
+
+def load_runtime_config(runtime_config: str = None, **overrides):
+    """Merges runtime settings from a file, the environment and overrides.
+
+    Args:
+        runtime_config (str): path to a YAML file of settings, RML_RUNTIME_CONFIG by default
+        **overrides: settings taking precedence over the file and environment, None values are ignored
+
+    Returns:
+        dict: runtime settings, with unset keys absent
+    """
+    config = {}
+    runtime_config = runtime_config or os.environ.get(CONFIG_ENV)
+    if runtime_config:
+        with open(runtime_config, 'r') as f:
+            config.update(yaml.safe_load(f) or {})
+    for key, cast in RUNTIME_KEYS.items():
+        if ENV_PREFIX + key.upper() in os.environ:
+            config[key] = cast(os.environ[ENV_PREFIX + key.upper()])
+    config.update({key: value for key, value in overrides.items() if key in RUNTIME_KEYS and value is not None})
+    return config
+
+
+def _claim_worker_index(num_workers: int):
+    global _worker_lock
+    for index in range(num_workers):
+        # keyed by the worker count, so processes splitting the cores differently never share a lock
+        lock_path = os.path.join(tempfile.gettempdir(), f'rml_runtime_worker_{num_workers}_{index}.lock')
+        f = open(lock_path, 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _worker_lock = f
+        return index
+    # more processes than workers, share slices round robin
+    return os.getpid() % num_workers
+
+
+def resolve_runtime_config(config: dict):
+    """Fills in the cores and thread counts implied by a partial runtime config.
+
+    With num_workers, the cores available to the process are split into that many
+    contiguous slices and the slice at worker_index is taken.
+
+    Args:
+        config (dict): runtime settings as returned by load_runtime_config
+
+    Returns:
+        dict: runtime settings with 'cpus' as a list of ints, or None if the process is not pinned
+    """
+    config = dict(config)
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+    cpus = parse_cpus(config['cpus']) if config.get('cpus') else available
+    if config.get('num_workers') and cpus:
+        num_workers = min(config['num_workers'], len(cpus))
+        index = config.get('worker_index')
+        if index is None:
+            index = _claim_worker_index(num_workers)
+        config['worker_index'] = index % num_workers
+        size, extra = divmod(len(cpus), num_workers)
+        start = config['worker_index'] * size + min(config['worker_index'], extra)
+        cpus = cpus[start:start + size + (config['worker_index'] < extra)]
+    config['cpus'] = cpus if cpus != available else None
+
+    if config['cpus']:
+        config.setdefault('intra_op_threads', len(config['cpus']))
+        config.setdefault('inter_op_threads', min(2, len(config['cpus'])))
+        config.setdefault('data_threads', len(config['cpus']))
+    return config
+
+
+def configure_runtime(runtime_config: str = None, **overrides):
+    """Pins the process and, with eager execution, sizes the TensorFlow thread pools.
+
+    Must run before TensorFlow executes its first op. In graph mode, pass session_config
+    to each session instead. Arguments are as for load_runtime_config, so an argparse
+    namespace can be passed with **vars(args) and click options straight through.
+
+    Returns:
+        dict: the resolved runtime settings, to pass to session_config and apply_dataset_options
+    """
+    config = resolve_runtime_config(load_runtime_config(runtime_config, **overrides))
+    if config['cpus']:
+        os.sched_setaffinity(0, config['cpus'])
+    if tf.executing_eagerly():
+        if config.get('intra_op_threads') is not None:
+            tf.config.threading.set_intra_op_parallelism_threads(config['intra_op_threads'])
+        if config.get('inter_op_threads') is not None:
+            tf.config.threading.set_inter_op_parallelism_threads(config['inter_op_threads'])
+    return config
+
+
+def session_config(config: dict):
+    """Returns a ConfigProto with the thread pool sizes of the runtime settings, for graph mode sessions."""
+    return tf.compat.v1.ConfigProto(intra_op_parallelism_threads=config.get('intra_op_threads') or 0,
+                                    inter_op_parallelism_threads=config.get('inter_op_threads') or 0)
+
+
+def apply_dataset_options(dataset, config: dict):
+    """Gives a tf.data pipeline its own threadpool of config['data_threads'] threads, if set."""
+    if not config.get('data_threads'):
+        return dataset
+    options = tf.data.Options()
+    options.experimental_threading.private_threadpool_size = config['data_threads']
+    return dataset.with_options(options)
@@ -0,0 +1,130 @@
+"""
+Columnar ground truth index for directory-based evaluation.
+
+The meta_*.json files of a test directory are parsed once by a pool of threads
+into arrays of bboxes and centroids per class, distances and image paths. The
+arrays are cached in an .npz file in the dataset manifest cache, named after the
+directory's file index in the manifest, so they are rebuilt whenever that index is:
+when a file is added, removed or renamed, or a meta_*.json file is edited in place.
+"""
+
+import os
+import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from rmltraintfcommon.dataset_manifest import load_manifest
+
+TRUTH_INDEX_SUFFIX = '_truth_index.npz'
+BBOX_KEYS = ('xmin', 'xmax', 'ymin', 'ymax')
+
+_indexes = {}
+
+
+class TruthIndex:
+
+    def __init__(self, dir_path, images, classes, bboxes, centroids, distances):
+        """
+        :param dir_path: the directory the index describes
+        :param images: [num_images] array of image file names, sorted
+        :param classes: [num_classes] array of class names
+        :param bboxes: [num_classes, num_meta, 4] array of (xmin, xmax, ymin, ymax), NaN where
+            a class is absent from an image
+        :param centroids: [num_classes, num_meta, 2] array of (y, x), NaN where a class is absent
+        :param distances: [num_meta] array of distances
+        """
+        self.dir_path = dir_path
+        self.images = images
+        self.classes = classes
+        self.bboxes = bboxes
+        self.centroids = centroids
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.distances)
+
+    @property
+    def image_paths(self):
+        return [os.path.join(self.dir_path, name) for name in self.images]
+
+    def iter_truth(self, rescale=1.0):
+        """
+        Yields the ground truth of each image in the format of `utils.gen_truth_data`, with
+        bboxes and centroids rescaled as one array operation.
+        """
+        bboxes = self.bboxes * rescale
+        centroids = self.centroids * rescale
+        has_bbox = ~np.isnan(bboxes[..., 0])
+        has_centroid = ~np.isnan(centroids[..., 0])
+        classes = [str(cls) for cls in self.classes]
+        for i, distance in enumerate(self.distances.tolist()):
+            bbox_dict = {classes[c]: dict(zip(BBOX_KEYS, bboxes[c, i].tolist()))
+                         for c in np.flatnonzero(has_bbox[:, i])}
+            centroid_dict = {classes[c]: tuple(centroids[c, i].tolist()) for c in np.flatnonzero(has_centroid[:, i])}
+            yield bbox_dict, centroid_dict, distance
+
+
+def _parse_meta(path):
+    with open(path, 'r') as f:
+        meta = json.load(f)
+    bboxes = {cls: [bbox[k] for k in BBOX_KEYS] for cls, bbox in meta['bboxes'].items()}
+    return bboxes, meta['centroids'], meta.get('distance', np.nan)
+
+
+def build_truth_index(dir_path, num_workers: int = 16):
+    """
+    Parses the meta_* files of a directory into a TruthIndex.
+    :param dir_path: the directory of images and metadata
+    :param num_workers: number of threads reading and parsing metadata files
+    :return: the TruthIndex
+    """
+    manifest = load_manifest(dir_path)
+    images = [os.path.basename(path) for path in manifest.image_files(dir_path)]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        metas = list(executor.map(_parse_meta, manifest.meta_files(dir_path)))
+
+    classes = sorted({cls for bboxes, _, _ in metas for cls in bboxes})
+    class_ids = {cls: c for c, cls in enumerate(classes)}
+    bboxes = np.full((len(classes), len(metas), 4), np.nan)
+    centroids = np.full((len(classes), len(metas), 2), np.nan)
+    for i, (meta_bboxes, meta_centroids, _) in enumerate(metas):
+        for cls, bbox in meta_bboxes.items():
+            bboxes[class_ids[cls], i] = bbox
+        for cls, centroid in meta_centroids.items():
+            centroids[class_ids[cls], i] = centroid
+    distances = np.array([distance for _, _, distance in metas], dtype=np.float64)
+    return TruthIndex(str(dir_path), np.array(images, dtype=str), np.array(classes, dtype=str), bboxes,
+                      centroids, distances)
+
+
+def load_truth_index(dir_path, num_workers: int = 16):
+    """
+    Returns the TruthIndex of a directory, from the manifest cache when the directory's file
+    index is unchanged, and builds and caches it otherwise.
+    :param dir_path: the directory of images and metadata
+    :param num_workers: number of threads parsing metadata files when building the index
+    :return: the TruthIndex
+    """
+    index_path = load_manifest(dir_path).index_cache_path(dir_path, TRUTH_INDEX_SUFFIX)
+    if index_path in _indexes:
+        return _indexes[index_path]
+
+    index = None
+    try:
+        with np.load(index_path) as cached:
+            index = TruthIndex(str(dir_path), cached['images'], cached['classes'], cached['bboxes'],
+                               cached['centroids'], cached['distances'])
+    except (OSError, KeyError, ValueError):
+        pass
+    if index is None:
+        index = build_truth_index(dir_path, num_workers)
+        try:
+            os.makedirs(index_path.parent, exist_ok=True)
+            # np.savez appends .npz to names without it, so the temporary name keeps the suffix
+            tmp_path = index_path.with_name(f'.{os.getpid()}{index_path.name}')
+            np.savez(tmp_path, images=index.images, classes=index.classes, bboxes=index.bboxes,
+                     centroids=index.centroids, distances=index.distances)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+    _indexes[index_path] = index
+    return index
@@ -0,0 +1,15 @@
+from setuptools import setup, find_packages
+
+# NOTE: tensorflow is deliberately not listed. Each plugin pins its own version and
+# the modules here are written against every version the plugins use.
+setup(
+    name='rmltraintfcommon',
+    version='0.1',
+    description='Code shared by the Tensorflow training plugins for ravenml',
+    packages=find_packages(exclude=['tests']),
+    install_requires=[
+        'numpy',
+        'pyyaml',
+        'click'
+    ]
+)
@@ -0,0 +1,102 @@
+import io
+import hashlib
+import tarfile
+import threading
+import functools
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import pytest
+from rmltraintfcommon.arch_cache import fetch_model_arch, is_cached, ChecksumError
+
+MODEL_NAME = 'ssd_test_arch'
+FILES = {
+    'pipeline.config': b'model { ssd {} }',
+    'checkpoint/ckpt-0.index': b'index',
+    'checkpoint/ckpt-0.data-00000-of-00001': bytes(range(256)) * 64
+}
+
+
+def _add_file(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def tarball(tmp_path):
+    """A local architecture tarball laid out like those on download.tensorflow.org."""
+    path = tmp_path / 'source' / f'{MODEL_NAME}.tar.gz'
+    path.parent.mkdir()
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, data in FILES.items():
+            _add_file(tar, f'{MODEL_NAME}/{name}', data)
+        _add_file(tar, '../outside', b'must not be extracted')
+    return path
+
+
+@pytest.fixture
+def http_url(tarball):
+    """Serves the tarball's directory over HTTP on localhost."""
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(tarball.parent))
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/{tarball.name}'
+    server.shutdown()
+    server.server_close()
+
+
+def _check_extracted(model_path):
+    for name, data in FILES.items():
+        assert (model_path / name).read_bytes() == data
+
+
+def test_fetch_local_tarball(tmp_path, tarball):
+    archs_path = tmp_path / 'archs'
+    model_path = fetch_model_arch(str(tarball), archs_path, MODEL_NAME)
+    assert model_path == archs_path / MODEL_NAME
+    _check_extracted(model_path)
+    assert is_cached(archs_path, MODEL_NAME, verify=True)
+    assert not (tmp_path / 'outside').exists()
+    assert not (archs_path / 'outside').exists()
+
+
+def test_fetch_file_url(tmp_path, tarball):
+    archs_path = tmp_path / 'archs'
+    _check_extracted(fetch_model_arch(tarball.as_uri(), archs_path, MODEL_NAME))
+
+
+def test_fetch_http(tmp_path, http_url):
+    archs_path = tmp_path / 'archs'
+    _check_extracted(fetch_model_arch(http_url, archs_path, MODEL_NAME))
+    assert is_cached(archs_path, MODEL_NAME, verify=True)
+
+
+def test_cached_architecture_is_not_fetched_again(tmp_path, tarball):
+    archs_path = tmp_path / 'archs'
+    fetch_model_arch(str(tarball), archs_path, MODEL_NAME)
+    tarball.unlink()
+    _check_extracted(fetch_model_arch(str(tarball), archs_path, MODEL_NAME))
+
+
+def test_checksum(tmp_path, tarball):
+    archs_path = tmp_path / 'archs'
+    with pytest.raises(ChecksumError):
+        fetch_model_arch(str(tarball), archs_path, MODEL_NAME, sha256='0' * 64)
+    assert not is_cached(archs_path, MODEL_NAME)
+    assert [path.name for path in archs_path.iterdir()] == [f'.{MODEL_NAME}.lock']
+
+    sha256 = hashlib.sha256(tarball.read_bytes()).hexdigest()
+    fetch_model_arch(str(tarball), archs_path, MODEL_NAME, sha256=sha256)
+    assert is_cached(archs_path, MODEL_NAME)
+
+
+def test_damaged_cache_is_refetched(tmp_path, tarball):
+    archs_path = tmp_path / 'archs'
+    model_path = fetch_model_arch(str(tarball), archs_path, MODEL_NAME)
+    (model_path / 'pipeline.config').write_bytes(b'model { ssd () }')
+    assert is_cached(archs_path, MODEL_NAME)
+    assert not is_cached(archs_path, MODEL_NAME, verify=True)
+
+    (model_path / 'checkpoint' / 'ckpt-0.index').unlink()
+    assert not is_cached(archs_path, MODEL_NAME)
+    _check_extracted(fetch_model_arch(str(tarball), archs_path, MODEL_NAME))
@@ -0,0 +1,91 @@
+import os
+import struct
+import pytest
+from rmltraintfcommon import dataset_manifest
+from rmltraintfcommon.dataset_manifest import load_manifest, MANIFEST_NAME
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\x0dIHDR' + struct.pack('>II', 64, 48)
+
+
+@pytest.fixture(autouse=True)
+def manifest_cache(tmp_path, monkeypatch):
+    """Keeps manifests of standalone directories out of the user's cache and out of the process cache."""
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr(dataset_manifest, 'MANIFEST_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(dataset_manifest, '_manifests', {})
+    return cache_dir
+
+
+def _write_test_dir(path, num):
+    path.mkdir(parents=True)
+    for i in range(num):
+        (path / f'image_{i}.png').write_bytes(PNG_HEADER)
+        (path / f'meta_{i}.json').write_text('{}')
+
+
+def _write_records(path, lengths):
+    with open(path, 'wb') as f:
+        for length in lengths:
+            f.write(struct.pack('<Q', length) + b'\x00' * 4 + b'\x01' * length + b'\x00' * 4)
+
+
+def _reload(path):
+    dataset_manifest._manifests.clear()
+    return load_manifest(path)
+
+
+def test_standalone_directory(tmp_path, manifest_cache, monkeypatch):
+    test_dir = tmp_path / 'test'
+    _write_test_dir(test_dir, 3)
+    mtime = os.stat(test_dir).st_mtime
+
+    index = load_manifest(test_dir).file_index(test_dir)
+    assert [image['name'] for image in index['images']] == ['image_0.png', 'image_1.png', 'image_2.png']
+    assert (index['images'][0]['height'], index['images'][0]['width']) == (48, 64)
+    assert [m['name'] for m in index['meta']] == ['meta_0.json', 'meta_1.json', 'meta_2.json']
+    # nothing is written into the indexed directory, so the index stays valid
+    assert sorted(os.listdir(test_dir)) == sorted([f'image_{i}.png' for i in range(3)] +
+                                                  [f'meta_{i}.json' for i in range(3)])
+    assert os.stat(test_dir).st_mtime == mtime
+    assert len(os.listdir(manifest_cache)) == 1
+
+    manifest = _reload(test_dir)
+    assert manifest.data['files']['.']['mtime'] == mtime
+    # a warm start reads the index without listing the directory
+    monkeypatch.setattr(dataset_manifest, '_listdir', None)
+    assert manifest.image_files(test_dir) == [str(test_dir / f'image_{i}.png') for i in range(3)]
+
+
+def test_file_index_is_rebuilt_when_a_file_is_added(tmp_path):
+    test_dir = tmp_path / 'test'
+    _write_test_dir(test_dir, 2)
+    assert len(load_manifest(test_dir).image_files(test_dir)) == 2
+    (test_dir / 'image_2.png').write_bytes(PNG_HEADER)
+    os.utime(test_dir, (0, 0))
+    assert len(_reload(test_dir).image_files(test_dir)) == 3
+
+
+def test_dataset_root(tmp_path, manifest_cache):
+    root = tmp_path / 'dataset'
+    records_dir = root / 'splits' / 'complete' / 'train'
+    records_dir.mkdir(parents=True)
+    (root / 'label_map.pbtxt').write_text('item {\n  id: 1\n}\nitem {\n  id: 2\n}\n')
+    _write_records(records_dir / 'train.record-00000-of-00002', [5, 7])
+    _write_records(records_dir / 'train.record-00001-of-00002', [3])
+    _write_records(records_dir / 'test.record-00000-of-00001', [1, 1, 1, 1])
+    (records_dir / 'test.record.numexamples').write_text('4\n')
+
+    manifest = load_manifest(records_dir)
+    assert manifest.root == root
+    assert manifest.num_classes() == 2
+    assert manifest.num_examples(records_dir, 'train') == 3
+    assert manifest.num_examples(records_dir, 'test') == 4
+    assert manifest.record_shards(records_dir, 'train') == [
+        str(records_dir / 'train.record-00000-of-00002'), str(records_dir / 'train.record-00001-of-00002')]
+    assert (root / MANIFEST_NAME).exists()
+    assert not manifest_cache.exists()
+
+    manifest = _reload(root)
+    assert manifest.data['records']['splits/complete/train']['shards']['train.record-00000-of-00002'][
+        'num_records'] == 2
+    assert manifest.num_examples(records_dir, 'train') == 3
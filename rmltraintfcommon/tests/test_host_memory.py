@@ -0,0 +1,27 @@
+import builtins
+import resource
+from collections import namedtuple
+import pytest
+from rmltraintfcommon import host_memory
+from rmltraintfcommon.host_memory import host_rss_mb
+
+Usage = namedtuple('Usage', 'ru_maxrss')
+
+
+def test_current_rss():
+    assert 0 < host_rss_mb() < 2**20
+
+
+@pytest.mark.parametrize('platform, maxrss', [('darwin', 512 * 2**20), ('linux', 512 * 2**10)])
+def test_peak_rss_units(monkeypatch, platform, maxrss):
+    real_open = builtins.open
+
+    def open_without_proc(path, *args, **kwargs):
+        if str(path).startswith('/proc'):
+            raise OSError(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', open_without_proc)
+    monkeypatch.setattr(host_memory.sys, 'platform', platform)
+    monkeypatch.setattr(resource, 'getrusage', lambda who: Usage(maxrss))
+    assert host_rss_mb() == 512
@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pytest
+from PIL import Image
+from rmltraintfcommon import dataset_manifest, truth_index
+
+tf = pytest.importorskip('tensorflow')
+from rmltraintfcommon.image_dataset import build_image_dataset, get_image_dataset  # noqa: E402
+
+SHAPES = [(6, 8), (4, 10), (8, 4)]
+
+
+@pytest.fixture(autouse=True)
+def manifest_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_manifest, 'MANIFEST_CACHE_DIR', tmp_path / 'cache')
+    monkeypatch.setattr(dataset_manifest, '_manifests', {})
+    monkeypatch.setattr(truth_index, '_indexes', {})
+
+
+@pytest.fixture
+def test_dir(tmp_path):
+    path = tmp_path / 'test'
+    path.mkdir()
+    for i, (height, width) in enumerate(SHAPES):
+        Image.fromarray(np.full((height, width, 3), 10 * (i + 1), np.uint8)).save(path / f'image_{i}.png')
+        meta = {'bboxes': {'barrel': {'xmin': 0, 'xmax': 1, 'ymin': 0, 'ymax': 1}}, 'centroids': {'barrel': [0, 0]}}
+        (path / f'meta_{i}.json').write_text(json.dumps(meta))
+    return path
+
+
+def test_images_in_sorted_order(test_dir):
+    images = [image.numpy() for image in get_image_dataset(str(test_dir))]
+    assert [image.shape for image in images] == [(height, width, 3) for height, width in SHAPES]
+    assert all(image.dtype == np.uint8 and np.all(image == 10 * (i + 1)) for i, image in enumerate(images))
+
+
+def test_padded_batches_keep_true_shapes(test_dir):
+    images, true_shapes = next(iter(get_image_dataset(str(test_dir), rescale=0.5, dtype=tf.float32, batch_size=3)))
+    assert images.dtype == tf.float32
+    assert images.shape == (3, 4, 5, 3)
+    assert true_shapes.numpy().tolist() == [[3, 4, 3], [2, 5, 3], [4, 2, 3]]
+
+
+def test_cache_file(tmp_path, test_dir):
+    cache_file = str(tmp_path / 'decoded')
+    first = [image.numpy() for image in get_image_dataset(str(test_dir), cache_file=cache_file)]
+    for path in test_dir.glob('image_*.png'):
+        path.write_bytes(b'')
+    cached = [image.numpy() for image in get_image_dataset(str(test_dir), cache_file=cache_file)]
+    assert all(np.array_equal(a, b) for a, b in zip(first, cached))
+
+
+def test_decode_fn_of_tuples(test_dir):
+    paths = [str(path) for path in sorted(test_dir.glob('image_*.png'))]
+    elements = tf.data.Dataset.from_tensor_slices((paths, tf.range(len(paths))))
+    dataset = build_image_dataset(elements, decode_fn=lambda path, i: (tf.io.read_file(path), i * 2), cache_file='')
+    assert [int(i) for _, i in dataset] == [0, 2, 4]
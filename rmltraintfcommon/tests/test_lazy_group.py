@@ -0,0 +1,104 @@
+"""
+Tests for LazyGroup and for the import time of every plugin's command group.
+
+ravenML imports every installed plugin's command group on each invocation, so the
+group must not import Tensorflow or other heavy libraries. Each plugin is imported
+from this repository in a fresh interpreter; the test fails if the import exceeds
+the startup budget (RML_IMPORT_TIME_BUDGET seconds, 0.5 by default) or loads a
+heavy module.
+"""
+
+import os
+import sys
+import json
+import subprocess
+import textwrap
+import click
+import pytest
+from click.testing import CliRunner
+from rmltraintfcommon.lazy_group import LazyGroup
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_TIME_BUDGET = float(os.environ.get('RML_IMPORT_TIME_BUDGET', 0.5))
+
+# package name and command group of every plugin in this repository
+PLUGINS = {
+    'rmltraintfbbox': 'tf_bbox',
+    'rmltraintfbboxlegacy': 'tf_bbox_legacy',
+    'rmltraintfinstance': 'tf_instance',
+    'rmltraintfkeypoints': 'tf_keypoints',
+    'rmltraintfmobilepose': 'tf_mobilepose',
+    'rmltraintfposeregression': 'tf_pose_regression',
+    'rmltraintfsemantic': 'tf_semantic'
+}
+
+HEAVY_MODULES = ['tensorflow', 'object_detection', 'comet_ml', 'matplotlib', 'cv2', 'scipy', 'deeplab', 'numpy']
+
+PROBE = '''
+import importlib, json, sys, time
+pkg, group, heavy = sys.argv[1], sys.argv[2], sys.argv[3].split(',')
+start = time.perf_counter()
+getattr(importlib.import_module(pkg + '.core'), group)
+elapsed = time.perf_counter() - start
+print(json.dumps({'import_time': elapsed, 'heavy_modules': [m for m in heavy if m in sys.modules]}))
+'''
+
+
+@pytest.fixture
+def lazy_module(tmp_path, monkeypatch):
+    """A command module that records being imported."""
+    (tmp_path / 'lazy_commands_module.py').write_text(textwrap.dedent('''
+        import click
+        IMPORTED = True
+
+        @click.command(help='Run the command. It does many things.')
+        def run():
+            click.echo('ran')
+    '''))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.modules.pop('lazy_commands_module', None)
+    yield 'lazy_commands_module'
+    sys.modules.pop('lazy_commands_module', None)
+
+
+def _group(module_name):
+    @click.group(cls=LazyGroup, lazy_commands={'run': (f'{module_name}:run', 'Run the command.')})
+    def group():
+        pass
+
+    @group.command(help='An eager command.')
+    def eager():
+        pass
+
+    return group
+
+
+def test_listing_commands_imports_nothing(lazy_module):
+    result = CliRunner().invoke(_group(lazy_module), ['--help'])
+    assert result.exit_code == 0
+    assert 'run    Run the command.' in result.output
+    assert 'eager  An eager command.' in result.output
+    assert lazy_module not in sys.modules
+
+
+def test_running_a_command_imports_it(lazy_module):
+    group = _group(lazy_module)
+    result = CliRunner().invoke(group, ['run'])
+    assert result.exit_code == 0
+    assert result.output == 'ran\n'
+    assert sys.modules[lazy_module].IMPORTED
+    assert group.commands['run'].help == 'Run the command. It does many things.'
+
+
+@pytest.mark.parametrize('package', sorted(PLUGINS))
+def test_plugin_import_time(package):
+    plugin_dir = os.path.join(REPO_ROOT, package)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [plugin_dir, os.path.join(REPO_ROOT, 'rmltraintfcommon'), os.environ.get('PYTHONPATH', '')]))
+    # run from the plugin directory, so the repository root does not shadow the packages on sys.path
+    output = subprocess.run([sys.executable, '-c', PROBE, package, PLUGINS[package], ','.join(HEAVY_MODULES)],
+                            check=True, stdout=subprocess.PIPE, universal_newlines=True, env=env,
+                            cwd=plugin_dir).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    assert not result['heavy_modules']
+    assert result['import_time'] < IMPORT_TIME_BUDGET
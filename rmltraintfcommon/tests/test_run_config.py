@@ -0,0 +1,20 @@
+import click
+import pytest
+
+pytest.importorskip('tensorflow')
+from rmltraintfcommon.run_config import RUN_CONFIG_DEFAULTS, load_run_config  # noqa: E402
+
+
+def test_run_config_applies_with_default_hyperparameters():
+    config = {'use_default_config': True, 'run_config': {'keep_checkpoint_max': '3', 'mirrored_strategy': 'yes'}}
+    assert load_run_config(config) == dict(RUN_CONFIG_DEFAULTS, keep_checkpoint_max=3, mirrored_strategy=True)
+
+
+def test_defaults_without_prompt():
+    assert load_run_config({'use_default_config': True}) == RUN_CONFIG_DEFAULTS
+
+
+@pytest.mark.parametrize('run_config', [{'unknown': 1}, {'intra_op_threads': 'many'}])
+def test_invalid_settings(run_config):
+    with pytest.raises(click.BadParameter):
+        load_run_config({'run_config': run_config})
@@ -0,0 +1,69 @@
+import os
+import argparse
+import click
+import pytest
+from click.testing import CliRunner
+
+pytest.importorskip('tensorflow')
+from rmltraintfcommon import runtime  # noqa: E402
+from rmltraintfcommon.runtime import (add_runtime_args, runtime_options, parse_cpus, load_runtime_config,  # noqa: E402
+                                      resolve_runtime_config, session_config)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(tmp_path, monkeypatch):
+    for key in runtime.RUNTIME_KEYS:
+        monkeypatch.delenv(runtime.ENV_PREFIX + key.upper(), raising=False)
+    monkeypatch.delenv(runtime.CONFIG_ENV, raising=False)
+    monkeypatch.setattr(runtime.tempfile, 'gettempdir', lambda: str(tmp_path))
+    monkeypatch.setattr(runtime, '_worker_lock', None)
+
+
+def test_parse_cpus():
+    assert parse_cpus('0-3,8') == [0, 1, 2, 3, 8]
+    assert parse_cpus([3, 1]) == [1, 3]
+
+
+def test_precedence(tmp_path, monkeypatch):
+    config_path = tmp_path / 'runtime.yaml'
+    config_path.write_text('intra_op_threads: 4\ninter_op_threads: 2\ndata_threads: 3\n')
+    monkeypatch.setenv('RML_INTER_OP_THREADS', '1')
+    config = load_runtime_config(str(config_path), data_threads=5, cpus=None)
+    assert config == {'intra_op_threads': 4, 'inter_op_threads': 1, 'data_threads': 5}
+
+
+def test_worker_slices():
+    config = resolve_runtime_config({'cpus': '0-9', 'num_workers': 4, 'worker_index': 1})
+    assert config['cpus'] == [3, 4, 5]
+    assert config['intra_op_threads'] == 3
+    assert config['inter_op_threads'] == 2
+
+
+def test_claimed_locks_are_keyed_by_worker_count(tmp_path):
+    assert resolve_runtime_config({'cpus': '0-7', 'num_workers': 4})['worker_index'] == 0
+    # a process splitting the cores in two does not see the lock of the split in four
+    runtime._worker_lock = None
+    assert resolve_runtime_config({'cpus': '0-7', 'num_workers': 2})['worker_index'] == 0
+    assert sorted(os.listdir(tmp_path)) == ['rml_runtime_worker_2_0.lock', 'rml_runtime_worker_4_0.lock']
+
+
+def test_session_config():
+    config = session_config({'intra_op_threads': 4})
+    assert config.intra_op_parallelism_threads == 4
+    assert config.inter_op_parallelism_threads == 0
+
+
+def test_argparse_and_click_flags():
+    parser = argparse.ArgumentParser()
+    add_runtime_args(parser)
+    args = parser.parse_args(['--num-workers', '2', '--cpus', '0-3'])
+    assert load_runtime_config(**vars(args)) == {'num_workers': 2, 'cpus': '0-3'}
+
+    @click.command()
+    @runtime_options
+    def command(**runtime_args):
+        click.echo(sorted(load_runtime_config(**runtime_args).items()))
+
+    result = CliRunner().invoke(command, ['--data-threads', '2'])
+    assert result.exit_code == 0
+    assert result.output == "[('data_threads', 2)]\n"
@@ -0,0 +1,81 @@
+import os
+import json
+import numpy as np
+import pytest
+from rmltraintfcommon import dataset_manifest, truth_index
+from rmltraintfcommon.truth_index import load_truth_index
+
+
+@pytest.fixture(autouse=True)
+def manifest_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr(dataset_manifest, 'MANIFEST_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(dataset_manifest, '_manifests', {})
+    monkeypatch.setattr(truth_index, '_indexes', {})
+    return cache_dir
+
+
+def _write_meta(path, i, classes):
+    meta = {
+        'bboxes': {cls: {'xmin': i, 'xmax': i + 10, 'ymin': 2 * i, 'ymax': 2 * i + 10} for cls in classes},
+        'centroids': {cls: [i + 5, i + 6] for cls in classes},
+        'distance': float(i)
+    }
+    (path / f'meta_{i}.json').write_text(json.dumps(meta))
+    (path / f'image_{i}.png').write_bytes(b'')
+
+
+@pytest.fixture
+def test_dir(tmp_path):
+    path = tmp_path / 'test'
+    path.mkdir()
+    _write_meta(path, 0, ['barrel'])
+    _write_meta(path, 1, ['barrel', 'panel'])
+    return path
+
+
+def test_truth(test_dir):
+    truth = list(load_truth_index(test_dir).iter_truth(rescale=0.5))
+    assert truth[0] == ({'barrel': {'xmin': 0.0, 'xmax': 5.0, 'ymin': 0.0, 'ymax': 5.0}},
+                        {'barrel': (2.5, 3.0)}, 0.0)
+    assert sorted(truth[1][0]) == ['barrel', 'panel']
+    assert truth[1][1]['panel'] == (3.0, 3.5)
+    assert load_truth_index(test_dir).image_paths == [str(test_dir / 'image_0.png'), str(test_dir / 'image_1.png')]
+
+
+def test_cached_in_manifest_cache(tmp_path, test_dir, manifest_cache, monkeypatch):
+    mtime = os.stat(test_dir).st_mtime
+    load_truth_index(test_dir)
+    assert sorted(os.listdir(tmp_path)) == ['cache', 'test']
+    assert os.stat(test_dir).st_mtime == mtime
+    cached = [name for name in os.listdir(manifest_cache) if name.endswith(truth_index.TRUTH_INDEX_SUFFIX)]
+    assert len(cached) == 1
+
+    # a new process reads the cached arrays instead of parsing the metadata
+    truth_index._indexes.clear()
+    dataset_manifest._manifests.clear()
+    monkeypatch.setattr(truth_index, '_parse_meta', None)
+    assert list(load_truth_index(test_dir).classes) == ['barrel', 'panel']
+
+
+def test_rebuilt_when_metadata_is_edited_in_place(test_dir):
+    assert list(load_truth_index(test_dir).classes) == ['barrel', 'panel']
+    mtime = os.stat(test_dir).st_mtime
+    path = test_dir / 'meta_1.json'
+    path.write_text(path.read_text().replace('panel', 'PANEL'))
+    # a label fix leaves the directory mtime alone, only the file's own stat changes
+    os.utime(path, (mtime + 10, mtime + 10))
+    assert os.stat(test_dir).st_mtime == mtime
+    truth_index._indexes.clear()
+    dataset_manifest._manifests.clear()
+    assert list(load_truth_index(test_dir).classes) == ['PANEL', 'barrel']
+
+
+def test_rebuilt_with_the_file_index(test_dir):
+    assert len(load_truth_index(test_dir)) == 2
+    _write_meta(test_dir, 2, ['panel'])
+    os.utime(test_dir, (0, 0))
+    dataset_manifest._manifests.clear()
+    index = load_truth_index(test_dir)
+    assert len(index) == 3
+    assert np.isnan(index.bboxes[0, 2]).all()
@@ -8,18 +8,22 @@ Helper functions for the TF Bounding Box plugin.
 
 import os
 import shutil
-import tarfile
 import yaml
 import click
-import urllib.request
 from colorama import init, Fore
 from pathlib import Path
 from ravenml.utils.local_cache import RMLCache
 from ravenml.utils.question import user_confirms, user_input, user_selects
 from ravenml.utils.plugins import raise_parameter_error
+from rmltraintfcommon.dataset_manifest import load_manifest
+from rmltraintfcommon.arch_cache import fetch_model_arch, is_cached, ChecksumError
+from rmltraintfcommon.run_config import load_run_config
 
 init()
 
+# subpath of the plugin cache holding downloaded model architectures
+ARCHS_SUBPATH = 'instance_model_archs'
+
 # TODO: Update docs
 def prepare_for_training(
     instance_cache: RMLCache, 
@@ -57,21 +61,16 @@ def prepare_for_training(
     pbtxt_file = data_path / 'label_map.pbtxt'
     shutil.copy(pbtxt_file, base_dir / 'data')
 
+    # dataset facts come from the cached manifest rather than rescanning the dataset
+    manifest = load_manifest(data_path)
+
     # calculate number of classes from pbtxt file
-    with open(pbtxt_file, "r") as f:
-        ids = [line for line in f if "id:" in line]
-        num_classes = len(ids)
+    num_classes = manifest.num_classes(pbtxt_file)
 
     # get num eval examples from file
     # NOTE: switched to complete, takes no advatage of splits (does not use standard)
-    num_eval_file = data_path / 'splits/complete/train/test.record.numexamples'
-    try:
-        with open(num_eval_file, "r") as f:
-            lines = f.readlines()
-            num_eval_examples = int(lines[0])
-
-    except:
-        num_eval_examples = 1
+    records_path = data_path / 'splits/complete/train'
+    num_eval_examples = manifest.num_examples(records_path, 'test') or 1
 
     # create models, model, eval, and train folders
     model_folder = base_dir / 'models' / 'model'
@@ -114,6 +113,11 @@ def prepare_for_training(
         
     _print_config('Using configuration:', user_config)
     
+    # Estimator settings, prompted for alongside the hyperparameters
+    run_config = load_run_config(config)
+    _print_config('Using run configuration:', run_config)
+    metadata['run_config'] = run_config
+
     # add to hyperparameter metadata dict
     for field, value in user_config.items():
         hp_metadata[field] = value
@@ -136,20 +140,12 @@ def prepare_for_training(
             pipeline_contents = pipeline_contents.replace('<replace_path>', str(base_dir) + '/')
             
     # place TF record files into training directory
-    num_train_records = 0
-    num_test_records = 0
-    # NOTE: switched to complete not standard
-    records_path = data_path / 'splits/complete/train'
-    for record_file in os.listdir(records_path):
-        if record_file.startswith('train.record-'):
-            num_train_records += 1
-            file_path = records_path / record_file
-            shutil.copy(file_path, base_dir / 'data')
-
-        if record_file.startswith('test.record-'):
-            num_test_records += 1
-            file_path = records_path / record_file
-            shutil.copy(file_path, base_dir / 'data')
+    train_shards = manifest.record_shards(records_path, 'train')
+    test_shards = manifest.record_shards(records_path, 'test')
+    for shard in train_shards + test_shards:
+        shutil.copy(shard, base_dir / 'data')
+    num_train_records = len(train_shards)
+    num_test_records = len(test_shards)
 
     # convert int to left zero padded string of length 5
     user_config['num_train_records'] = str(num_train_records).zfill(5)
@@ -198,42 +194,32 @@ def prepare_for_training(
     metadata['hyperparameters'] = hp_metadata
     return True
 
-def download_model_arch(model_name: str, instance_cache: RMLCache):
-    """Downloads the model architecture with the given name.
+def download_model_arch(model_name: str, instance_cache: RMLCache, sha256: str = None):
+    """Downloads the model architecture with the given name into the plugin cache.
+
+    The download is streamed into the cache and guarded by a lock file, see rmltraintfcommon.arch_cache.
 
     Args:
         model_name (str): model type
-        bbox_cache (RMLCache): cache object for the instance plugin plugin
+        instance_cache (RMLCache): cache object for the instance plugin
+        sha256 (str): expected sha256 of the architecture tarball (optional)
     
     Returns:
         Path: path to model architecture
     """
     url = 'http://download.tensorflow.org/models/object_detection/%s.tar.gz' %(model_name)
     # make paths within instance cache 
-    instance_cache.ensure_subpath_exists('instance_model_archs')
-    archs_path = instance_cache.path / 'instance_model_archs'
-    untarred_path = archs_path / model_name
+    instance_cache.ensure_subpath_exists(ARCHS_SUBPATH)
+    archs_path = instance_cache.path / ARCHS_SUBPATH
     # check if download is required
-    if not instance_cache.subpath_exists(untarred_path):
+    if not is_cached(archs_path, model_name):
         click.echo("Model checkpoint not found in cache. Downloading...")
-        # download tar file
-        tar_name = url.split('/')[-1]
-        tar_path = archs_path / tar_name
-        urllib.request.urlretrieve(url, tar_path)
-        
-        click.echo("Untarring model checkpoint...")
-        if (tar_name.endswith("tar.gz")):
-            tar = tarfile.open(tar_path, "r:gz")
-            tar.extractall(path=archs_path)
-            tar.close()
-
-        # get rid of tar file
-        os.remove(tar_path)
     else:
         click.echo('Model checkpoint found in cache.')
-        
-    return untarred_path
-
+    try:
+        return fetch_model_arch(url, archs_path, model_name, sha256)
+    except ChecksumError as e:
+        raise_parameter_error(model_name, f'model, {e}')
     
 def _configuration_prompt(current_config: dict):
     """Prompts user to allow editing of current training configuration.
@@ -7,6 +7,7 @@ from pathlib import Path
 import itertools
 import csv
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from PIL import Image
@@ -17,6 +18,8 @@ from object_detection.utils import label_map_util
 from object_detection.utils import ops as utils_ops
 
 from rmltraintfinstance.validation.classes import DetectedClass, TruthClass
+from rmltraintfcommon.dataset_manifest import load_manifest
+from rmltraintfcommon.graph_optimizer import load_graph_def
 
 
 def get_num_classes(label_path):
@@ -28,10 +31,15 @@ def get_num_classes(label_path):
 
 
 def load_image_into_numpy_array(image):
-    (im_width, im_height) = image.size
-    image = image.convert('RGB')
-    return np.array(image.getdata()).reshape(
-        (im_height, im_width, 3)).astype(np.uint8)
+    """
+    Converts a PIL image to a uint8 (h, w, 3) array without iterating over its pixels in Python.
+    """
+    return np.asarray(image.convert('RGB'), dtype=np.uint8)
+
+
+def load_image_from_path(path):
+    with Image.open(path) as image:
+        return load_image_into_numpy_array(image)
 
 
 def get_categories(label_path: str):
@@ -46,14 +54,11 @@ def get_categories(label_path: str):
 
 
 def get_image_paths(dev_path):
-    image_paths = []
     mask_paths = []
     metadata_paths = []
     color_paths = []
 
-    for item in os.listdir(dev_path):
-        if item.startswith('image'):
-            image_paths.append(os.path.join(dev_path, item))
+    image_paths = load_manifest(dev_path).image_files(dev_path)
 
     for impath in image_paths:
 
@@ -70,26 +75,24 @@ def get_image_paths(dev_path):
     return image_paths, mask_paths, metadata_paths, color_paths
 
 
-def load_images_from_paths(image_paths):
-    images = []
-    for impath in image_paths:
-        image = Image.open(impath)
-        image_np = load_image_into_numpy_array(image)
+def load_arrays_from_paths(paths, num_workers=16):
+    """
+    Decodes images into uint8 (h, w, 3) arrays with a pool of threads, PIL releases the GIL while decoding.
+    :param paths: the image files to load
+    :param num_workers: number of threads decoding images
+    :return: a list of the arrays, in the order of paths
+    """
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(load_image_from_path, paths))
 
-        images.append(image_np)
 
-    return images
+def load_images_from_paths(image_paths, num_workers=16):
+    return load_arrays_from_paths(image_paths, num_workers)
 
 
-def load_masks_from_paths(mask_paths):
-    masks = []
-    for mask_path in mask_paths:
-        mask = Image.open(mask_path)
-        mask_np = load_image_into_numpy_array(mask)
+def load_masks_from_paths(mask_paths, num_workers=16):
+    return load_arrays_from_paths(mask_paths, num_workers)
 
-        masks.append(mask_np)
-
-    return masks
 
 def load_colors_from_paths(color_paths, category_index):
     colors = []
@@ -145,15 +148,14 @@ def load_centroids_from_paths(metadata_paths, category_index):
 
 
 def get_default_graph(model_path):
-
+    """
+    Loads a frozen graph, or its inference-optimized copy if one was written by `optimize-graph`.
+    """
     detection_graph = tf.Graph()
 
     with detection_graph.as_default():
-        od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(model_path, 'rb') as fid:
-            serialized_graph = fid.read()
-            od_graph_def.ParseFromString(serialized_graph)
-            tf.import_graph_def(od_graph_def, name='')
+        od_graph_def = load_graph_def(model_path)
+        tf.import_graph_def(od_graph_def, name='')
 
 
     return detection_graph
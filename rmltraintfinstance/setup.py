@@ -11,6 +11,7 @@ setup(
     description='Tensorflow Instance Segmentation training plugin for ravenML',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.16.4',
         'cython==0.29.13',
         'object-detection @ https://github.com/autognc/object-detection/tarball/object-detection#egg=object-detection',
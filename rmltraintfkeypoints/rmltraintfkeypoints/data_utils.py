@@ -1,8 +1,8 @@
 import tensorflow as tf
-import glob
-import os
 import json
 from .train import KeypointsModel
+from rmltraintfcommon.dataset_manifest import load_manifest
+from rmltraintfcommon.image_dataset import build_image_dataset
 
 
 def recursive_map_dict(d, f):
@@ -11,19 +11,24 @@ def recursive_map_dict(d, f):
     return f(d)
 
 
-def dataset_from_directory(dir_path, cropsize, nb_keypoints):
+def dataset_from_directory(dir_path, cropsize, nb_keypoints, cache_file=None):
     """
     Get a Tensorflow dataset that generates samples from a directory with test data
     that is not in TFRecord format (i.e. a directory with image_*.png, meta_*.json, and bboxLabels_*.xml files).
     The images are cropped to the spacecraft using the bounding box truth data in the XML files.
     :param dir_path: the path to the directory
     :param cropsize: the output size for the images, in pixels
+    :param nb_keypoints: the number of keypoints to keep from the metadata
+    :param cache_file: if given, cache the cropped images and truth, in memory when '' and in this file otherwise,
+    so that repeated iterations and runs skip decoding
     :return: a Tensorflow dataset that generates (image, metadata) tuples where image is a [cropsize, cropsize, 3]
     Tensor and metadata is a nested dictionary of Tensors.
     """
+    manifest = load_manifest(dir_path)
+
     def generator():
-        image_files = sorted(glob.glob(os.path.join(dir_path, "image_*")))
-        meta_files = sorted(glob.glob(os.path.join(dir_path, "meta_*.json")))
+        image_files = manifest.image_files(dir_path)
+        meta_files = manifest.meta_files(dir_path, ".json")
         for image_file, meta_file in zip(image_files, meta_files):
             # load metadata
             with open(meta_file, "r") as f:
@@ -32,7 +37,7 @@ def dataset_from_directory(dir_path, cropsize, nb_keypoints):
 
             yield image_file, metadata
 
-    meta_file_0 = glob.glob(os.path.join(dir_path, "meta_*.json"))[0]
+    meta_file_0 = manifest.meta_files(dir_path, ".json")[0]
     with open(meta_file_0, "r") as f:
         meta0 = json.load(f)
     dtypes = recursive_map_dict(meta0, lambda x: tf.convert_to_tensor(x).dtype)
@@ -64,5 +69,5 @@ def dataset_from_directory(dir_path, cropsize, nb_keypoints):
         }
         return image, truth
 
-    return dataset.map(process)
+    return build_image_dataset(dataset, decode_fn=process, cache_file=cache_file)
 
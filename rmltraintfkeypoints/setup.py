@@ -7,6 +7,7 @@ setup(
     description='Tensorflow keypoints regression plugin for ravenml',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.18.4',
         'tensorflow==2.1.0',
         'opencv-python==4.2.0.34',
@@ -11,6 +11,7 @@ import cv2
 import tqdm
 from ravenml.utils.question import user_confirms
 from .. import utils
+from rmltraintfcommon.runtime import runtime_options, configure_runtime, apply_dataset_options
 
 
 def make_serializable(tensor):
@@ -43,7 +44,11 @@ def make_serializable(tensor):
     type=click.Path(file_okay=False),
     help="Directory to store keypoint renders (optional)",
 )
-def main(model_path, directory, keypoints, focal_length, num, output, render):
+@runtime_options
+def main(
+    model_path, directory, keypoints, focal_length, num, output, render, **runtime_args
+):
+    runtime = configure_runtime(**runtime_args)
     if output and os.path.exists(output):
         if not user_confirms("Output path exists. Overwrite?"):
             return
@@ -68,7 +73,7 @@ def main(model_path, directory, keypoints, focal_length, num, output, render):
     )
     if num:
         data = data.take(num)
-    data = data.batch(32)
+    data = apply_dataset_options(data.batch(32), runtime)
 
     results = []
     errs_pose = []
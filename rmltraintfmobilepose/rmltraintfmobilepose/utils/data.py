@@ -1,8 +1,7 @@
 import tensorflow as tf
-import glob
-import os
 import json
 from .model import preprocess_image
+from rmltraintfcommon.dataset_manifest import load_manifest
 
 
 def recursive_map_dict(d, f):
@@ -22,9 +21,11 @@ def dataset_from_directory(dir_path, cropsize, nb_keypoints=None):
     Tensor and metadata is a dictionary of Tensors.
     """
 
+    manifest = load_manifest(dir_path)
+
     def generator():
-        image_files = sorted(glob.glob(os.path.join(dir_path, "image_*")))
-        meta_files = sorted(glob.glob(os.path.join(dir_path, "meta_*.json")))
+        image_files = manifest.image_files(dir_path)
+        meta_files = manifest.meta_files(dir_path, ".json")
         for image_file, meta_file in zip(image_files, meta_files):
             # load metadata
             with open(meta_file, "r") as f:
@@ -33,7 +34,7 @@ def dataset_from_directory(dir_path, cropsize, nb_keypoints=None):
 
             yield image_file, metadata
 
-    meta_file_0 = glob.glob(os.path.join(dir_path, "meta_*.json"))[0]
+    meta_file_0 = manifest.meta_files(dir_path, ".json")[0]
     with open(meta_file_0, "r") as f:
         meta0 = json.load(f)
     dtypes = recursive_map_dict(meta0, lambda x: tf.convert_to_tensor(x).dtype)
@@ -2,6 +2,9 @@ import tensorflow as tf
 import os
 import numpy as np
 import cv2
+from rmltraintfcommon.keras_callbacks import ThroughputCallback, get_profile_batch
+from rmltraintfcommon.gradient_accumulation import GradientAccumulationOptimizer
+from rmltraintfcommon.dataset_manifest import load_manifest
 
 
 class PoseRegressionModel:
@@ -99,9 +102,9 @@ class PoseRegressionModel:
             #image = (image - self.mean) / self.stdev
             return image, pose
 
-        with open(os.path.join(self.data_dir, f"{split_name}.record.numexamples"), "r") as f:
-            num_examples = int(f.read())
-        filenames = tf.io.gfile.glob(os.path.join(self.data_dir, f"{split_name}.record-*"))
+        manifest = load_manifest(self.data_dir)
+        num_examples = manifest.num_examples(self.data_dir, split_name)
+        filenames = manifest.record_shards(self.data_dir, split_name)
 
         return tf.data.TFRecordDataset(filenames, num_parallel_reads=16).map(_parse_function, num_parallel_calls=16), num_examples
 
@@ -119,24 +122,42 @@ class PoseRegressionModel:
                 cv2.imshow('a', im)
                 cv2.waitKey(0)"""
 
+        self.throughput = ThroughputCallback(self.hp['batch_size'])
+        self.early_stopping = []
+        # optional tf.profiler capture of a batch, or a [start, stop] window on TF >= 2.2, in one phase
+        profile_batch = get_profile_batch(self.hp.get('profile_steps'))
+        profile_phase = self.hp.get('profile_phase', 0)
+
         # perform training for each training phase
         for i, phase in enumerate(self.hp["phases"]):
             phase_logdir = os.path.join(logdir, f"phase_{i}")
             model_path = os.path.join(phase_logdir, "model.h5")
+            self.throughput.set_log_dir(phase_logdir)
+            # the checkpoint is timed by the throughput callback, which comes after it
             callbacks = [
                 tf.keras.callbacks.TensorBoard(
                     log_dir=phase_logdir,
                     write_graph=False,
-                    profile_batch=0
+                    profile_batch=profile_batch if i == profile_phase else 0
                 ),
-                tf.keras.callbacks.ModelCheckpoint(
+                self.throughput.timed(tf.keras.callbacks.ModelCheckpoint(
                     model_path,
                     monitor='val_loss',
                     save_best_only=True,
                     mode='min'
-                )
+                )),
+                self.throughput
             ]
 
+            # optionally move on to the next phase once the monitored metric plateaus,
+            # restoring the best weights seen during this phase
+            early_stopping = None
+            if self.hp.get('early_stopping'):
+                early_stopping = tf.keras.callbacks.EarlyStopping(
+                    restore_best_weights=True, **self.hp['early_stopping']
+                )
+                callbacks.append(early_stopping)
+
             # if this is the first phase, generate a new model with fresh weights.
             # otherwise, load the model from the previous phase's best checkpoint
             if i == 0:
@@ -155,6 +176,9 @@ class PoseRegressionModel:
                 layer.trainable = True
 
             optimizer = self.OPTIMIZERS[phase['optimizer']](**phase['optimizer_args'])
+            # optionally apply the mean gradient of every gradient_accumulation_steps batches
+            if self.hp.get('gradient_accumulation_steps', 1) > 1:
+                optimizer = GradientAccumulationOptimizer(optimizer, self.hp['gradient_accumulation_steps'])
             model.compile(
                 optimizer=optimizer,
                 loss=[self.pose_loss],
@@ -167,6 +191,13 @@ class PoseRegressionModel:
                 validation_steps=-(-num_val // self.hp['batch_size']),
                 callbacks=callbacks
             )
+            if early_stopping:
+                self.early_stopping.append({
+                    'phase': i,
+                    'monitor': early_stopping.monitor,
+                    'best_value': float(early_stopping.best),
+                    'stopped_epoch': early_stopping.stopped_epoch if early_stopping.stopped_epoch else None
+                })
 
         return model_path
 
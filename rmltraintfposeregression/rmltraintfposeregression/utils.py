@@ -1,9 +1,8 @@
 import tensorflow as tf
-import glob
 import json
-import os
 import xml.etree.ElementTree as ET
 from .train import PoseRegressionModel
+from rmltraintfcommon.dataset_manifest import load_manifest
 
 
 def recursive_map_dict(d, f):
@@ -24,9 +23,11 @@ def dataset_from_directory(dir_path, cropsize):
     :return: a Tensorflow dataset that generates (image, metadata) tuples where image is a [cropsize, cropsize, 3]
     Tensor and metadata is a nested dictionary of Tensors.
     """
+    manifest = load_manifest(dir_path)
+
     def generator():
-        image_files = sorted(glob.glob(os.path.join(dir_path, "image_*")))
-        meta_files = sorted(glob.glob(os.path.join(dir_path, "meta_*.json")))
+        image_files = manifest.image_files(dir_path)
+        meta_files = manifest.meta_files(dir_path, ".json")
         for image_file, meta_file in zip(image_files, meta_files):
             # load metadata
             with open(meta_file, "r") as f:
@@ -47,7 +48,7 @@ def dataset_from_directory(dir_path, cropsize):
             image = PoseRegressionModel.preprocess_image(image_data, centroid, bbox_size, cropsize)
             yield image, metadata
 
-    meta_file_0 = glob.glob(os.path.join(dir_path, "meta_*.json"))[0]
+    meta_file_0 = manifest.meta_files(dir_path, ".json")[0]
     with open(meta_file_0, "r") as f:
         meta0 = json.load(f)
     dtypes = recursive_map_dict(meta0, lambda x: tf.convert_to_tensor(x).dtype)
@@ -8,6 +8,7 @@ import argparse
 import json
 from rmltraintfposeregression.utils import dataset_from_directory, recursive_map_dict
 from rmltraintfposeregression.train import PoseRegressionModel
+from rmltraintfcommon.runtime import add_runtime_args, configure_runtime, apply_dataset_options
 
 
 def main():
@@ -15,13 +16,16 @@ def main():
     parser.add_argument('-m', '--model', type=str, help="Path to saved model", required=True)
     parser.add_argument('-d', '--directory', type=str, help="Path to data directory", required=True)
     parser.add_argument('-n', '--num', type=int, help="Number of images to process (optional)")
+    add_runtime_args(parser)
     args = parser.parse_args()
+    runtime = configure_runtime(**vars(args))
 
     model = tf.compat.v2.saved_model.load(args.model)
     cropsize = model.__call__.concrete_functions[0].inputs[0].shape[1]
     data = dataset_from_directory(args.directory, cropsize)
     if args.num:
         data = data.take(args.num)
+    data = apply_dataset_options(data, runtime)
 
     def make_serializable(tensor):
         n = tensor.numpy()
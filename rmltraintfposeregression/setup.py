@@ -6,6 +6,7 @@ setup(
     description='Tensorflow direct pose regression plugin for ravenml',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.16.4',
         'pillow==6.0.0',
         'matplotlib==3.1.0',
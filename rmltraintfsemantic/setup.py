@@ -11,6 +11,7 @@ setup(
     description='Tensorflow Semantic Segmentation training plugin for ravenml',
     packages=find_packages(),
     install_requires=[
+        'rmltraintfcommon',
         'numpy==1.16.4',
         'deeplab @ https://github.com/autognc/models/archive/deeplab-0.0.1.tar.gz#subdirectory=research/deeplab',
         'pillow==6.0.0',